@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+CHARS_PER_TOKEN = 4
+
+CHAT_REPLIES = [
+    "Your USDC vault is earning steadily, and your wallet still has room to deposit more if you'd like.",
+    "Everything looks healthy: your locked vaults keep earning until their lock period ends.",
+    "You hold a mix of SOL and stablecoins; stablecoin vaults are the calmer way to earn yield.",
+    "Happy to help! Ask me about your balances, your vaults, or where your assets could earn more.",
+]
+
+SUGGESTION_REPLY = "Moving your {asset} to {protocol} could earn you about {apy}% APY, a solid step up from where it is now."
+
+_BATCH_COUNT = re.compile(r"a JSON array of (\d+) items")
+_DEPOSIT = re.compile(r"deposit\s+\$?(\d+(?:\.\d+)?)\s*(USDC|USDT|SOL)?", re.IGNORECASE)
+
+
+def _tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the OpenAI/Gemini chat models, for load benchmarks. Replies
+    depend only on the prompt, take `latency_ms` (+ up to `jitter_ms`, derived from the prompt
+    hash) to produce, stream in `stream_chunks` pieces and carry usage_metadata. Chat prompts
+    asking to "deposit <amount> <token>" get a DepositActionIntent tool call when tools are bound.
+    With `fail_after_chunks` set, streams raise RuntimeError after that many text chunks.
+    """
+    latency_ms: float = 400.0
+    jitter_ms: float = 200.0
+    first_token_ms: float = 150.0
+    stream_chunks: int = 8
+    fail_after_chunks: Optional[int] = None
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-lucy"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Any:
+        return self.bind(tool_names=[getattr(tool, "__name__", str(tool)) for tool in tools], **kwargs)
+
+    # --- Deterministic replies ---
+
+    def _reply(self, messages: List[BaseMessage], tool_names: Optional[List[str]]) -> AIMessage:
+        prompt = "\n".join(str(m.content) for m in messages)
+        last = str(messages[-1].content) if messages else ""
+        digest = int(hashlib.sha1(prompt.encode()).hexdigest()[:8], 16)
+
+        tool_calls: List[Dict[str, Any]] = []
+        batch = _BATCH_COUNT.search(prompt)
+        if batch:
+            count = int(batch.group(1))
+            text = json.dumps([SUGGESTION_REPLY.format(asset="USDC", protocol="Solend", apy=6.2 + i / 10) for i in range(count)])
+        elif "Analysis Data" in prompt:
+            text = SUGGESTION_REPLY.format(asset="USDC", protocol="Solend", apy=6.2)
+        else:
+            text = CHAT_REPLIES[digest % len(CHAT_REPLIES)]
+            deposit = _DEPOSIT.search(last)
+            if deposit and tool_names and "DepositActionIntent" in tool_names:
+                tool_calls.append({
+                    "name": "DepositActionIntent",
+                    "args": {"amount": float(deposit.group(1)), "token": (deposit.group(2) or "USDC").upper()},
+                    "id": f"call_{digest:08x}",
+                    "type": "tool_call",
+                })
+                text = "Sure, I've prepared that deposit for you to confirm."
+
+        input_tokens = _tokens(prompt)
+        output_tokens = _tokens(text)
+        return AIMessage(
+            content=text,
+            tool_calls=tool_calls,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+        )
+
+    def _latency(self, messages: List[BaseMessage]) -> float:
+        digest = int(hashlib.sha1("".join(str(m.content) for m in messages).encode()).hexdigest()[8:16], 16)
+        return (self.latency_ms + self.jitter_ms * (digest % 1000) / 1000) / 1000
+
+    # --- BaseChatModel ---
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        time.sleep(self._latency(messages))
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages, kwargs.get("tool_names")))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        await asyncio.sleep(self._latency(messages))
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages, kwargs.get("tool_names")))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        raise NotImplementedError("FakeChatModel only streams asynchronously")
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        reply = self._reply(messages, kwargs.get("tool_names"))
+        text = str(reply.content)
+        chunks = max(1, self.stream_chunks)
+        step = -(-len(text) // chunks)
+        rest_seconds = max(0.0, self._latency(messages) - self.first_token_ms / 1000)
+
+        await asyncio.sleep(self.first_token_ms / 1000)
+        for i in range(0, len(text), step):
+            if i:
+                await asyncio.sleep(rest_seconds / chunks)
+            if self.fail_after_chunks is not None and i // step >= self.fail_after_chunks:
+                raise RuntimeError("fake LLM stream failed")
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text[i:i + step]))
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                tool_call_chunk(name=call["name"], args=json.dumps(call["args"]), id=call["id"], index=index)
+                for index, call in enumerate(reply.tool_calls)
+            ],
+            usage_metadata=reply.usage_metadata,
+        ))
@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import itertools
+import random
+import socket
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+
+from src.lucy_ai.services.solana_rpc import KNOWN_TOKENS, TOKEN_API_IDS
+
+
+class LatencyProfile:
+    """
+    Response time and failure behaviour of one fake upstream: `latency_ms` plus a uniformly
+    random 0..`jitter_ms` (plus `tail_ms` for a `tail_rate` share of calls), failing with
+    probability `error_rate`. Seeded, so runs are repeatable. The attributes may be changed
+    while the server runs, to inject slowness.
+    """
+    def __init__(self, latency_ms: float = 1.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                 tail_rate: float = 0.0, tail_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self._random = random.Random(seed)
+
+    async def respond(self) -> bool:
+        """Waits out the simulated latency; returns False when this call should fail."""
+        delay = (self.latency_ms + self._random.random() * self.jitter_ms) / 1000
+        if self.tail_rate and self._random.random() < self.tail_rate:
+            delay += self.tail_ms / 1000
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._random.random() >= self.error_rate
+
+    def describe(self) -> Dict[str, float]:
+        return {"latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms, "error_rate": self.error_rate, "tail_rate": self.tail_rate, "tail_ms": self.tail_ms}
+
+
+# Per upstream: (latency_ms, jitter_ms, error_rate). "llm" configures the fake LLM inside Lucy.
+PROFILES: Dict[str, Dict[str, tuple]] = {
+    # Near-zero upstream cost: measures Lucy's own overhead
+    "local": {"senti_backend": (1, 0, 0.0), "solana_rpc": (1, 0, 0.0), "coingecko": (1, 0, 0.0), "llm": (5, 0, 0.0)},
+    # Typical production latencies
+    "realistic": {"senti_backend": (30, 20, 0.0), "solana_rpc": (80, 60, 0.0), "coingecko": (150, 100, 0.0), "llm": (600, 400, 0.0)},
+    # Slow and failing upstreams: exercises timeouts, fallbacks and error paths
+    "degraded": {"senti_backend": (100, 100, 0.02), "solana_rpc": (300, 300, 0.05), "coingecko": (500, 500, 0.10), "llm": (2000, 1000, 0.0)},
+}
+
+
+def build_profile(name: str, upstream: str, seed: int = 0) -> LatencyProfile:
+    latency_ms, jitter_ms, error_rate = PROFILES[name][upstream]
+    return LatencyProfile(latency_ms, jitter_ms, error_rate, seed=seed)
+
+
+def _digest(*parts: Any) -> int:
+    return int(hashlib.sha256("/".join(map(str, parts)).encode()).hexdigest()[:12], 16)
+
+
+def fake_vaults(user_id: str, count: int) -> List[Dict[str, Any]]:
+    """A deterministic vault list for `user_id`, in the Senti backend's response format."""
+    tokens = ["USDC", "USDT", "SOL"]
+    vaults = []
+    for i in range(count):
+        d = _digest(user_id, i)
+        locked = d % 3 == 0
+        vaults.append({
+            "id": f"{user_id}-vault-{i}",
+            "name": f"Vault {i}",
+            "token": tokens[d % len(tokens)],
+            "totalDeposits": round((d % 100_000) / 10, 2),
+            "yieldRate": round(0.02 + (d % 60) / 1000, 4),
+            "locked": locked,
+            "lockPeriodDays": 30 if locked else None,
+        })
+    return vaults
+
+
+def create_senti_backend_app(profile: LatencyProfile, calls: Counter, vaults_per_user: int = 5) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/vault/user/{user_id}")
+    async def user_vaults(user_id: str):
+        calls["senti_backend:vaults"] += 1
+        if not await profile.respond():
+            calls["senti_backend:errors"] += 1
+            return JSONResponse(status_code=503, content={"error": "fake backend failure"})
+        return fake_vaults(user_id, vaults_per_user)
+
+    return app
+
+
+def _rpc_result(method: str, params: List[Any]) -> Any:
+    owner = params[0] if params else ""
+    if method == "getBalance":
+        return {"context": {"slot": 1}, "value": _digest(owner, "SOL") % 50_000_000_000}
+    if method == "getTokenAccountsByOwner":
+        accounts = []
+        for symbol, mint in KNOWN_TOKENS.items():
+            accounts.append({
+                "pubkey": f"{owner[:8]}{symbol}",
+                "account": {"data": {"parsed": {"info": {
+                    "mint": str(mint),
+                    "tokenAmount": {"amount": str(_digest(owner, symbol) % 10_000_000_000), "decimals": 6},
+                }}}},
+            })
+        return {"context": {"slot": 1}, "value": accounts}
+    raise KeyError(method)
+
+
+def create_solana_rpc_app(profile: LatencyProfile, calls: Counter, reverse_batches: bool = False) -> FastAPI:
+    """`reverse_batches` answers batch items in reverse order, as JSON-RPC allows."""
+    app = FastAPI()
+
+    def _answer(item: Dict[str, Any]) -> Dict[str, Any]:
+        method = item.get("method", "")
+        calls[f"solana_rpc:{method}"] += 1
+        try:
+            return {"jsonrpc": "2.0", "id": item.get("id"), "result": _rpc_result(method, item.get("params") or [])}
+        except KeyError:
+            return {"jsonrpc": "2.0", "id": item.get("id"), "error": {"code": -32601, "message": f"Method not found: {method}"}}
+
+    @app.post("/")
+    async def json_rpc(request: Request):
+        payload = await request.json()
+        calls["solana_rpc:http_requests"] += 1
+        if not await profile.respond():
+            calls["solana_rpc:errors"] += 1
+            return JSONResponse(status_code=503, content={"error": "fake RPC failure"})
+        if isinstance(payload, list):
+            answers = [_answer(item) for item in payload]
+            return answers[::-1] if reverse_batches else answers
+        return _answer(payload)
+
+    @app.get("/health")
+    async def health():
+        return "ok"
+
+    return app
+
+
+class FakeSolanaWebsocket:
+    """
+    State of a fake Solana websocket API: answers (un)subscribe requests, and lets the
+    caller push notifications to a wallet's subscriptions or drop every connection.
+    """
+    def __init__(self):
+        self.connections = 0 # Accepted so far
+        self.subscriptions: Dict[int, Tuple[WebSocket, str, str]] = {} # id -> (socket, method, wallet)
+        self._sockets: set = set()
+        self._ids = itertools.count(1)
+
+    def watched(self, wallet: str) -> int:
+        return sum(1 for _, _, address in self.subscriptions.values() if address == wallet)
+
+    async def notify(self, wallet: str, method: str = "accountSubscribe") -> int:
+        """Pushes a change to the wallet's `method` subscriptions; returns how many were notified."""
+        notification = method.replace("Subscribe", "Notification")
+        targets = [(sid, ws) for sid, (ws, m, address) in list(self.subscriptions.items()) if address == wallet and m == method]
+        for sid, ws in targets:
+            await ws.send_json({"jsonrpc": "2.0", "method": notification, "params": {"subscription": sid, "result": {"context": {"slot": 2}, "value": {}}}})
+        return len(targets)
+
+    async def drop_connections(self) -> None:
+        for ws in list(self._sockets):
+            await ws.close()
+
+    def _subscribe(self, ws: WebSocket, method: str, params: List[Any]) -> int:
+        if method == "accountSubscribe":
+            wallet = params[0]
+        else: # programSubscribe filtered by owner
+            wallet = next(f["memcmp"]["bytes"] for f in params[1]["filters"] if "memcmp" in f)
+        subscription_id = next(self._ids)
+        self.subscriptions[subscription_id] = (ws, method, wallet)
+        return subscription_id
+
+
+def create_solana_ws_app(state: FakeSolanaWebsocket) -> FastAPI:
+    app = FastAPI()
+
+    @app.websocket("/")
+    async def solana_ws(websocket: WebSocket):
+        await websocket.accept()
+        state.connections += 1
+        state._sockets.add(websocket)
+        try:
+            while True:
+                message = await websocket.receive_json()
+                method, params = message.get("method", ""), message.get("params") or []
+                if method.endswith("Unsubscribe"):
+                    result: Any = state.subscriptions.pop(params[0], None) is not None
+                else:
+                    result = state._subscribe(websocket, method, params)
+                await websocket.send_json({"jsonrpc": "2.0", "id": message.get("id"), "result": result})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            state._sockets.discard(websocket)
+            for sid in [sid for sid, (ws, _, _) in state.subscriptions.items() if ws is websocket]:
+                del state.subscriptions[sid]
+
+    return app
+
+
+def create_coingecko_app(profile: LatencyProfile, calls: Counter) -> FastAPI:
+    app = FastAPI()
+    prices = {api_id: 1.0 for api_id in TOKEN_API_IDS.values()}
+    prices[TOKEN_API_IDS["SOL"]] = 150.0
+
+    @app.get("/api/v3/simple/price")
+    async def simple_price(ids: str, vs_currencies: str = "usd"):
+        calls["coingecko:simple_price"] += 1
+        if not await profile.respond():
+            calls["coingecko:errors"] += 1
+            return JSONResponse(status_code=429, content={"status": {"error_code": 429}})
+        return {api_id: {"usd": prices[api_id]} for api_id in ids.split(",") if api_id in prices}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeServer:
+    """Runs an ASGI app with uvicorn on a free local port inside the current event loop."""
+    def __init__(self, name: str, app: FastAPI, port: Optional[int] = None):
+        self.name = name
+        self.port = port or free_port()
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False))
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}"
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                self._task.result() # Surfaces the startup error
+            await asyncio.sleep(0.01)
+
+    async def stop(self) -> None:
+        self._server.should_exit = True
+        if self._task is not None:
+            await self._task
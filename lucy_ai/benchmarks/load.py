@@ -0,0 +1,320 @@
+"""
+End-to-end load benchmark: starts local fake upstreams (Senti backend, Solana RPC, CoinGecko),
+runs Lucy in a subprocess with the deterministic fake LLM, drives an endpoint mix at a fixed
+request rate and writes latency percentiles, throughput and upstream call counts as JSON.
+
+    cd lucy_ai
+    python -m benchmarks.load --scenario mixed --rps 50 --duration 30 --profile realistic
+
+Latency is measured from each request's scheduled send time, so time spent waiting for a free
+concurrency slot counts against Lucy (no coordinated omission).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from jose import jwt
+from solders.pubkey import Pubkey
+
+from src.lucy_ai.api.endpoints import ALGORITHM, SECRET_KEY
+from .fake_upstreams import (FakeServer, PROFILES, build_profile, create_coingecko_app, create_senti_backend_app,
+                             create_solana_rpc_app, free_port)
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = BENCHMARKS_DIR.parent
+
+CHAT_MESSAGES = [
+    "How are my vaults doing?",
+    "What's my wallet balance?",
+    "Should I move my USDC somewhere better?",
+    "deposit 100 USDC",
+    "Explain what a locked vault is.",
+]
+ASSETS = ["USDC", "USDT", "SOL"]
+
+# Request = (endpoint name, method, path, auth token, JSON body)
+Request = Tuple[str, str, str, str, Optional[Dict[str, Any]]]
+
+
+class BenchUser:
+    def __init__(self, index: int):
+        self.user_id = f"bench-user-{index}"
+        self.pubkey = str(Pubkey.from_bytes(hashlib.sha256(self.user_id.encode()).digest()))
+        self.token = jwt.encode(
+            {"sub": self.user_id, "solanaPubkey": self.pubkey, "exp": int(time.time()) + 24 * 3600},
+            SECRET_KEY, algorithm=ALGORITHM,
+        )
+
+
+def _suggestions(i: int, user: BenchUser) -> Request:
+    return ("suggestions", "GET", f"/api/v1/suggestions/{user.user_id}?asset={ASSETS[i % len(ASSETS)]}", user.token, None)
+
+
+def _chat(i: int, user: BenchUser) -> Request:
+    return ("chat", "POST", f"/api/v1/chat/{user.user_id}", user.token, {"message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]})
+
+
+def _balances(i: int, user: BenchUser) -> Request:
+    return ("balances", "GET", "/api/v1/balances", user.token, None)
+
+
+# Each scenario is a repeating pattern of request builders
+SCENARIOS: Dict[str, List[Callable[[int, BenchUser], Request]]] = {
+    "suggestions": [_suggestions],
+    "chat": [_chat],
+    "balances": [_balances],
+    "mixed": [_suggestions, _chat, _balances, _suggestions, _balances, _chat, _suggestions, _balances, _chat, _balances],
+}
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Counter] = {}
+
+    def record(self, endpoint: str, status: str, latency: float) -> None:
+        self.latencies.setdefault(endpoint, []).append(latency)
+        self.statuses.setdefault(endpoint, Counter())[status] += 1
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), int(-(-q * len(sorted_values) // 100))))
+    return sorted_values[rank - 1]
+
+
+def _summarize(latencies: List[float], statuses: Counter, wall_seconds: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    ok = sum(count for status, count in statuses.items() if status.isdigit() and int(status) < 400)
+    return {
+        "requests": len(values),
+        "ok": ok,
+        "errors": len(values) - ok,
+        "status_counts": dict(sorted(statuses.items())),
+        "throughput_rps": round(ok / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(values, 50) * 1000, 2),
+            "p95": round(percentile(values, 95) * 1000, 2),
+            "p99": round(percentile(values, 99) * 1000, 2),
+            "max": round(values[-1] * 1000, 2) if values else 0.0,
+            "mean": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        },
+    }
+
+
+async def drive(client: httpx.AsyncClient, scenario: str, users: List[BenchUser], rps: float, duration: float,
+                concurrency: int, recorder: Optional[Recorder]) -> float:
+    """Sends round(rps * duration) requests at a fixed rate; returns the wall time until the last one finished."""
+    loop = asyncio.get_running_loop()
+    pattern = SCENARIOS[scenario]
+    slots = asyncio.Semaphore(concurrency)
+    total = int(round(rps * duration))
+    started = loop.time()
+
+    async def one(i: int, scheduled: float) -> None:
+        endpoint, method, path, token, body = pattern[i % len(pattern)](i, users[i % len(users)])
+        async with slots:
+            try:
+                response = await client.request(method, path, json=body, headers={"Authorization": f"Bearer {token}"})
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+        if recorder is not None:
+            recorder.record(endpoint, status, loop.time() - scheduled)
+
+    tasks = []
+    for i in range(total):
+        scheduled = started + i / rps
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i, scheduled)))
+    await asyncio.gather(*tasks)
+    return loop.time() - started
+
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? ([0-9.eE+-]+|NaN)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+async def scrape_metrics(client: httpx.AsyncClient) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    """Lucy's /metrics as {(name, sorted labels): value}; empty if metrics are disabled."""
+    response = await client.get("/metrics")
+    if response.status_code != 200:
+        return {}
+    samples = {}
+    for line in response.text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            samples[(name, tuple(sorted(_LABEL.findall(labels or ""))))] = float(value)
+    return samples
+
+
+def _llm_calls(before: Dict, after: Dict) -> Dict[str, int]:
+    calls: Counter = Counter()
+    for (name, labels), value in after.items():
+        if name == "lucy_llm_call_duration_seconds_count":
+            chain = dict(labels).get("chain", "?")
+            calls[chain] += int(value - before.get((name, labels), 0.0))
+    return dict(calls)
+
+
+def _cache_hit_ratios(samples: Dict) -> Dict[str, float]:
+    return {dict(labels)["cache"]: round(value, 4) for (name, labels), value in samples.items() if name == "lucy_cache_hit_ratio"}
+
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=PROJECT_DIR, capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+async def wait_until_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Lucy exited during startup with code {process.returncode}")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise TimeoutError(f"Lucy was not ready after {timeout:.0f}s")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    upstream_calls: Counter = Counter()
+    servers = [
+        FakeServer("senti_backend", create_senti_backend_app(build_profile(args.profile, "senti_backend", args.seed), upstream_calls, args.vaults_per_user)),
+        FakeServer("solana_rpc", create_solana_rpc_app(build_profile(args.profile, "solana_rpc", args.seed), upstream_calls)),
+        FakeServer("coingecko", create_coingecko_app(build_profile(args.profile, "coingecko", args.seed), upstream_calls)),
+    ]
+    for server in servers:
+        await server.start()
+    urls = {server.name: server.url for server in servers}
+
+    llm_latency_ms, llm_jitter_ms, _ = PROFILES[args.profile]["llm"]
+    lucy_port = free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [str(PROJECT_DIR), os.environ.get("PYTHONPATH")])),
+        LUCY_BENCH_PORT=str(lucy_port),
+        LUCY_BENCH_LLM_LATENCY_MS=str(llm_latency_ms),
+        LUCY_BENCH_LLM_JITTER_MS=str(llm_jitter_ms),
+        LUCY_BENCH_LOG_LEVEL=args.log_level,
+        SENTI_BACKEND_API_URL=f"{urls['senti_backend']}/api",
+        SOLANA_RPC_URL=urls["solana_rpc"],
+        COINGECKO_API_URL=f"{urls['coingecko']}/api/v3",
+        BALANCE_CACHE_ENABLED="false", # No fake websocket endpoint; balances always go through RPC
+        OPENAI_API_KEY="",
+        GOOGLE_API_KEY="",
+    )
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.serve_lucy"], cwd=PROJECT_DIR, env=env)
+
+    users = [BenchUser(i) for i in range(args.users)]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{lucy_port}", limits=limits, timeout=args.timeout) as client:
+            await wait_until_ready(client, process, args.startup_timeout)
+            if args.warmup > 0:
+                await drive(client, args.scenario, users, args.rps, args.warmup, args.concurrency, recorder=None)
+
+            calls_before = Counter(upstream_calls)
+            metrics_before = await scrape_metrics(client)
+            recorder = Recorder()
+            wall_seconds = await drive(client, args.scenario, users, args.rps, args.duration, args.concurrency, recorder)
+            metrics_after = await scrape_metrics(client)
+            calls = upstream_calls - calls_before
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        for server in servers:
+            await server.stop()
+
+    all_latencies = [latency for values in recorder.latencies.values() for latency in values]
+    all_statuses = sum(recorder.statuses.values(), Counter())
+    upstream = {name: {} for name in ("senti_backend", "solana_rpc", "coingecko")}
+    for key, count in sorted(calls.items()):
+        name, operation = key.split(":", 1)
+        upstream[name][operation] = count
+    upstream["llm"] = _llm_calls(metrics_before, metrics_after)
+
+    return {
+        "benchmark": "lucy_e2e_load",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": git_revision(),
+        "config": {
+            "scenario": args.scenario, "rps": args.rps, "duration_s": args.duration, "warmup_s": args.warmup,
+            "concurrency": args.concurrency, "users": args.users, "vaults_per_user": args.vaults_per_user,
+            "profile": args.profile, "profile_settings": {name: dict(zip(("latency_ms", "jitter_ms", "error_rate"), values)) for name, values in PROFILES[args.profile].items()},
+            "seed": args.seed, "log_level": args.log_level,
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "overall": _summarize(all_latencies, all_statuses, wall_seconds),
+        "endpoints": {endpoint: _summarize(values, recorder.statuses[endpoint], wall_seconds) for endpoint, values in sorted(recorder.latencies.items())},
+        "upstream_calls": upstream,
+        "cache_hit_ratios": _cache_hit_ratios(metrics_after), # Since Lucy started, warm-up included
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--rps", type=float, default=20.0, help="Requests per second (fixed arrival rate)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before the run")
+    parser.add_argument("--concurrency", type=int, default=64, help="Max requests in flight")
+    parser.add_argument("--users", type=int, default=50, help="Distinct users (JWTs, wallets) cycled through")
+    parser.add_argument("--vaults-per-user", type=int, default=5)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic", help="Upstream latency/error profile")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request client timeout (s)")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--log-level", default="WARNING", help="Lucy's root log level during the run")
+    parser.add_argument("--output", type=Path, default=None, help="Result JSON path (default: benchmarks/results/<scenario>-<profile>-<commit>-<time>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING) # Importing Lucy's modules configures INFO logging
+    result = asyncio.run(run(args))
+    output = args.output or BENCHMARKS_DIR / "results" / (
+        f"{args.scenario}-{args.profile}-{result['git']['commit'] or 'nogit'}-{time.strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + "\n")
+
+    overall = result["overall"]
+    print(f"{args.scenario} @ {args.rps:g} rps, {args.profile}: {overall['throughput_rps']} ok/s, "
+          f"p50 {overall['latency_ms']['p50']} ms, p95 {overall['latency_ms']['p95']} ms, p99 {overall['latency_ms']['p99']} ms, "
+          f"{overall['errors']} error(s)")
+    for endpoint, summary in result["endpoints"].items():
+        print(f"  {endpoint:<12} p50 {summary['latency_ms']['p50']:>8} ms  p99 {summary['latency_ms']['p99']:>8} ms  {summary['status_counts']}")
+    print(f"  upstream calls: {json.dumps(result['upstream_calls'])}")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Microbenchmarks for Lucy's per-request CPU hot paths: the suggestion engine, Pydantic validation
+of backend vault payloads and RPC balance responses, TokenBalance/WalletBalanceResponse
+construction and chat context building. Each case reports time per call and tracemalloc
+allocations per call, and can be compared against an earlier result file.
+
+    cd lucy_ai
+    python -m benchmarks.micro
+    python -m benchmarks.micro --filter engine --baseline benchmarks/results/micro-<commit>-<time>.json
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+from src.lucy_ai.api.chat_context import render_balances, render_vaults
+from src.lucy_ai.api.context_snapshot import ChatContextCache
+from src.lucy_ai.api.endpoints import _balances_section, _vaults_section
+from src.lucy_ai.api.schemas import TokenBalance, WalletBalanceResponse, YieldPool
+from src.lucy_ai.core.engine import AVAILABLE_POOLS_MVP, find_best_yield_suggestion
+from src.lucy_ai.services.senti_backend import UserVaultData, _user_vaults_adapter
+from src.lucy_ai.services.solana_rpc import KNOWN_TOKENS, _build_token_balance, _fetch_spl_balances_parsed
+from .fake_upstreams import _digest, fake_vaults
+from .load import BENCHMARKS_DIR, git_revision
+
+SIZES = (5, 100, 1000)
+WALLET = "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"
+
+
+class Case:
+    def __init__(self, name: str, fn: Callable[[], Any], size: int):
+        self.name = name
+        self.fn = fn
+        self.size = size
+
+
+def _drive(coro: Coroutine) -> Any:
+    """Runs a coroutine that never actually suspends, without an event loop's overhead."""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended; _drive only runs non-blocking coroutines")
+
+
+class _CannedTransport:
+    """Stands in for SolanaRpcTransport, answering every call with the same result."""
+    def __init__(self, result: Dict[str, Any]):
+        self.result = result
+
+    async def call(self, method: str, params: List[Any]) -> Dict[str, Any]:
+        return self.result
+
+
+# --- Payloads ---
+
+def _pools(count: int) -> List[YieldPool]:
+    pools = list(AVAILABLE_POOLS_MVP)
+    assets = ["USDC", "USDT", "SOL"]
+    for i in range(count - len(pools)):
+        d = _digest("pool", i)
+        pools.append(YieldPool(pool_id=f"pool_{i}", protocol_name=f"Protocol {i % 40}", asset=assets[d % 3],
+                               current_apy=round(2 + (d % 900) / 100, 2), risk_score=1 + d % 5))
+    return pools[:max(count, len(AVAILABLE_POOLS_MVP))]
+
+
+def _vault_models(count: int) -> List[UserVaultData]:
+    return [UserVaultData.model_validate(vault) for vault in fake_vaults("bench-user", count)]
+
+
+def _token_accounts_result(count: int) -> Dict[str, Any]:
+    """A jsonParsed getTokenAccountsByOwner result with `count` accounts, half of them untracked mints."""
+    mints = [str(mint) for mint in KNOWN_TOKENS.values()]
+    accounts = []
+    for i in range(count):
+        mint = mints[i % len(mints)] if i % 2 == 0 else f"UnknownMint{i:032d}"
+        accounts.append({
+            "pubkey": f"Account{i:036d}",
+            "account": {"data": {"parsed": {"info": {
+                "mint": mint,
+                "tokenAmount": {"amount": str(_digest(WALLET, i) % 10_000_000_000), "decimals": 6},
+            }}}},
+        })
+    return {"context": {"slot": 1}, "value": accounts}
+
+
+def _balance_payload(count: int) -> Dict[str, Any]:
+    """A WalletBalanceResponse as JSON data, e.g. from a cache or the batch endpoint."""
+    return {"wallet_address": WALLET, "balances": [
+        {"token_symbol": f"TK{i}", "amount_ui": i * 1.5, "amount_raw": str(i * 1_500_000), "token_mint": f"Mint{i:040d}", "value_usd": i * 1.5}
+        for i in range(count)
+    ]}
+
+
+# --- Cases ---
+
+def build_cases() -> List[Case]:
+    cases: List[Case] = []
+
+    for pool_count in (9, 100, 1000):
+        for vault_count in SIZES:
+            pools, vaults = _pools(pool_count), _vault_models(vault_count)
+            cases.append(Case(f"engine.find_best_yield_suggestion[pools={pool_count},vaults={vault_count}]",
+                              lambda pools=pools, vaults=vaults: find_best_yield_suggestion("USDC", vaults, pools), vault_count))
+
+    for count in SIZES:
+        raw = fake_vaults("bench-user", count)
+        body = json.dumps(raw).encode()
+        cases.append(Case(f"schema.vaults.model_validate[n={count}]",
+                          lambda raw=raw: [UserVaultData.model_validate(vault) for vault in raw], count))
+        cases.append(Case(f"schema.vaults.json_and_validate[n={count}]",
+                          lambda body=body: [UserVaultData.model_validate(vault) for vault in json.loads(body)], count))
+        # Vault response parsing: the old parse -> validate -> re-dump round trip vs. one validate_json pass
+        cases.append(Case(f"schema.vaults.roundtrip_parse[n={count}]",
+                          lambda body=body: [UserVaultData.model_validate(vault).model_dump(by_alias=True) for vault in json.loads(body)], count))
+        cases.append(Case(f"schema.vaults.fast_parse[n={count}]",
+                          lambda body=body: _user_vaults_adapter.validate_json(body), count))
+
+    for count in (2, 50, 500):
+        transport = _CannedTransport(_token_accounts_result(count))
+        cases.append(Case(f"rpc.parse_token_accounts[accounts={count}]",
+                          lambda transport=transport: _drive(_fetch_spl_balances_parsed(transport, None, WALLET)), count))
+        payload = _balance_payload(count)
+        cases.append(Case(f"schema.wallet_balances.model_validate[n={count}]",
+                          lambda payload=payload: WalletBalanceResponse.model_validate(payload), count))
+
+    for count in (2, 50, 500):
+        raws = [_digest(WALLET, i) % 10_000_000_000 for i in range(count)]
+        cases.append(Case(f"schema.build_token_balances[n={count}]",
+                          lambda raws=raws: WalletBalanceResponse(wallet_address=WALLET, balances=[_build_token_balance("USDC", raw) for raw in raws]), count))
+        response = WalletBalanceResponse(wallet_address=WALLET, balances=[_build_token_balance("USDC", raw) for raw in raws])
+        cases.append(Case(f"schema.wallet_balances.model_dump_json[n={count}]", response.model_dump_json, count))
+
+    balances = WalletBalanceResponse(wallet_address=WALLET, balances=[
+        TokenBalance(token_symbol="SOL", amount_ui=12.5, value_usd=1875.0),
+        TokenBalance(token_symbol="USDC", amount_ui=420.0, value_usd=420.0),
+    ])
+    for count in SIZES:
+        vaults = _vault_models(count)
+        for mode in ("full", "compact"):
+            cases.append(Case(f"chat_context.render[{mode},vaults={count}]",
+                              lambda vaults=vaults, mode=mode: render_vaults(vaults, mode=mode) + "\n" + render_balances(balances, mode=mode), count))
+        # What build_chat_context does after fetching: fingerprint and render both sections
+        cases.append(Case(f"chat_context.build_uncached[vaults={count}]",
+                          lambda vaults=vaults: "\n".join(render() for _, render in [_vaults_section(vaults), _balances_section(balances)]), count))
+        cache = ChatContextCache()
+        cases.append(Case(f"chat_context.build_cached_unchanged[vaults={count}]",
+                          lambda vaults=vaults, cache=cache: cache.render("bench-user", WALLET, [_vaults_section(vaults), _balances_section(balances)]), count))
+
+    return cases
+
+
+# --- Measurement ---
+
+def measure(case: Case, min_time: float, repeat: int, alloc_calls: int) -> Dict[str, Any]:
+    """Best-of-`repeat` timing (each round runs >= min_time seconds) plus tracemalloc figures per call."""
+    case.fn() # Warm up lazily built validators, caches, etc.
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            case.fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 10 or calls >= 1_000_000:
+            break
+        calls *= 10
+    calls = max(1, int(calls * (min_time / max(elapsed, 1e-9))))
+
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            case.fn()
+        rounds.append((time.perf_counter() - started) / calls)
+
+    tracemalloc.start()
+    try:
+        peaks, retained, blocks = [], [], []
+        for _ in range(alloc_calls):
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            baseline, _ = tracemalloc.get_traced_memory()
+            result = case.fn()
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            peaks.append(peak - baseline)
+            retained.append(current - baseline)
+            blocks.append(sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0))
+            del result
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "size": case.size,
+        "calls_per_round": calls,
+        "time_us": {"best": round(min(rounds) * 1e6, 3), "median": round(statistics.median(rounds) * 1e6, 3)},
+        "alloc": {
+            "peak_bytes": int(statistics.median(peaks)),
+            "result_bytes": int(statistics.median(retained)), # Still alive when the call returned, i.e. mostly its result
+            "new_blocks": int(statistics.median(blocks)),
+        },
+    }
+
+
+def _delta(current: float, previous: Optional[float]) -> str:
+    if not previous:
+        return ""
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing round")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per case (best is reported)")
+    parser.add_argument("--alloc-calls", type=int, default=5, help="Calls traced with tracemalloc per case")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier micro result JSON to compare against")
+    parser.add_argument("--output", type=Path, default=None, help="Result JSON path (default: benchmarks/results/micro-<commit>-<time>.json)")
+    args = parser.parse_args(argv)
+
+    # Log calls in the hot paths still format their messages; only the handler I/O is skipped
+    logging.getLogger().setLevel(logging.WARNING)
+
+    baseline = json.loads(args.baseline.read_text())["cases"] if args.baseline else {}
+    results: Dict[str, Any] = {}
+    print(f"{'case':<72} {'best us':>11} {'peak KiB':>9} {'blocks':>7}")
+    for case in build_cases():
+        if args.filter not in case.name:
+            continue
+        result = measure(case, args.min_time, args.repeat, args.alloc_calls)
+        results[case.name] = result
+        previous = baseline.get(case.name)
+        print(f"{case.name:<72} {result['time_us']['best']:>11.2f} {result['alloc']['peak_bytes'] / 1024:>9.1f} {result['alloc']['new_blocks']:>7}"
+              + (f"  time {_delta(result['time_us']['best'], previous['time_us']['best'])}, peak {_delta(result['alloc']['peak_bytes'], previous['alloc']['peak_bytes'])}" if previous else ""))
+
+    git = git_revision()
+    output = args.output or BENCHMARKS_DIR / "results" / f"micro-{git['commit'] or 'nogit'}-{time.strftime('%Y%m%dT%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "benchmark": "lucy_micro",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": git,
+        "config": {"min_time_s": args.min_time, "repeat": args.repeat, "alloc_calls": args.alloc_calls, "filter": args.filter},
+        "cases": results,
+    }, indent=2) + "\n")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Solana RPC routing benchmark: starts several local fake RPC servers, injects slowness and
+failures into one of them phase by phase, and compares getBalance latency through a single
+endpoint, the RpcRouter without hedging and the RpcRouter with hedging.
+
+    cd lucy_ai
+    python -m benchmarks.rpc_router --endpoints 3 --rps 100 --phase-seconds 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.lucy_ai.services.solana_rpc import RpcCallError, RpcEndpoint, RpcRouter, SolanaRpcTransport
+from .fake_upstreams import FakeServer, LatencyProfile, create_solana_rpc_app
+from .load import BENCHMARKS_DIR, percentile, git_revision
+
+OWNER = "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"
+
+# (phase name, change applied to the first endpoint's profile); the other endpoints stay healthy
+PHASES: List[Tuple[str, Callable[[LatencyProfile], None]]] = [
+    ("healthy", lambda p: None),
+    ("tail_spikes", lambda p: (setattr(p, "tail_rate", 0.05), setattr(p, "tail_ms", 800))),
+    ("slow", lambda p: (setattr(p, "tail_rate", 0.0), setattr(p, "latency_ms", 400))),
+    ("failing", lambda p: (setattr(p, "latency_ms", 20), setattr(p, "error_rate", 1.0))),
+    ("recovered", lambda p: setattr(p, "error_rate", 0.0)),
+]
+
+
+def _build(kind: str, urls: List[str], args: argparse.Namespace) -> Any:
+    def transport(url: str) -> SolanaRpcTransport:
+        return SolanaRpcTransport(url, timeout=args.timeout, max_connections=args.concurrency)
+    if kind == "single":
+        return transport(urls[0])
+    endpoints = [RpcEndpoint(url, transport(url), breaker_failures=args.breaker_failures, breaker_cooldown=args.breaker_cooldown) for url in urls]
+    return RpcRouter(endpoints, hedge=(kind == "hedged"), hedge_min_delay=args.hedge_min_delay_ms / 1000)
+
+
+async def _drive(transport: Any, rps: float, seconds: float) -> Dict[str, Any]:
+    """Open-loop getBalance calls at `rps`; latency counted from each call's scheduled time."""
+    loop = asyncio.get_running_loop()
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    started = loop.time()
+
+    async def one(scheduled: float) -> None:
+        try:
+            await transport.call("getBalance", [OWNER, {"commitment": "confirmed"}])
+            outcomes["ok"] += 1
+        except RpcCallError:
+            outcomes["error"] += 1
+        latencies.append(loop.time() - scheduled)
+
+    tasks = []
+    for i in range(int(rps * seconds)):
+        scheduled = started + i / rps
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(scheduled)))
+    await asyncio.gather(*tasks)
+    values = sorted(latencies)
+    return {
+        "calls": len(values),
+        "outcomes": dict(outcomes),
+        "latency_ms": {q: round(percentile(values, int(q[1:])) * 1000, 2) for q in ("p50", "p95", "p99")} | {"max": round(values[-1] * 1000, 2) if values else 0.0},
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    calls: Counter = Counter()
+    profiles = [LatencyProfile(args.latency_ms, args.jitter_ms, seed=args.seed + i) for i in range(args.endpoints)]
+    servers = [FakeServer(f"rpc{i}", create_solana_rpc_app(profile, calls)) for i, profile in enumerate(profiles)]
+    for server in servers:
+        await server.start()
+    urls = [server.url for server in servers]
+
+    results: Dict[str, Any] = {}
+    try:
+        for kind in ("single", "routed", "hedged"):
+            for profile in profiles: # Every configuration starts from the same healthy servers
+                profile.latency_ms, profile.error_rate, profile.tail_rate, profile.tail_ms = args.latency_ms, 0.0, 0.0, 0.0
+            transport = _build(kind, urls, args)
+            results[kind] = {}
+            try:
+                for phase, inject in PHASES:
+                    inject(profiles[0])
+                    results[kind][phase] = await _drive(transport, args.rps, args.phase_seconds)
+                    if isinstance(transport, RpcRouter):
+                        results[kind][phase]["router"] = transport.stats()
+                        results[kind][phase]["endpoints"] = {e.name: e.stats() for e in transport.endpoints}
+                    latency = results[kind][phase]["latency_ms"]
+                    print(f"{kind:<7} {phase:<12} p50 {latency['p50']:>8} ms  p99 {latency['p99']:>8} ms  {results[kind][phase]['outcomes']}")
+            finally:
+                await transport.aclose()
+    finally:
+        for server in servers:
+            await server.stop()
+
+    return {
+        "benchmark": "lucy_rpc_router",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": git_revision(),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "phases": [name for name, _ in PHASES],
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--endpoints", type=int, default=3)
+    parser.add_argument("--rps", type=float, default=100.0)
+    parser.add_argument("--phase-seconds", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=100, help="Connections per endpoint")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Healthy endpoint base latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=2.0, help="Per-call timeout (s)")
+    parser.add_argument("--hedge-min-delay-ms", type=float, default=50.0)
+    parser.add_argument("--breaker-failures", type=int, default=5)
+    parser.add_argument("--breaker-cooldown", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="Result JSON path (default: benchmarks/results/rpc-router-<commit>-<time>.json)")
+    args = parser.parse_args(argv)
+    if args.endpoints < 2:
+        parser.error("--endpoints must be at least 2")
+    logging.getLogger().setLevel(logging.ERROR) # The failing phase logs every failover otherwise
+
+    result = asyncio.run(run(args))
+    output = args.output or BENCHMARKS_DIR / "results" / f"rpc-router-{result['git']['commit'] or 'nogit'}-{time.strftime('%Y%m%dT%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + "\n")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
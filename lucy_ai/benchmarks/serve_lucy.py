@@ -0,0 +1,35 @@
+"""
+Runs Lucy with the deterministic fake LLM, for the load benchmark (started by benchmarks/load.py).
+Upstream URLs come from the usual settings environment variables.
+
+    LUCY_BENCH_PORT            port to listen on
+    LUCY_BENCH_LLM_LATENCY_MS  fake LLM reply time
+    LUCY_BENCH_LLM_JITTER_MS   extra 0..jitter ms, derived from the prompt
+    LUCY_BENCH_LOG_LEVEL       root log level (default WARNING, so logging doesn't dominate)
+"""
+import logging
+import os
+
+import uvicorn
+
+from .fake_llm import FakeChatModel
+
+
+def main() -> None:
+    from src.lucy_ai.main import app
+    from src.lucy_ai.core import personality
+
+    personality.install_llm(
+        FakeChatModel(
+            latency_ms=float(os.environ.get("LUCY_BENCH_LLM_LATENCY_MS", "400")),
+            jitter_ms=float(os.environ.get("LUCY_BENCH_LLM_JITTER_MS", "200")),
+        ),
+        provider_key="fake",
+        provider_name="Fake LLM (benchmark)",
+    )
+    logging.getLogger().setLevel(os.environ.get("LUCY_BENCH_LOG_LEVEL", "WARNING"))
+    uvicorn.run(app, host="127.0.0.1", port=int(os.environ["LUCY_BENCH_PORT"]), log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Literal, Mapping, Optional, Tuple
+
+from ..services.senti_backend import UserVaultData
+from .schemas import WalletBalanceResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# "full" lists every vault and balance, "compact" aggregates them, "auto" lists them while that fits the cap
+ContextMode = Literal["full", "compact", "auto"]
+
+# Tokenizer of the default OpenAI chat models (gpt-4o family). Gemini's differs, but both split
+# non-Latin scripts and digits far finer than the chars/4 rule of thumb, which this replaces.
+TOKENIZER_ENCODING = "o200k_base"
+
+_encoding: Any = None
+_encoding_loaded = False
+
+
+def load_tokenizer() -> None:
+    """
+    Loads the tiktoken encoding (downloaded on first use, then cached on disk). Called from the app
+    lifespan in a worker thread; otherwise on the first count. If it can't be loaded, token counts
+    fall back to UTF-8 byte counts, an upper bound for byte-level BPE tokenizers.
+    """
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return
+    if tiktoken is None:
+        logger.warning("Chat context: tiktoken is not installed; counting context tokens as UTF-8 bytes.")
+    else:
+        try:
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            logger.warning(f"Chat context: Could not load tiktoken encoding {TOKENIZER_ENCODING} ({e}); counting context tokens as UTF-8 bytes.")
+    _encoding_loaded = True
+
+
+def count_tokens(text: str) -> int:
+    load_tokenizer()
+    if _encoding is None:
+        return len(text.encode("utf-8"))
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def _fits(lines: List[str], max_tokens: int) -> bool:
+    """Whether `lines` joined by newlines fit in `max_tokens`; stops counting once over."""
+    total = -1 # No newline before the first line
+    for line in lines:
+        total += count_tokens(line) + 1
+        if total > max_tokens:
+            return False
+    return True
+
+
+def _truncate_line(line: str, max_tokens: int) -> str:
+    """Longest prefix of `line` within `max_tokens`."""
+    low, high = 0, len(line)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(line[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return line[:low]
+
+
+def _fit(lines: List[str], max_tokens: int) -> str:
+    """
+    Joins `lines`, dropping trailing lines (marked with "…") so the result is at most `max_tokens`
+    tokens. Lines are counted one by one, which never undercounts: the tokenizer doesn't merge
+    text across a newline.
+    """
+    kept: List[str] = []
+    counts: List[int] = []
+    total = 0
+    for line in lines:
+        tokens = count_tokens(line) + (1 if kept else 0)
+        if total + tokens > max_tokens:
+            break
+        kept.append(line)
+        counts.append(tokens)
+        total += tokens
+    else:
+        return "\n".join(kept)
+
+    ellipsis_tokens = count_tokens("…") + 1
+    while kept and total + ellipsis_tokens > max_tokens:
+        kept.pop()
+        total -= counts.pop()
+    if not kept:
+        # Not even the first line fits next to the marker: keep what fits of it
+        return _truncate_line(lines[0], max(0, max_tokens - ellipsis_tokens)) + "\n…"
+    return "\n".join(kept) + "\n…"
+
+
+def _vault_line(vault: UserVaultData) -> str:
+    lock_status = "Locked" if vault.locked else "Unlocked"
+    apy_percent = vault.yieldRate * 100
+    lock_info = f" ({vault.lockPeriodDays} days)" if vault.lockPeriodDays else ""
+    return f"- Vault '{vault.name}': {vault.totalDeposits:.2f} {vault.token}, APY: {apy_percent:.2f}%, Status: {lock_status}{lock_info}"
+
+
+def _usd_value(amount: float, token: str, prices: Optional[Mapping[str, Optional[float]]]) -> Optional[float]:
+    price = prices.get(token) if prices else None
+    return amount * price if price is not None else None
+
+
+def _usd_rank(usd: Optional[float], amount: float) -> Tuple[bool, float, float]:
+    """Sort key, descending: by USD value, with unpriced positions after priced ones (then by amount)."""
+    return (usd is not None, usd or 0.0, amount)
+
+
+def _compact_vault_lines(
+    user_vaults: List[UserVaultData], top_n: int, max_tokens: int, prices: Optional[Mapping[str, Optional[float]]] = None
+) -> List[str]:
+    groups: Dict[Tuple[str, bool], List[UserVaultData]] = defaultdict(list)
+    for vault in user_vaults:
+        groups[(vault.token, vault.locked)].append(vault)
+
+    group_lines: List[Tuple[Tuple[bool, float, float], str]] = []
+    for (token, locked), vaults in groups.items():
+        deposits = sum(v.totalDeposits for v in vaults)
+        usd = _usd_value(deposits, token, prices)
+        # Deposit-weighted, so a large vault's APY counts for more than a dust one's
+        avg_apy = sum(v.totalDeposits * v.yieldRate for v in vaults) / deposits if deposits else sum(v.yieldRate for v in vaults) / len(vaults)
+        value = f" (${usd:,.2f})" if usd is not None else ""
+        group_lines.append((_usd_rank(usd, deposits), (
+            f"- {token} {'Locked' if locked else 'Unlocked'}: {len(vaults)} vault(s), "
+            f"{deposits:.2f} {token}{value} total, avg APY: {avg_apy * 100:.2f}%"
+        )))
+    group_lines.sort(key=lambda item: item[0], reverse=True)
+
+    # Across tokens only USD amounts are comparable, so the overall APY is weighted by USD value
+    priced = [(usd, v.yieldRate) for v in user_vaults if (usd := _usd_value(v.totalDeposits, v.token, prices)) is not None]
+    total_usd = sum(usd for usd, _ in priced)
+    summary = []
+    if total_usd:
+        avg_apy = sum(usd * rate for usd, rate in priced) / total_usd
+        summary.append(f"Total value of priced vaults: ${total_usd:,.2f}, value-weighted avg APY: {avg_apy * 100:.2f}%")
+
+    top_vaults = sorted(user_vaults, key=lambda v: _usd_rank(_usd_value(v.totalDeposits, v.token, prices), v.totalDeposits), reverse=True)[:top_n]
+    header = [f"User's Vaults ({len(user_vaults)} total), by token and status:"]
+    largest = [_vault_line(v) for v in top_vaults]
+
+    # Shed the smallest listed positions first, then the smallest groups, until the section fits
+    shown_groups = [line for _, line in group_lines]
+    while True:
+        lines = list(header) + shown_groups
+        hidden_groups = len(group_lines) - len(shown_groups)
+        if hidden_groups:
+            lines.append(f"- ({hidden_groups} smaller group(s) not shown)")
+        lines += summary
+        if largest:
+            lines.append(f"Largest {len(largest)} vault(s):")
+            lines.extend(largest)
+        if len(user_vaults) > len(largest):
+            lines.append(f"(+{len(user_vaults) - len(largest)} smaller vault(s) not listed)")
+        if _fits(lines, max_tokens):
+            return lines
+        if largest:
+            largest.pop()
+        elif len(shown_groups) > 1:
+            shown_groups.pop()
+        else:
+            return lines # _fit truncates whatever is left
+
+
+def render_vaults(
+    user_vaults: List[UserVaultData],
+    mode: ContextMode = "auto",
+    top_n: int = 10,
+    max_tokens: int = 600,
+    prices: Optional[Mapping[str, Optional[float]]] = None,
+) -> str:
+    """`prices` (USD per token symbol) lets compact mode rank and total vaults of different tokens by value."""
+    if not user_vaults:
+        return "User has no Senti vaults."
+    if mode != "compact":
+        lines = ["User's Vaults:"] + [_vault_line(v) for v in user_vaults]
+        if mode == "full" or _fits(lines, max_tokens):
+            return _fit(lines, max_tokens)
+    return _fit(_compact_vault_lines(user_vaults, top_n, max_tokens, prices), max_tokens)
+
+
+def render_balances(wallet_balances: Optional[WalletBalanceResponse], mode: ContextMode = "auto", top_n: int = 10, max_tokens: int = 200) -> str:
+    if not (wallet_balances and wallet_balances.balances): # Handles None response or empty balances list
+        return "Could not find wallet balances or wallet is empty."
+    balances = wallet_balances.balances
+    lines = ["User's Wallet Balances:"] + [f"- Wallet: {bal.amount_ui:.4f} {bal.token_symbol}" for bal in balances]
+    if mode == "full" or (mode == "auto" and _fits(lines, max_tokens)):
+        return _fit(lines, max_tokens)
+
+    # Rank by USD value where known so dust tokens don't crowd out real holdings
+    ranked = sorted(balances, key=lambda bal: _usd_rank(bal.value_usd, bal.amount_ui), reverse=True)
+    lines = [f"User's Wallet Balances ({len(balances)} token(s)):"]
+    lines += [f"- Wallet: {bal.amount_ui:.4f} {bal.token_symbol}" for bal in ranked[:top_n]]
+    if len(balances) > top_n:
+        lines.append(f"(+{len(balances) - top_n} smaller balance(s) not listed)")
+    total_usd = sum(bal.value_usd for bal in balances if bal.value_usd is not None)
+    if total_usd:
+        lines.append(f"Total value of priced tokens: ${total_usd:,.2f}")
+    return _fit(lines, max_tokens)
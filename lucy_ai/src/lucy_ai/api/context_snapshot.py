@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# One rendered part of the context: (fingerprint of the data it was rendered from, renderer).
+# A None fingerprint means the data couldn't be fetched; such sections are rendered every time.
+ContextSection = Tuple[Optional[Hashable], Callable[[], str]]
+
+
+class ChatContextSnapshot:
+    """The rendered chat context of one user, with the fingerprints of the inputs it was built from."""
+    __slots__ = ("wallet_address", "fingerprints", "sections", "text", "checked_at")
+
+    def __init__(self, wallet_address: str):
+        self.wallet_address = wallet_address
+        self.fingerprints: List[Optional[Hashable]] = []
+        self.sections: List[str] = []
+        self.text = ""
+        self.checked_at = float("-inf") # Last time the inputs were fetched and all of them were valid
+
+
+class ChatContextCache:
+    """
+    Per-user chat context snapshots (bounded LRU).
+
+    - get_fresh() returns the user's context without any upstream call if it was
+      checked less than `max_age` seconds ago
+    - render() takes freshly fetched inputs as fingerprinted sections; sections whose
+      fingerprint is unchanged reuse their rendered text, and when none changed the
+      previously joined string is returned as is
+    """
+    def __init__(self, max_entries: int = 10_000, max_age: float = 15.0):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._snapshots: "OrderedDict[str, ChatContextSnapshot]" = OrderedDict()
+        self.hits = 0 # Served without fetching
+        self.unchanged = 0 # Fetched, but nothing to re-render
+        self.rebuilds = 0
+
+    def get_fresh(self, user_id: str, wallet_address: str) -> Optional[str]:
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is None or snapshot.wallet_address != wallet_address:
+            return None
+        if time.monotonic() - snapshot.checked_at >= self.max_age:
+            return None
+        self._snapshots.move_to_end(user_id)
+        self.hits += 1
+        return snapshot.text
+
+    def render(self, user_id: str, wallet_address: str, sections: Sequence[ContextSection]) -> str:
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is None or snapshot.wallet_address != wallet_address or len(snapshot.fingerprints) != len(sections):
+            snapshot = ChatContextSnapshot(wallet_address)
+            snapshot.fingerprints = [None] * len(sections)
+            snapshot.sections = [""] * len(sections)
+            self._snapshots[user_id] = snapshot
+        self._snapshots.move_to_end(user_id)
+
+        changed = False
+        for i, (fingerprint, render) in enumerate(sections):
+            if fingerprint is not None and fingerprint == snapshot.fingerprints[i]:
+                continue
+            text = render()
+            if fingerprint is not None or text != snapshot.sections[i]:
+                changed = True
+            snapshot.fingerprints[i] = fingerprint
+            snapshot.sections[i] = text
+        if changed or not snapshot.text:
+            snapshot.text = "\n".join(snapshot.sections)
+            self.rebuilds += 1
+        else:
+            self.unchanged += 1
+
+        if all(fingerprint is not None for fingerprint, _ in sections):
+            snapshot.checked_at = time.monotonic()
+        else:
+            snapshot.checked_at = float("-inf") # Retry the failed fetch on the next message
+
+        while len(self._snapshots) > self.max_entries:
+            self._snapshots.popitem(last=False)
+        return snapshot.text
+
+    def invalidate(self, user_id: str) -> None:
+        """Forces the next get_fresh() to miss, e.g. when the user is about to move funds."""
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is not None:
+            snapshot.checked_at = float("-inf")
+
+    def clear(self) -> None:
+        self._snapshots.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._snapshots),
+            "hits": self.hits,
+            "misses": self.unchanged + self.rebuilds,
+            "unchanged": self.unchanged,
+            "rebuilds": self.rebuilds,
+        }
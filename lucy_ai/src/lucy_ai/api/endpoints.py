@@ -1,16 +1,40 @@
 import logging
 import asyncio
+import json
+import time
 from fastapi import APIRouter, HTTPException, status, Path, Depends, Query
-from typing import Literal, List, Optional, Dict, Any 
+from fastapi.responses import StreamingResponse
+from typing import Literal, List, Optional, Dict, Any, AsyncIterator, Hashable
 from fastapi.security import OAuth2PasswordBearer
-from ..core.engine import find_best_yield_suggestion
+from ..core.engine import build_suggestion, MAX_MVP_RISK_SCORE
 from ..core.personality import generate_nlp_suggestion
 from .schemas import SuggestionResponse, SuggestionFact
-from ..core.personality import generate_chat_response
+from ..core.personality import generate_chat_response, stream_chat_response
 from ..services.senti_backend import get_user_vaults, UserVaultData
-from ..services.solana_rpc import get_wallet_balances
-from .schemas import (YieldPool, TokenBalance, WalletBalanceResponse, AnyActionIntent, ChatResponse, ChatMessage, SuggestionResponse, SuggestionFact)
+from ..services.solana_rpc import TOKEN_API_IDS, get_token_prices, get_wallet_balances, get_wallet_balances_batch
+from ..services.pool_registry import get_pool_registry
+from .schemas import (YieldPool, TokenBalance, WalletBalanceResponse, AnyActionIntent, ChatResponse, ChatMessage, SuggestionResponse, SuggestionFact,
+                      BatchWalletBalanceRequest, BatchWalletBalanceResponse)
+from .token_cache import VerifiedToken, VerifiedTokenCache
+from .context_snapshot import ChatContextCache, ContextSection
+from .chat_context import render_vaults, render_balances
 from jose import JWTError, jwt
+from ..utils import metrics
+
+try:
+    from ..main import settings
+except ImportError:
+    class MockSettings:
+        JWT_CACHE_ENABLED: bool = True
+        JWT_CACHE_MAX_ENTRIES: int = 10_000
+        JWT_CACHE_MAX_TTL: float = 300.0
+        CHAT_CONTEXT_CACHE_ENABLED: bool = True
+        CHAT_CONTEXT_MAX_ENTRIES: int = 10_000
+        CHAT_CONTEXT_MAX_AGE: float = 15.0
+        CHAT_CONTEXT_MODE: str = "auto"
+        CHAT_CONTEXT_TOP_N: int = 10
+        CHAT_CONTEXT_MAX_TOKENS: int = 800
+    settings = MockSettings()
 
 
 router = APIRouter()
@@ -34,20 +58,43 @@ async def get_raw_token(token: str = Depends(oauth2_schema)) -> str:
     logger.debug(f"Received auth token (first 10 chars): {token[:10]}...")
     return token
 
-async def get_current_payload(token: str = Depends(get_raw_token)) -> Dict[str, Any]:
+# The same bearer token is reused across many chat turns and dashboard calls, so verified
+# tokens are cached (keyed by hash, expiring no later than their `exp` claim)
+token_cache: Optional[VerifiedTokenCache] = (
+    VerifiedTokenCache(max_entries=settings.JWT_CACHE_MAX_ENTRIES, max_ttl=settings.JWT_CACHE_MAX_TTL)
+    if settings.JWT_CACHE_ENABLED else None
+)
+if token_cache is not None:
+    metrics.register_cache("jwt", token_cache.stats)
+
+async def get_verified_token(token: str = Depends(get_raw_token)) -> VerifiedToken:
     """
-    Decodes and validates the JWT, returning its payload.
+    Decodes and validates the JWT (or reuses a cached verification of the same token).
     """
+    if token_cache is not None:
+        cached = token_cache.get(token)
+        if cached is not None:
+            return cached
     try:
+        started = time.perf_counter()
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        verify_seconds = time.perf_counter() - started
     except JWTError as e:
         logger.warning(f"JWT decoding failed: {e}")
         raise credentials_exception
+    if token_cache is not None:
+        return token_cache.put(token, payload, verify_seconds)
+    return VerifiedToken(payload, expires_at=float("inf"))
+
+async def get_current_payload(verified: VerifiedToken = Depends(get_verified_token)) -> Dict[str, Any]:
+    """
+    Returns the validated JWT's payload (shared with the token cache; treat as read-only).
+    """
+    return verified.payload
 
-async def get_user_public_key(payload: Dict[str, Any] = Depends(get_current_payload)) -> str:
+async def get_user_public_key(verified: VerifiedToken = Depends(get_verified_token)) -> str:
     """Dependency to extract Solana public key from validated JWT."""
-    pubkey: Optional[str] = payload.get("solanaPubkey")
+    pubkey: Optional[str] = verified.solana_pubkey
     
     if pubkey is None:
         logger.error("JWT payload is missing 'solanaPubkey' field.")
@@ -55,6 +102,27 @@ async def get_user_public_key(payload: Dict[str, Any] = Depends(get_current_payl
         
     logger.debug(f"Extracted solanaPubkey: {pubkey}")
     return pubkey
+
+# Claim marking a token as issued to a Senti backend job rather than to a user
+INTERNAL_SERVICE_ROLE = "service"
+
+async def require_internal_service(verified: VerifiedToken = Depends(get_verified_token)) -> Dict[str, Any]:
+    """Dependency for internal-only endpoints: the JWT must carry `"role": "service"`. User tokens get 403."""
+    if verified.payload.get("role") != INTERNAL_SERVICE_ROLE:
+        logger.warning("Rejected a non-service token on an internal endpoint.")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="This endpoint is restricted to internal services.")
+    return verified.payload
+
+async def get_conversation_key(verified: VerifiedToken = Depends(get_verified_token)) -> str:
+    """
+    Dependency: the caller's verified identity (JWT `userId`, else `solanaPubkey`), which keys
+    their chat memory. The `{user_id}` path parameter is not verified here, so it must not.
+    """
+    key = verified.user_id or verified.solana_pubkey
+    if key is None:
+        logger.error("JWT payload has neither 'userId' nor 'solanaPubkey'.")
+        raise credentials_exception
+    return str(key)
   
 
 ###############################################################################################
@@ -87,9 +155,10 @@ async def get_suggestion_for_user(
         raise HTTPException(status_code=500, detail="Failed to retrieve user vault data.") from e
 
     try:
-        # TODO: Engine needs access to live pool data from solana_rpc as well
-        live_pools = [] # Call RPC service
-        suggestion_fact: Optional[SuggestionFact] = find_best_yield_suggestion(target_asset=asset, user_vaults=user_vaults, available_pools= live_pools)
+        # Live pools are kept indexed by the registry; the best safe pool is a dict lookup
+        best_pool = get_pool_registry().best_safe_pool(asset, MAX_MVP_RISK_SCORE)
+        with metrics.track_stage("engine"):
+            suggestion_fact: Optional[SuggestionFact] = build_suggestion(target_asset=asset, user_vaults=user_vaults, best_available_pool=best_pool)
         if suggestion_fact is None:
             logger.error(f"Core engine returned None for suggestion user {user_id}, asset {asset}.")
             raise HTTPException(status_code=500, detail="Could not determine a valid suggestion.")
@@ -105,6 +174,9 @@ async def get_suggestion_for_user(
     try:
         nlp_suggestion_text = await generate_nlp_suggestion(suggestion_fact)
         logger.info(f"NLP layer generated suggestions: {nlp_suggestion_text}")
+    except HTTPException as http_exc:
+        # e.g. 429/503 with Retry-After when the LLM is overloaded
+        raise http_exc
     except Exception as e:
         logger.error(f"Error generating NLP suggestions for user {user_id}: {e}", exc_info = True)
         raise HTTPException(
@@ -116,85 +188,154 @@ async def get_suggestion_for_user(
     return SuggestionResponse (suggestion_text = nlp_suggestion_text)
 
 
-@router.post(
-    "/chat/{user_id}",
-    response_model=ChatResponse,
-    summary="Chat with Lucy AI",
-    description="Send a message to Lucy and get a conversational response.",
-    tags=["Chat"]
-)
-async def chat_with_lucy(
-    chat_message: ChatMessage,
-    user_id: str = Path(..., description="The unique identifier for the User"),
-    auth_token: str = Depends(get_raw_token), 
-    user_pubkey: str = Depends(get_user_public_key),
-):
+# Sections are sized with the tokenizer (see chat_context.count_tokens), so together they stay
+# within CHAT_CONTEXT_MAX_TOKENS. Split between the two; a wallet rarely holds many tokens
+_BALANCES_CONTEXT_TOKENS = settings.CHAT_CONTEXT_MAX_TOKENS // 4
+_VAULTS_CONTEXT_TOKENS = settings.CHAT_CONTEXT_MAX_TOKENS - _BALANCES_CONTEXT_TOKENS - 1 # - 1 for the joining newline
+
+
+def _vaults_fingerprint(user_vaults: List[UserVaultData]) -> Hashable:
+    return tuple((v.id, v.name, v.token, v.totalDeposits, v.yieldRate, v.locked, v.lockPeriodDays) for v in user_vaults)
+
+
+def _balances_fingerprint(wallet_balances: Optional[WalletBalanceResponse]) -> Hashable:
+    if not wallet_balances:
+        return ()
+    return tuple((bal.token_symbol, bal.amount_ui, bal.value_usd) for bal in wallet_balances.balances)
+
+
+def _with_usd_values(wallet_balances: Any, prices: Any) -> Any:
     """
-    Handles conversational interactions with the Lucy AI.
+    A copy of the balances with value_usd filled from the price cache, so compact contexts can rank
+    and total holdings in USD. The fetched response is shared with the balance caches, so it is
+    never modified. Anything else (errors, no prices) passes through unchanged.
     """
-    logger.info(f"Received chat message from user_id: {user_id}: '{chat_message.message}'")
+    if not isinstance(wallet_balances, WalletBalanceResponse) or not isinstance(prices, dict):
+        return wallet_balances
+    balances = [
+        bal.model_copy(update={"value_usd": bal.amount_ui * prices[bal.token_symbol]})
+        if bal.value_usd is None and prices.get(bal.token_symbol) is not None else bal
+        for bal in wallet_balances.balances
+    ]
+    return wallet_balances.model_copy(update={"balances": balances})
+
+
+def _vaults_section(user_vaults: Any, prices: Optional[Dict[str, Optional[float]]] = None) -> ContextSection:
+    if isinstance(user_vaults, HTTPException):
+        logger.warning(f"Failed to fetch user vaults (HTTP {user_vaults.status_code}): {user_vaults.detail}")
+        return None, lambda: f"Error retrieving vault details ({user_vaults.status_code})."
+    if isinstance(user_vaults, Exception):
+        logger.warning(f"Failed to fetch user vaults for chat context: {user_vaults}")
+        return None, lambda: "Error retrieving vault details."
+    # The prices of the vaults' tokens are inputs too: compact mode ranks and totals by USD value
+    vault_prices = {v.token: prices.get(v.token) for v in user_vaults or []} if prices else None
+    fingerprint = (_vaults_fingerprint(user_vaults or []), tuple(sorted(vault_prices.items())) if vault_prices else ())
+    return fingerprint, lambda: render_vaults(
+        user_vaults or [], mode=settings.CHAT_CONTEXT_MODE, top_n=settings.CHAT_CONTEXT_TOP_N, max_tokens=_VAULTS_CONTEXT_TOKENS,
+        prices=vault_prices,
+    )
+
+
+def _balances_section(wallet_balances: Any) -> ContextSection:
+    if isinstance(wallet_balances, HTTPException):
+        logger.warning(f"Failed to fetch wallet balances (HTTP {wallet_balances.status_code}): {wallet_balances.detail}")
+        return None, lambda: f"Error retrieving wallet balances ({wallet_balances.status_code})."
+    if isinstance(wallet_balances, Exception):
+        logger.warning(f"Failed to fetch wallet balances for chat context: {wallet_balances}")
+        return None, lambda: "Error retrieving wallet balances."
+    return _balances_fingerprint(wallet_balances), lambda: render_balances(
+        wallet_balances, mode=settings.CHAT_CONTEXT_MODE, top_n=settings.CHAT_CONTEXT_TOP_N, max_tokens=_BALANCES_CONTEXT_TOKENS
+    )
+
+
+# Consecutive chat turns usually see the same vaults and balances, so each user's rendered
+# context is kept and only rebuilt when its inputs change
+context_cache: Optional[ChatContextCache] = (
+    ChatContextCache(max_entries=settings.CHAT_CONTEXT_MAX_ENTRIES, max_age=settings.CHAT_CONTEXT_MAX_AGE)
+    if settings.CHAT_CONTEXT_CACHE_ENABLED else None
+)
+if context_cache is not None:
+    metrics.register_cache("chat_context", context_cache.stats)
 
 
+async def build_chat_context(user_id: str, auth_token: str, user_pubkey: str) -> str:
+    """
+    Renders the user's vaults and wallet balances as the chat LLM's context. Reuses the user's
+    snapshot without fetching while it is fresh, and its rendered text while the inputs are unchanged.
+    Never raises.
+    """
+    if context_cache is not None:
+        cached = context_cache.get_fresh(user_id, user_pubkey)
+        if cached is not None:
+            logger.debug(f"Reusing chat context snapshot for user {user_id}")
+            return cached
 
     user_context_str: str = "Could not retrieve user context."
     try:
         logger.debug(f"Fetching context for user {user_id}, pubkey {user_pubkey}")
         user_vaults_task = get_user_vaults(user_id=user_id, auth_token=auth_token)
         wallet_balances_task = get_wallet_balances(wallet_address=user_pubkey) 
+        prices_task = get_token_prices(list(TOKEN_API_IDS)) # Served from the refreshed price cache
 
-        user_vaults, wallet_balances = await asyncio.gather(
+        user_vaults, wallet_balances, prices = await asyncio.gather(
             user_vaults_task,
             wallet_balances_task,
+            prices_task,
             return_exceptions=True 
         )
-        
-        context_parts = []
-
-        if isinstance(user_vaults, HTTPException):
-             logger.warning(f"Failed to fetch user vaults (HTTP {user_vaults.status_code}): {user_vaults.detail}")
-             context_parts.append(f"Error retrieving vault details ({user_vaults.status_code}).")
-        elif isinstance(user_vaults, Exception):
-             logger.warning(f"Failed to fetch user vaults for chat context: {user_vaults}")
-             context_parts.append("Error retrieving vault details.")
-        elif user_vaults:
-             vault_summaries = []
-             for vault in user_vaults:
-                 status = "Locked" if vault.locked else "Unlocked"
-                 apy_percent = vault.yieldRate * 100
-                 lock_info = f" ({vault.lockPeriodDays} days)" if vault.lockPeriodDays else ""
-                 vault_summaries.append(
-                     f"- Vault '{vault.name}': {vault.totalDeposits:.2f} {vault.token}, APY: {apy_percent:.2f}%, Status: {status}{lock_info}"
-                 )
-             context_parts.append("User's Vaults:\n" + "\n".join(vault_summaries))
+        if isinstance(prices, Exception):
+            logger.warning(f"Failed to fetch token prices for chat context: {prices}")
+            prices = None
+        wallet_balances = _with_usd_values(wallet_balances, prices)
+
+        sections = [_vaults_section(user_vaults, prices), _balances_section(wallet_balances)]
+        if context_cache is not None:
+            user_context_str = context_cache.render(user_id, user_pubkey, sections)
         else:
-             context_parts.append("User has no Senti vaults.")
-
-
-        if isinstance(wallet_balances, HTTPException):
-            logger.warning(f"Failed to fetch wallet balances (HTTP {wallet_balances.status_code}): {wallet_balances.detail}")
-            context_parts.append(f"Error retrieving wallet balances ({wallet_balances.status_code}).")
-        elif isinstance(wallet_balances, Exception):
-            logger.warning(f"Failed to fetch wallet balances for chat context: {wallet_balances}")
-            context_parts.append("Error retrieving wallet balances.")
-        elif wallet_balances and wallet_balances.balances: # Check if list is not empty
-            balance_summaries = [f"- Wallet: {bal.amount_ui:.4f} {bal.token_symbol}" for bal in wallet_balances.balances]
-            context_parts.append("User's Wallet Balances:\n" + "\n".join(balance_summaries))
-        else: # Handles None response or empty balances list
-             context_parts.append("Could not find wallet balances or wallet is empty.")
-
-        user_context_str = "\n".join(context_parts)
+            user_context_str = "\n".join(render() for _, render in sections)
         logger.debug(f"Providing context to LLM:\n{user_context_str}")
 
     except Exception as e:
         logger.error(f"Unexpected error fetching context for chat user {user_id}: {e}", exc_info=True)
         user_context_str = "An unexpected error occurred while retrieving account details."
+    return user_context_str
+
+
+def _invalidate_chat_context(user_id: str, action_intent: Optional[AnyActionIntent]) -> None:
+    # An action intent means the user is about to move funds; don't answer the next turn from a stale snapshot
+    if action_intent is not None and context_cache is not None:
+        context_cache.invalidate(user_id)
+
+
+@router.post(
+    "/chat/{user_id}",
+    response_model=ChatResponse,
+    summary="Chat with Lucy AI",
+    description="Send a message to Lucy and get a conversational response.",
+    tags=["Chat"]
+)
+async def chat_with_lucy(
+    chat_message: ChatMessage,
+    user_id: str = Path(..., description="The unique identifier for the User"),
+    auth_token: str = Depends(get_raw_token), 
+    user_pubkey: str = Depends(get_user_public_key),
+    conversation_key: str = Depends(get_conversation_key),
+):
+    """
+    Handles conversational interactions with the Lucy AI.
+    """
+    logger.info(f"Received chat message from user_id: {user_id}: '{chat_message.message}'")
+
+
 
+    user_context_str = await build_chat_context(user_id=user_id, auth_token=auth_token, user_pubkey=user_pubkey)
 
     try:
 
         ai_result_dict = await generate_chat_response(
             user_message=chat_message.message,
-            user_context=user_context_str
+            user_context=user_context_str,
+            user_id=conversation_key
         )
         ai_response_text: str = ai_result_dict.get("text")
         action_intent_result: Optional[AnyActionIntent] = ai_result_dict.get("action_intent")
@@ -215,9 +356,74 @@ async def chat_with_lucy(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get response from AI."
         )
+    _invalidate_chat_context(user_id, action_intent_result)
     return ChatResponse(response=ai_response_text, action_intent=action_intent_result)
 
 
+def _sse_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def _prepend(first: Any, rest: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    yield first
+    async for item in rest:
+        yield item
+
+
+@router.post(
+    "/chat/{user_id}/stream",
+    summary="Chat with Lucy AI (streaming)",
+    description=(
+        "Same as POST /chat/{user_id}, but streams the reply as Server-Sent Events: "
+        "`delta` events carry `{\"text\": ...}` fragments as they are generated, and the stream ends "
+        "with exactly one of `final` (the complete ChatResponse: `response`, `action_intent`) or "
+        "`error` (`{\"detail\": ...}`, generation failed)."
+    ),
+    response_class=StreamingResponse,
+    tags=["Chat"]
+)
+async def chat_with_lucy_stream(
+    chat_message: ChatMessage,
+    user_id: str = Path(..., description="The unique identifier for the User"),
+    auth_token: str = Depends(get_raw_token),
+    user_pubkey: str = Depends(get_user_public_key),
+    conversation_key: str = Depends(get_conversation_key),
+):
+    """
+    Streaming conversational interactions with the Lucy AI.
+    """
+    logger.info(f"Received streaming chat message from user_id: {user_id}: '{chat_message.message}'")
+    user_context_str = await build_chat_context(user_id=user_id, auth_token=auth_token, user_pubkey=user_pubkey)
+
+    events = stream_chat_response(user_message=chat_message.message, user_context=user_context_str, user_id=conversation_key)
+    # Wait for the first event before committing to a 200 stream, so LLM overload still
+    # surfaces as a plain 429/503 with Retry-After
+    first_event = await events.__anext__()
+
+    async def event_stream():
+        try:
+            async for event in _prepend(first_event, events):
+                if event["type"] == "delta":
+                    yield _sse_event("delta", json.dumps({"text": event["text"]}))
+                elif event.get("error"):
+                    # The text streamed so far is incomplete, so there is no final ChatResponse
+                    yield _sse_event("error", json.dumps({"detail": "Failed to get response from AI."}))
+                else:
+                    final = ChatResponse(response=event["text"], action_intent=event["action_intent"])
+                    _invalidate_chat_context(user_id, event["action_intent"])
+                    yield _sse_event("final", final.model_dump_json())
+        finally:
+            # Client went away mid-stream: stop generating and free the LLM slot right away
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop proxies (e.g. nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 
 @router.get(
     "/balances",
@@ -245,4 +451,26 @@ async def get_user_wallet_balances_endpoint(
         # Catch unexpected errors
         logger.error(f"Error fetching wallet balance for {user_pubkey}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to retrieve wallet balances.")
+
+
+@router.post(
+    "/balances/batch",
+    response_model=BatchWalletBalanceResponse,
+    summary="Get Wallet Balances in Bulk",
+    description="Fetches SOL, USDC and USDT balances for many wallet addresses in one call. For internal jobs (portfolio snapshots, notifications) only: requires a service token (`\"role\": \"service\"` claim).",
+    tags=["Wallet"]
+)
+async def get_wallet_balances_batch_endpoint(
+    batch_request: BatchWalletBalanceRequest,
+    payload: Dict[str, Any] = Depends(require_internal_service)
+):
+    """Endpoint to retrieve on-chain balances for a list of wallet addresses."""
+    logger.info(f"Received batch balance request for {len(batch_request.wallet_addresses)} wallet(s)")
+    try:
+        return await get_wallet_balances_batch(batch_request.wallet_addresses)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error(f"Error fetching batch wallet balances: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to retrieve wallet balances.")
 # --- END OF ADDED BLOCK --
\ No newline at end of file
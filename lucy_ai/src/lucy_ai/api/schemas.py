@@ -42,6 +42,18 @@ class WalletBalanceResponse(BaseModel):
     wallet_address: str
     balances: List[TokenBalance]
 
+class BatchWalletBalanceRequest(BaseModel):
+    wallet_addresses: List[str] = Field(..., min_length=1)
+
+class WalletBalanceError(BaseModel):
+    wallet_address: str
+    status_code: int
+    detail: str
+
+class BatchWalletBalanceResponse(BaseModel):
+    results: List[WalletBalanceResponse]
+    errors: List[WalletBalanceError] = []
+
 class DepositActionIntent(BaseModel):
     action_type: Literal["DEPOSIT_VAULT"] = "DEPOSIT_VAULT"
     amount: float
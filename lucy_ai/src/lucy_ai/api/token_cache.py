@@ -0,0 +1,83 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class VerifiedToken:
+    """A bearer token whose signature and claims have been verified, with the claims we read memoized."""
+    __slots__ = ("payload", "user_id", "solana_pubkey", "expires_at")
+
+    def __init__(self, payload: Dict[str, Any], expires_at: float):
+        self.payload = payload
+        self.user_id: Optional[str] = payload.get("userId")
+        self.solana_pubkey: Optional[str] = payload.get("solanaPubkey")
+        self.expires_at = expires_at # Wall-clock time, comparable with the `exp` claim
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of verified JWTs, keyed by the SHA-256 of the raw token (raw tokens are
+    never stored). An entry expires after `max_ttl` seconds and never later than the token's
+    `exp` claim, so a cached token can't outlive its validity. Only successful verifications
+    are cached.
+
+    `seconds_saved` estimates the verification CPU time avoided: each hit is credited with the
+    running average of real verification times.
+    """
+    def __init__(self, max_entries: int = 10_000, max_ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[bytes, VerifiedToken]" = OrderedDict()
+        self._avg_verify_seconds = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[VerifiedToken]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.seconds_saved += self._avg_verify_seconds
+        return entry
+
+    def put(self, token: str, payload: Dict[str, Any], verify_seconds: float) -> VerifiedToken:
+        """Caches a freshly verified token; `verify_seconds` is how long the verification took."""
+        self._avg_verify_seconds = verify_seconds if self._avg_verify_seconds == 0.0 else 0.9 * self._avg_verify_seconds + 0.1 * verify_seconds
+        expires_at = time.time() + self.max_ttl
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, float(exp))
+        entry = VerifiedToken(payload, expires_at)
+        key = self._key(token)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "avg_verify_seconds": self._avg_verify_seconds,
+            "seconds_saved": self.seconds_saved,
+        }
@@ -0,0 +1,177 @@
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# (role, text, estimated tokens); role is "human" or "ai" as in LangChain message tuples
+Turn = Tuple[str, str, int]
+
+CHARS_PER_TOKEN = 4 # Rough average for English text with OpenAI/Gemini tokenizers
+SUMMARY_SNIPPET_TOKENS = 30 # Each summarized turn keeps about this many tokens of its start
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer dependency); good enough for budgeting prompts."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _summarize_turn(role: str, text: str) -> str:
+    speaker = "User" if role == "human" else "Lucy"
+    text = " ".join(text.split())
+    max_chars = SUMMARY_SNIPPET_TOKENS * CHARS_PER_TOKEN
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + "…"
+    return f"- {speaker}: {text}"
+
+
+class _Conversation:
+    __slots__ = ("turns", "summary_lines", "summary_tokens", "tokens", "last_used")
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.summary_lines: Deque[Tuple[str, int]] = deque() # Compressed turns that left the ring buffer
+        self.summary_tokens = 0
+        self.tokens = 0 # turns + summary, for the global cap
+        self.last_used = time.monotonic()
+
+
+class ConversationStore:
+    """
+    Per-user chat memory kept in memory:
+
+    - recent turns live in a fixed-size ring buffer per user; turns pushed out
+      of it are folded into a compact running summary (one short line per turn,
+      oldest lines dropped beyond `max_summary_tokens`)
+    - conversations idle for `idle_ttl` seconds are dropped, and the least
+      recently used ones are evicted while the total exceeds `max_total_tokens`
+    - build_prompt_history() fits the summary and as many recent turns as
+      possible into a token budget, summarizing the turns that don't fit
+    """
+    def __init__(
+        self,
+        max_turns: int = 20,
+        idle_ttl: float = 1800.0,
+        max_total_tokens: int = 2_000_000,
+        max_summary_tokens: int = 400,
+    ):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_total_tokens = max_total_tokens
+        self.max_summary_tokens = max_summary_tokens
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._total_tokens = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    @property
+    def total_tokens(self) -> int:
+        return self._total_tokens
+
+    def _get(self, user_id: str) -> Optional[_Conversation]:
+        self._evict_idle()
+        conversation = self._conversations.get(user_id)
+        if conversation is not None:
+            conversation.last_used = time.monotonic()
+            self._conversations.move_to_end(user_id)
+        return conversation
+
+    def _drop(self, user_id: str) -> None:
+        conversation = self._conversations.pop(user_id, None)
+        if conversation is not None:
+            self._total_tokens -= conversation.tokens
+
+    def _evict_idle(self) -> None:
+        # LRU order: idle conversations are at the front
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._conversations:
+            user_id, conversation = next(iter(self._conversations.items()))
+            if conversation.last_used > cutoff:
+                break
+            self._drop(user_id)
+            self.evictions += 1
+
+    def _add_summary_line(self, conversation: _Conversation, role: str, text: str) -> None:
+        line = _summarize_turn(role, text)
+        tokens = estimate_tokens(line)
+        conversation.summary_lines.append((line, tokens))
+        conversation.summary_tokens += tokens
+        conversation.tokens += tokens
+        self._total_tokens += tokens
+        while conversation.summary_tokens > self.max_summary_tokens and conversation.summary_lines:
+            _, dropped = conversation.summary_lines.popleft()
+            conversation.summary_tokens -= dropped
+            conversation.tokens -= dropped
+            self._total_tokens -= dropped
+
+    def _append_turn(self, conversation: _Conversation, role: str, text: str) -> None:
+        if len(conversation.turns) == conversation.turns.maxlen:
+            old_role, old_text, old_tokens = conversation.turns[0] # Pushed out by the append below
+            conversation.tokens -= old_tokens
+            self._total_tokens -= old_tokens
+            self._add_summary_line(conversation, old_role, old_text)
+        tokens = estimate_tokens(text)
+        conversation.turns.append((role, text, tokens))
+        conversation.tokens += tokens
+        self._total_tokens += tokens
+
+    def append_exchange(self, user_id: str, user_message: str, ai_response: str) -> None:
+        """Records one user message and Lucy's reply."""
+        conversation = self._get(user_id)
+        if conversation is None:
+            conversation = _Conversation(self.max_turns)
+            self._conversations[user_id] = conversation
+        self._append_turn(conversation, "human", user_message)
+        self._append_turn(conversation, "ai", ai_response)
+        while self._total_tokens > self.max_total_tokens and len(self._conversations) > 1:
+            oldest_user_id = next(iter(self._conversations))
+            self._drop(oldest_user_id)
+            self.evictions += 1
+
+    def build_prompt_history(self, user_id: str, token_budget: int) -> Tuple[List[Tuple[str, str]], str]:
+        """
+        Returns (recent turns as (role, text) message tuples, oldest first; summary of everything
+        older) whose estimated size fits `token_budget`. Recent turns are kept verbatim newest first
+        until the budget runs out; the remainder is summarized.
+        """
+        conversation = self._get(user_id)
+        if conversation is None or token_budget <= 0:
+            return [], ""
+
+        turns = list(conversation.turns)
+        summary_budget = min(self.max_summary_tokens, token_budget // 4)
+        verbatim_budget = token_budget - min(summary_budget, conversation.summary_tokens)
+        kept: List[Tuple[str, str]] = []
+        used = 0
+        split = len(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            role, text, tokens = turns[i]
+            if used + tokens > verbatim_budget:
+                break
+            kept.append((role, text))
+            used += tokens
+            split = i
+        kept.reverse()
+
+        # Older lines first; the most recent summarized lines are the most useful, so keep those
+        summary_lines = [line for line, _ in conversation.summary_lines] + [_summarize_turn(role, text) for role, text, _ in turns[:split]]
+        remaining = max(0, token_budget - used)
+        selected: List[str] = []
+        for line in reversed(summary_lines):
+            tokens = estimate_tokens(line)
+            if tokens > remaining:
+                break
+            selected.append(line)
+            remaining -= tokens
+        selected.reverse()
+        return kept, "\n".join(selected)
+
+    def clear(self, user_id: Optional[str] = None) -> None:
+        if user_id is None:
+            self._conversations.clear()
+            self._total_tokens = 0
+        else:
+            self._drop(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {"conversations": len(self._conversations), "total_tokens": self._total_tokens, "evictions": self.evictions}
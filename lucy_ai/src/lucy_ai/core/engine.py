@@ -1,4 +1,4 @@
-from typing import List, Optional, Literal, Dict, Any
+from typing import List, Optional, Literal, Dict, Any, Mapping, Sequence, Tuple
 import logging
 from ..api.schemas import SuggestionFact, YieldPool
 from ..services.senti_backend import UserVaultData
@@ -27,20 +27,38 @@ AVAILABLE_POOLS_MVP: List[YieldPool] = [
     YieldPool(pool_id="lido_sol_sol", protocol_name="Lido Staking", asset="SOL", current_apy=6.8, risk_score=2),
 ]
 
+SUPPORTED_ENGINE_ASSETS: Tuple[str, ...] = ("USDC", "USDT", "SOL")
+APY_IMPROVEMENT_THRESHOLD = 0.5 # Suggest a move only if the gain is > 0.5% APY
+
+def select_best_safe_pool(
+    target_asset: Literal["USDT", "USDC", "SOL"],
+    available_pools: List[YieldPool]
+) -> Optional[YieldPool]:
+    """Highest-APY pool for the asset within MAX_MVP_RISK_SCORE (linear scan; see PoolRegistry for the indexed lookup)."""
+    relevant_available_pools = [p for p in available_pools if p.asset == target_asset]
+    safe_available_pools= [p for p in relevant_available_pools if p.risk_score <= MAX_MVP_RISK_SCORE]
+    if not safe_available_pools:
+        return None
+    return max(safe_available_pools, key = lambda pool: pool.current_apy)
+
+
 def find_best_yield_suggestion(
     target_asset: Literal["USDT", "USDC", "SOL"],
     user_vaults: List[UserVaultData],
     available_pools: List[YieldPool] = AVAILABLE_POOLS_MVP
 ) -> SuggestionFact:
-
-    logger.info(f"Engine: Finding suggestion for {target_asset}. User has {len(user_vaults)} vaults total.")
     logger.info(f"Finding best yield for asset: {target_asset} with risk <= {MAX_MVP_RISK_SCORE}")
-    relevant_available_pools = [p for p in available_pools if p.asset == target_asset]
-    safe_available_pools= [p for p in relevant_available_pools if p.risk_score <= MAX_MVP_RISK_SCORE]
+    return build_suggestion(target_asset, user_vaults, select_best_safe_pool(target_asset, available_pools))
+
 
-    best_available_pool: Optional[YieldPool] = None
-    if safe_available_pools:
-        best_available_pool = max(safe_available_pools, key = lambda pool: pool.current_apy)
+def build_suggestion(
+    target_asset: Literal["USDT", "USDC", "SOL"],
+    user_vaults: List[UserVaultData],
+    best_available_pool: Optional[YieldPool]
+) -> SuggestionFact:
+    """Decides what to suggest given the best safe pool for the asset (None if there is none)."""
+    logger.info(f"Engine: Finding suggestion for {target_asset}. User has {len(user_vaults)} vaults total.")
+    if best_available_pool is not None:
         logger.info(f"Engine: Best available safe pool: {best_available_pool.pool_id} @ {best_available_pool.current_apy:.2f}% APY")
     else:
         logger.warning(f"Engine: No safe available pools found for {target_asset}.")
@@ -73,7 +91,7 @@ def find_best_yield_suggestion(
         # user_current_best_apy remains 0.0
 
     # 3. Decision Logic
-    apy_improvement_threshold = 0.5 # Suggest move only if gain is > 0.5% APY
+    apy_improvement_threshold = APY_IMPROVEMENT_THRESHOLD
 
     # Scenario 1: User has unlocked funds, and a better external option exists
     if user_current_unlocked_vaults_asset and best_available_pool.current_apy > user_current_best_apy + apy_improvement_threshold:
@@ -91,7 +109,7 @@ def find_best_yield_suggestion(
         )
 
     # Scenario 2: User has no funds (or only locked funds) for this asset, suggest best initial deposit
-    elif not user_has_asset_in_vault or not user_unlocked_vaults_asset:
+    elif not user_has_asset_in_vault or not user_current_unlocked_vaults_asset:
          logger.info("Engine: Suggesting DEPOSIT_TO_BEST")
          return SuggestionFact(
             suggestion_type="DEPOSIT_TO_BEST",
@@ -103,7 +121,7 @@ def find_best_yield_suggestion(
          )
 
     # Scenario 3: User has unlocked funds, but no significantly better external option exists
-    else: # Implies user_unlocked_vaults_asset exists and the external option isn't much better
+    else: # Implies user_current_unlocked_vaults_asset exists and the external option isn't much better
         logger.info("Engine: Suggesting HOLD_CURRENT")
         return SuggestionFact(
             suggestion_type="HOLD_CURRENT",
@@ -114,6 +132,154 @@ def find_best_yield_suggestion(
             reasoning="Your current unlocked vault offers a competitive yield right now."
         )
 
+def find_best_yield_suggestions_batch(
+    user_vaults_by_user: Mapping[str, Sequence[UserVaultData]],
+    assets: Sequence[str] = SUPPORTED_ENGINE_ASSETS,
+    available_pools: Sequence[YieldPool] = AVAILABLE_POOLS_MVP
+) -> Dict[str, Dict[str, SuggestionFact]]:
+    """
+    Computes the SuggestionFact for every (user, asset) pair in one vectorised pass.
+    Used by bulk jobs such as nightly "better yield available" sweeps.
+
+    Results are identical to calling find_best_yield_suggestion(asset, vaults, available_pools)
+    for each pair: same IEEE float arithmetic, and ties resolve to the first pool/vault
+    in list order just like max().
+    """
+    import numpy as np # Only bulk jobs need it; keeps it off the service's import path
+
+    user_ids = list(user_vaults_by_user.keys())
+    n_users, n_assets = len(user_ids), len(assets)
+    asset_index = {asset: i for i, asset in enumerate(assets)}
+    logger.info(f"Engine: Batch suggestions for {n_users} user(s) x {n_assets} asset(s) over {len(available_pools)} pool(s)")
+
+    # --- Best safe pool per asset ---
+    best_pool_for_asset: List[Optional[YieldPool]] = [None] * n_assets
+    if available_pools:
+        pool_asset = np.array([asset_index.get(p.asset, -1) for p in available_pools])
+        pool_apy = np.array([p.current_apy for p in available_pools], dtype=np.float64)
+        pool_safe = np.array([p.risk_score for p in available_pools]) <= MAX_MVP_RISK_SCORE
+        for a in range(n_assets):
+            candidates = np.flatnonzero((pool_asset == a) & pool_safe)
+            if candidates.size:
+                # argmax returns the first maximum, like max()
+                best_pool_for_asset[a] = available_pools[int(candidates[np.argmax(pool_apy[candidates])])]
+
+    # --- Flatten every vault into columns ---
+    vault_user: List[int] = []
+    vault_asset: List[int] = []
+    vault_rate: List[float] = []
+    vault_locked: List[bool] = []
+    vault_refs: List[UserVaultData] = []
+    for u, user_id in enumerate(user_ids):
+        for vault in user_vaults_by_user[user_id]:
+            a = asset_index.get(vault.token)
+            if a is None:
+                continue
+            vault_user.append(u)
+            vault_asset.append(a)
+            vault_rate.append(vault.yieldRate)
+            vault_locked.append(vault.locked)
+            vault_refs.append(vault)
+
+    n_pairs = n_users * n_assets
+    pair_key = np.array(vault_user, dtype=np.int64) * n_assets + np.array(vault_asset, dtype=np.int64)
+    rates = np.array(vault_rate, dtype=np.float64)
+    unlocked = ~np.array(vault_locked, dtype=bool)
+    positions = np.arange(len(vault_refs))
+
+    has_asset = np.zeros(n_pairs, dtype=bool)
+    has_asset[pair_key] = True
+
+    # Best unlocked yieldRate per pair, and the first vault reaching it
+    best_rate = np.full(n_pairs, -np.inf)
+    np.maximum.at(best_rate, pair_key[unlocked], rates[unlocked])
+    has_unlocked = np.isfinite(best_rate)
+    at_best = unlocked & (rates == best_rate[pair_key])
+    best_vault_pos = np.full(n_pairs, len(vault_refs), dtype=np.int64)
+    np.minimum.at(best_vault_pos, pair_key[at_best], positions[at_best])
+
+    # yieldRate (e.g. 0.10) -> APY percent (e.g. 10.0); 0.0 when nothing is unlocked
+    user_best_apy = np.where(has_unlocked, best_rate * 100, 0.0)
+
+    # --- Decision logic, mirroring build_suggestion ---
+    best_pool_apy = np.array([p.current_apy if p else np.nan for p in best_pool_for_asset], dtype=np.float64)
+    pair_pool_apy = np.tile(best_pool_apy, n_users)
+    has_pool = ~np.isnan(pair_pool_apy)
+    move = has_pool & has_unlocked & (pair_pool_apy > user_best_apy + APY_IMPROVEMENT_THRESHOLD)
+    deposit = has_pool & ~move & (~has_asset | ~has_unlocked)
+
+    move_l, deposit_l, has_pool_l = move.tolist(), deposit.tolist(), has_pool.tolist()
+    user_best_apy_l, best_vault_pos_l = user_best_apy.tolist(), best_vault_pos.tolist()
+
+    # Facts only depend on (asset, outcome, current APY, vault name) and vault yield rates come
+    # from a handful of plans, so identical facts are built once and shared (treat as read-only).
+    facts: Dict[Tuple[Any, ...], SuggestionFact] = {}
+    results: Dict[str, Dict[str, SuggestionFact]] = {}
+    for u, user_id in enumerate(user_ids):
+        user_facts: Dict[str, SuggestionFact] = {}
+        for a, asset in enumerate(assets):
+            i = u * n_assets + a
+            if not has_pool_l[i]:
+                key = (a, "NO_SUGGESTION")
+            elif move_l[i]:
+                key = (a, "MOVE_TO_BETTER_YIELD", user_best_apy_l[i])
+            elif deposit_l[i]:
+                key = (a, "DEPOSIT_TO_BEST")
+            else:
+                key = (a, "HOLD_CURRENT", user_best_apy_l[i], vault_refs[best_vault_pos_l[i]].name)
+            fact = facts.get(key)
+            if fact is None:
+                fact = facts[key] = _build_batch_fact(asset, key[1], best_pool_for_asset[a], *key[2:])
+            user_facts[asset] = fact
+        results[user_id] = user_facts
+    return results
+
+
+def _build_batch_fact(
+    asset: str,
+    suggestion_type: str,
+    pool: Optional[YieldPool],
+    current_apy: float = 0.0,
+    vault_name: Optional[str] = None
+) -> SuggestionFact:
+    """Builds one batch outcome with exactly the fields and wording of build_suggestion."""
+    if suggestion_type == "NO_SUGGESTION":
+        return SuggestionFact(
+            suggestion_type="NO_SUGGESTION",
+            asset=asset,
+            reasoning=f"Could not find suitable yield opportunities under risk score {MAX_MVP_RISK_SCORE}."
+        )
+    if suggestion_type == "MOVE_TO_BETTER_YIELD":
+        apy_gain = pool.current_apy - current_apy
+        return SuggestionFact(
+            suggestion_type="MOVE_TO_BETTER_YIELD",
+            asset=asset,
+            current_apy=current_apy,
+            apy=pool.current_apy,
+            apy_gain=apy_gain,
+            protocol_name=pool.protocol_name,
+            recommended_pool_id=pool.pool_id,
+            reasoning=f"Found a stable option with {apy_gain:.1f}% higher APY."
+        )
+    if suggestion_type == "DEPOSIT_TO_BEST":
+        return SuggestionFact(
+            suggestion_type="DEPOSIT_TO_BEST",
+            asset=asset,
+            apy=pool.current_apy,
+            protocol_name=pool.protocol_name,
+            recommended_pool_id=pool.pool_id,
+            reasoning=f"Found a good starting yield opportunity at {pool.current_apy:.1f}% APY."
+        )
+    return SuggestionFact(
+        suggestion_type="HOLD_CURRENT",
+        asset=asset,
+        current_apy=current_apy,
+        apy=current_apy,
+        protocol_name=vault_name or "your current vault",
+        reasoning="Your current unlocked vault offers a competitive yield right now."
+    )
+
+
 def analyze_chat_intent(message: str) -> Optional[Dict[str, Any]]:
     """
     Placeholder: Analyzes user chat message to extract structured action intents.
@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_CHAT = 0 # Interactive chat, a user is waiting on it
+PRIORITY_SUGGESTION = 1 # Suggestion text, usually cached
+PRIORITY_BACKGROUND = 2 # Cache warming, never worth delaying a user for
+
+
+class LLMOverloadedError(Exception):
+    """
+    The scheduler refused (or gave up queueing) an LLM call.
+    `status_code` is 429 when the queue was full and 503 when the queue-time deadline
+    passed; `retry_after` is a hint in whole seconds.
+    """
+    def __init__(self, provider: str, status_code: int, retry_after: int, reason: str):
+        super().__init__(f"LLM provider {provider} overloaded: {reason}")
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future")
+
+    def __init__(self, priority: int, seq: int, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    """
+    Admission control for one LLM provider.
+
+    At most `max_concurrency` calls run at once; further callers wait in a
+    priority queue (FIFO within a priority) of at most `max_queue` entries.
+    When the queue is full, a newcomer displaces the newest waiter of a lower
+    priority if there is one and is rejected otherwise. Waiters that are not
+    admitted within their deadline give up. Rejections raise LLMOverloadedError
+    with a Retry-After hint derived from recent call durations, so overload
+    turns into fast 429/503s instead of piling up provider sockets.
+    """
+    def __init__(self, provider: str, max_concurrency: int = 16, max_queue: int = 64):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self._running = 0
+        self._queue: List[_Waiter] = [] # heap
+        self._seq = itertools.count()
+        self._avg_call_seconds = 2.0 # EWMA of admitted call durations, seeds Retry-After
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for w in self._queue if not w.future.done())
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current backlog has drained."""
+        backlog = self._running + self.queued
+        return max(1, math.ceil(self._avg_call_seconds * backlog / self.max_concurrency))
+
+    def _overloaded(self, status_code: int, reason: str) -> LLMOverloadedError:
+        return LLMOverloadedError(self.provider, status_code, self.retry_after(), reason)
+
+    def _prune(self) -> None:
+        while self._queue and self._queue[0].future.done():
+            heapq.heappop(self._queue)
+
+    def _make_room(self, priority: int) -> bool:
+        """Frees a queue slot by displacing the newest waiter with a lower priority than `priority`."""
+        live = [w for w in self._queue if not w.future.done()]
+        if len(live) < self.max_queue:
+            return True
+        victim: Optional[_Waiter] = max(live, default=None)
+        if victim is None or victim.priority <= priority:
+            return False
+        victim.future.set_exception(self._overloaded(429, "displaced by a higher-priority request"))
+        return True
+
+    async def _acquire(self, priority: int, timeout: Optional[float]) -> None:
+        self._prune()
+        if self._running < self.max_concurrency and self.queued == 0:
+            self._running += 1
+            return
+
+        if not self._make_room(priority):
+            self.rejected += 1
+            logger.warning(f"LLM scheduler [{self.provider}]: Queue full ({self.max_queue}), rejecting priority {priority} request")
+            raise self._overloaded(429, "queue full")
+
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        try:
+            # The slot is handed over by _release, already counted in _running
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=timeout)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                waiter.future.cancel()
+                self.timed_out += 1
+                logger.warning(f"LLM scheduler [{self.provider}]: Priority {priority} request waited over {timeout:.1f}s, giving up")
+                raise self._overloaded(503, "queue deadline exceeded")
+            # Admitted (or displaced) at the same moment the deadline passed. Raised from this
+            # handler, a displacement would skip the LLMOverloadedError clause below, so count it here
+            displaced = waiter.future.exception()
+            if displaced is not None:
+                self.rejected += 1
+                raise displaced
+        except LLMOverloadedError:
+            self.rejected += 1
+            raise
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self._release() # Was handed a slot but the caller went away
+            else:
+                waiter.future.cancel()
+            raise
+
+    def _release(self) -> None:
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if not waiter.future.done():
+                waiter.future.set_result(None) # Hand the slot over without touching _running
+                return
+        self._running -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_SUGGESTION, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """Holds one of the provider's concurrency slots for the duration of the block."""
+        await self._acquire(priority, timeout)
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_call_seconds = 0.8 * self._avg_call_seconds + 0.2 * elapsed
+            self._release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": self._running,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
@@ -1,80 +1,146 @@
 import os
+import asyncio
+import json
+import threading
+import time
 import logging
-from typing import Optional, Any, Dict
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from fastapi import HTTPException
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Optional, Any, AsyncIterator, Dict, List, Tuple, Union
+from fastapi import HTTPException, status
 from ..api.schemas import SuggestionFact, DepositActionIntent, SwapActionIntent, AnyActionIntent
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-LLM_MODEL_NAME_OPENAI = os.getenv("LLM_MODEL_NAME_OPENAI", "gpt-4o-mini")
-LLM_MODEL_NAME_GEMINI = os.getenv("LLM_MODEL_NAME_GEMINI", "gemini-1.5-flash-latest")
+from .suggestion_cache import SuggestionTextCache
+from .conversation_memory import ConversationStore, estimate_tokens
+from .llm_scheduler import LLMScheduler, LLMOverloadedError, PRIORITY_CHAT, PRIORITY_SUGGESTION, PRIORITY_BACKGROUND
+from ..utils.microbatch import MicroBatcher
+from ..utils import metrics
+
+try:
+    from ..main import settings
+except ImportError:
+    class MockSettings:
+        SUGGESTION_CACHE_ENABLED: bool = True
+        SUGGESTION_CACHE_MAX_ENTRIES: int = 1024
+        SUGGESTION_CACHE_TTL: float = 3600.0
+        SUGGESTION_CACHE_VARIANTS: int = 3
+        LLM_MAX_CONCURRENCY: int = 16
+        LLM_PROVIDER_MAX_CONCURRENCY: Dict[str, int] = {}
+        LLM_MAX_QUEUE: int = 64
+        LLM_CHAT_QUEUE_TIMEOUT: float = 10.0
+        LLM_SUGGESTION_QUEUE_TIMEOUT: float = 5.0
+        SUGGESTION_BATCH_ENABLED: bool = True
+        SUGGESTION_BATCH_WINDOW_MS: float = 20.0
+        SUGGESTION_BATCH_MAX_SIZE: int = 8
+        CHAT_MEMORY_ENABLED: bool = True
+        CHAT_MEMORY_MAX_TURNS: int = 20
+        CHAT_MEMORY_IDLE_TTL: float = 1800.0
+        CHAT_MEMORY_MAX_TOTAL_TOKENS: int = 2_000_000
+        CHAT_MEMORY_MAX_SUMMARY_TOKENS: int = 400
+        CHAT_PROMPT_TOKEN_BUDGET: int = 3000
+    settings = MockSettings()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# LangChain and the provider SDKs take seconds to import, so nothing LLM-related is built at
+# import time: init_llm() builds it all on first use, or ahead of time via start_llm_warmup().
 llm = None
 llm_with_tools = None
-llm_provider = "None (Using Fallback)" 
-
-if OPENAI_API_KEY:
-    try:
-        llm = ChatOpenAI(model=LLM_MODEL_NAME_OPENAI, temperature=0.7, openai_api_key=OPENAI_API_KEY)
-        llm_provider = f"OpenAI ({LLM_MODEL_NAME_OPENAI})"
-        logger.info(f"Initialized LLM with {llm_provider}")
-    except Exception as e:
-        logger.error(f"Failed to initialize OpenAI LLM: {e}. Trying Google Gemini.")
-        llm = None
-
-# If OpenAI failed or key not set, try Google Gemini
-if llm is None and GOOGLE_API_KEY:
-    try:
-        llm = ChatGoogleGenerativeAI(model=LLM_MODEL_NAME_GEMINI, temperature=0.7, google_api_key=GOOGLE_API_KEY)
-        llm_provider = f"Google Gemini ({LLM_MODEL_NAME_GEMINI})"
-        logger.info(f"Initialized LLM with {llm_provider}")
-    except Exception as e:
-        logger.error(f"Failed to initialize Google Gemini LLM: {e}")
-        llm = None 
-
-if llm is None:
-    logger.warning("Neither OpenAI nor Google API Key found or LLM initialization failed. LLM features disabled.")
-else:
-    try:
-        ACTION_TOOLS = [DepositActionIntent, SwapActionIntent]
-        llm_with_tools = llm.bind_tools(ACTION_TOOLS)
-        logger.info("Successfully bound action tools (DepositActionIntent, SwapActionIntent) to LLM.")
-    except Exception as e:
-        logger.error(f"Failed to bind tools to LLM: {e}", exc_info=True)
-        llm_with_tools = None
+llm_provider = "Not initialized yet"
+llm_provider_key: Optional[str] = None # "openai" / "gemini", keys the LLM scheduler
+llm_init_seconds: Optional[float] = None
+_llm_initialized = False
+_llm_init_lock = threading.Lock() # init_llm runs in a worker thread
+_llm_warmup_task: Optional[asyncio.Task] = None
 
 def get_llm_info() -> str:
     """Returns information about the initialized LLM."""
     return llm_provider
 
 
+# --- LLM admission control ---
+_llm_schedulers: Dict[str, LLMScheduler] = {}
+
+def get_llm_scheduler(provider: Optional[str] = None) -> LLMScheduler:
+    """Returns the admission scheduler for a provider (default: the active one), creating it on first use."""
+    provider = provider or llm_provider_key or "none"
+    scheduler = _llm_schedulers.get(provider)
+    if scheduler is None:
+        max_concurrency = settings.LLM_PROVIDER_MAX_CONCURRENCY.get(provider, settings.LLM_MAX_CONCURRENCY)
+        scheduler = LLMScheduler(provider, max_concurrency=max_concurrency, max_queue=settings.LLM_MAX_QUEUE)
+        _llm_schedulers[provider] = scheduler
+        metrics.register_stats("llm_scheduler", provider, scheduler.stats)
+    return scheduler
+
+
+def _overloaded_http_exception(retry_after: int, status_code: int = status.HTTP_503_SERVICE_UNAVAILABLE) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail="Lucy is handling a lot of requests right now. Please try again shortly.",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def _provider_rate_limit_exception(e: Exception) -> Optional[HTTPException]:
+    """Maps a provider-side rate limit (HTTP 429 from OpenAI/Gemini) to a fast 503 with Retry-After."""
+    if getattr(e, "status_code", None) != 429 and getattr(e, "code", None) != 429:
+        return None
+    logger.warning(f"LLM provider {llm_provider} is rate limiting us: {e}")
+    return _overloaded_http_exception(get_llm_scheduler().retry_after())
+
+
+@asynccontextmanager
+async def _llm_slot(priority: int, timeout: Optional[float], chain: str) -> AsyncIterator[None]:
+    """
+    Holds an LLM scheduler slot for one call of `chain` (timed in metrics from admission);
+    a refused admission becomes a 429/503 HTTPException with Retry-After.
+    """
+    scheduler = get_llm_scheduler()
+    try:
+        async with scheduler.slot(priority, timeout=timeout):
+            with metrics.track_llm_call(scheduler.provider, chain):
+                yield
+    except LLMOverloadedError as e:
+        raise _overloaded_http_exception(e.retry_after, status_code=e.status_code) from e
+
+
 LUCY_BASE_PROMPT = """
 You are 'Lucy,' a friendly, calm, and informed financial AI co-pilot for the Senti platform. Your goal is to translate structured financial data into a simple, reassuring, and actionable suggestion for the user. Use natural language, avoid jargon. Keep it concise (1-2 sentences).
 """
 
-SUGGESTION_PROMPT_TEMPLATE = ChatPromptTemplate.from_messages([
+# Plain text (no template variables): the values come from the analysis data's fields
+SUGGESTION_TYPE_RULES = """
+    - If "MOVE_TO_BETTER_YIELD": Emphasize the APY gain (e.g., "earn +`apy_gain`% more", one decimal) and mention the `protocol_name`.
+    - If "HOLD_CURRENT": Reassure the user their current unlocked vault (`protocol_name`) is performing well at `apy`% APY (one decimal).
+    - If "DEPOSIT_TO_BEST": Recommend depositing `asset` to `protocol_name` to start earning `apy`% APY (one decimal).
+    - If "NO_SUGGESTION": Gently inform the user there are no better safe options matching their risk profile right now.
+    - If "ERROR": Apologize that an error occurred while analyzing options.
+"""
+
+SUGGESTION_PROMPT_MESSAGES = [
     ("system", LUCY_BASE_PROMPT + " Generate a concise suggestion based on the following analysis data."),
     ("human", """
     Analysis Data:
     ```json
     {suggestion_data}
     ```
-    Please formulate a friendly message for the user based on the `suggestion_type`:
-    - If "MOVE_TO_BETTER_YIELD": Emphasize the APY gain (e.g., "earn +{apy_gain:.1f}% more") and mention the {protocol_name}.
-    - If "HOLD_CURRENT": Reassure the user their current unlocked vault ('{protocol_name}') is performing well at {apy:.1f}% APY.
-    - If "DEPOSIT_TO_BEST": Recommend depositing {asset} to {protocol_name} to start earning {apy:.1f}% APY.
-    - If "NO_SUGGESTION": Gently inform the user there are no better safe options matching their risk profile right now.
-    - If "ERROR": Apologize that an error occurred while analyzing options.
+    Please formulate a friendly message for the user based on the `suggestion_type`:""" + SUGGESTION_TYPE_RULES)
+]
+
+# Several independent suggestions in one provider round-trip (see generate_nlp_suggestion batching)
+SUGGESTION_BATCH_PROMPT_MESSAGES = [
+    ("system", LUCY_BASE_PROMPT + " Generate one concise suggestion for each item of the following analysis data. Each item is for a different user."),
+    ("human", """
+    Analysis Data (a JSON array of {count} items):
+    ```json
+    {suggestions_data}
+    ```
+    For each item, formulate a friendly message for the user based on its `suggestion_type`:""" + SUGGESTION_TYPE_RULES + """
+    Respond with ONLY a JSON array of exactly {count} strings, where the i-th string is the message for the i-th item.
     """)
-])
+]
 
-CHAT_PROMPT_TEMPLATE = ChatPromptTemplate.from_messages([
+CHAT_PROMPT_MESSAGES = [
     ("system", LUCY_BASE_PROMPT + """
 You are now in a conversational chat mode.
 - Use the "Current User Context" provided below to answer the user's questions about their balances, vaults, and status.
@@ -84,36 +150,171 @@ You are now in a conversational chat mode.
 - If details are missing (e.g., "I want to deposit"), ask for them in your text response.
 - ALWAYS provide a friendly text response in addition to using a tool.
 - **NEW RULE:** If the user's requested action (like a deposit) is not directly possible, but you identify a necessary **prerequisite action** (like a swap), you must **proactively return the tool call for that prerequisite action** (e.g., `SwapActionIntent`). Your text response should explain why this new action is necessary (e.g., "To do that, you'll first need to swap...").
+- Earlier turns of the conversation precede the current message; older ones are summarized under "Earlier in this conversation". Don't make the user repeat themselves.
 """),
+    ("placeholder", "{history}"),
     ("human", """
 User Message: {user_message}
 
 Current User Context:
 {user_context}
+
+Earlier in this conversation:
+{conversation_summary}
 """)
-])
+]
 
 
-output_parser = StrOutputParser()
 suggestion_chain = None
+suggestion_batch_chain = None
 chat_chain = None
 
-if llm:
-    try:
-        suggestion_chain = SUGGESTION_PROMPT_TEMPLATE | llm | output_parser
-        if llm_with_tools:
-            chat_chain = CHAT_PROMPT_TEMPLATE | llm_with_tools
-            logger.info(f"Langchain chat chain created with tools using {llm_provider}.")
-        else:
-            logger.warning("Tool-bound LLM not available. Chat chain will be text-only.")
-            chat_chain = CHAT_PROMPT_TEMPLATE | llm | output_parser
-    except Exception as e:
-        logger.error(f"Failed to create Langchain chains: {e}", exc_info=True)
-else:
-    logger.warning("LLM chains could not be created as no LLM is available.")
+
+def init_llm() -> None:
+    """
+    Imports the LLM SDKs and builds the provider client, tool binding, chains and suggestion
+    batcher. Blocking (seconds of imports), idempotent and thread-safe; use ensure_llm() from async code.
+    """
+    global llm, llm_provider, llm_provider_key, llm_init_seconds, _llm_initialized
+    with _llm_init_lock:
+        if _llm_initialized:
+            return
+        started = time.perf_counter()
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        google_api_key = os.getenv("GOOGLE_API_KEY")
+        model_name_openai = os.getenv("LLM_MODEL_NAME_OPENAI", "gpt-4o-mini")
+        model_name_gemini = os.getenv("LLM_MODEL_NAME_GEMINI", "gemini-1.5-flash-latest")
+        llm_provider = "None (Using Fallback)"
+
+        if openai_api_key:
+            try:
+                from langchain_openai import ChatOpenAI
+                # stream_usage: token counts for streamed replies too (see metrics.record_llm_usage)
+                llm = ChatOpenAI(model=model_name_openai, temperature=0.7, openai_api_key=openai_api_key, stream_usage=True)
+                llm_provider = f"OpenAI ({model_name_openai})"
+                llm_provider_key = "openai"
+                logger.info(f"Initialized LLM with {llm_provider}")
+            except Exception as e:
+                logger.error(f"Failed to initialize OpenAI LLM: {e}. Trying Google Gemini.")
+                llm = None
+
+        # If OpenAI failed or key not set, try Google Gemini
+        if llm is None and google_api_key:
+            try:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                llm = ChatGoogleGenerativeAI(model=model_name_gemini, temperature=0.7, google_api_key=google_api_key)
+                llm_provider = f"Google Gemini ({model_name_gemini})"
+                llm_provider_key = "gemini"
+                logger.info(f"Initialized LLM with {llm_provider}")
+            except Exception as e:
+                logger.error(f"Failed to initialize Google Gemini LLM: {e}")
+                llm = None
+
+        if llm is None:
+            logger.warning("Neither OpenAI nor Google API Key found or LLM initialization failed. LLM features disabled.")
+        _build_chains()
+
+        llm_init_seconds = time.perf_counter() - started
+        _llm_initialized = True
+
+
+def _build_chains() -> None:
+    """Binds the tools and builds the chains and suggestion batcher around `llm`. Called with _llm_init_lock held."""
+    global llm_with_tools, suggestion_chain, suggestion_batch_chain, chat_chain, suggestion_batcher
+    from langchain_core.prompts import ChatPromptTemplate
+
+    if llm is not None:
+        try:
+            ACTION_TOOLS = [DepositActionIntent, SwapActionIntent]
+            llm_with_tools = llm.bind_tools(ACTION_TOOLS)
+            logger.info("Successfully bound action tools (DepositActionIntent, SwapActionIntent) to LLM.")
+        except Exception as e:
+            logger.error(f"Failed to bind tools to LLM: {e}", exc_info=True)
+            llm_with_tools = None
+
+    # Chains return the AIMessage (not a parsed string) so its usage_metadata reaches the metrics
+    if llm:
+        try:
+            suggestion_chain = ChatPromptTemplate.from_messages(SUGGESTION_PROMPT_MESSAGES) | llm
+            suggestion_batch_chain = ChatPromptTemplate.from_messages(SUGGESTION_BATCH_PROMPT_MESSAGES) | llm
+            if llm_with_tools:
+                chat_chain = ChatPromptTemplate.from_messages(CHAT_PROMPT_MESSAGES) | llm_with_tools
+                logger.info(f"Langchain chat chain created with tools using {llm_provider}.")
+            else:
+                logger.warning("Tool-bound LLM not available. Chat chain will be text-only.")
+                chat_chain = ChatPromptTemplate.from_messages(CHAT_PROMPT_MESSAGES) | llm
+        except Exception as e:
+            logger.error(f"Failed to create Langchain chains: {e}", exc_info=True)
+    else:
+        logger.warning("LLM chains could not be created as no LLM is available.")
+
+    if settings.SUGGESTION_BATCH_ENABLED and settings.SUGGESTION_BATCH_MAX_SIZE > 1 and suggestion_batch_chain is not None:
+        suggestion_batcher = MicroBatcher(
+            "nlp_suggestions",
+            _generate_llm_suggestions_batch,
+            window=settings.SUGGESTION_BATCH_WINDOW_MS / 1000,
+            max_batch_size=settings.SUGGESTION_BATCH_MAX_SIZE,
+        )
+        metrics.register_stats("microbatch", suggestion_batcher.name, suggestion_batcher.stats)
+
+
+def install_llm(model: Any, provider_key: str, provider_name: Optional[str] = None) -> None:
+    """
+    Uses `model` (any LangChain chat model) instead of the configured provider, e.g. the fake
+    LLM of the load benchmarks. Call before the first LLM use; later init_llm() calls are no-ops.
+    """
+    global llm, llm_provider, llm_provider_key, llm_init_seconds, _llm_initialized
+    with _llm_init_lock:
+        started = time.perf_counter()
+        llm = model
+        llm_provider_key = provider_key
+        llm_provider = provider_name or provider_key
+        _build_chains()
+        llm_init_seconds = time.perf_counter() - started
+        _llm_initialized = True
+        logger.info(f"Installed LLM {llm_provider}")
+
+
+def is_llm_ready() -> bool:
+    """True once init_llm() has finished (with a provider, or in fallback mode)."""
+    return _llm_initialized
+
+
+async def ensure_llm() -> None:
+    """Runs init_llm() in a worker thread on first use, so the event loop keeps serving meanwhile."""
+    if not _llm_initialized:
+        await asyncio.to_thread(init_llm)
+
+
+def start_llm_warmup() -> asyncio.Task:
+    """Starts building the LLM in the background (called from the app lifespan); returns the task."""
+    global _llm_warmup_task
+    if _llm_warmup_task is None:
+        async def _warm_up() -> None:
+            try:
+                await ensure_llm()
+                logger.info(f"🧠 LLM ready: {llm_provider} (initialized in {llm_init_seconds:.2f}s)")
+            except Exception as e:
+                logger.error(f"LLM warm-up failed: {e}", exc_info=True)
+        _llm_warmup_task = asyncio.create_task(_warm_up())
+    return _llm_warmup_task
+
+
+# Suggestion text only depends on the (quantized) fact, so LLM phrasings are reused across users
+suggestion_text_cache: Optional[SuggestionTextCache] = (
+    SuggestionTextCache(
+        max_entries=settings.SUGGESTION_CACHE_MAX_ENTRIES,
+        ttl=settings.SUGGESTION_CACHE_TTL,
+        max_variants=settings.SUGGESTION_CACHE_VARIANTS,
+    )
+    if settings.SUGGESTION_CACHE_ENABLED else None
+)
+if suggestion_text_cache is not None:
+    metrics.register_cache("suggestion_text", suggestion_text_cache.stats)
 
 async def generate_nlp_suggestion(fact: SuggestionFact) -> str:
-    """Generates NLP text for a pre-calculated SuggestionFact."""
+    """Generates NLP text for a pre-calculated SuggestionFact, served from suggestion_text_cache when possible."""
+    await ensure_llm()
     if not suggestion_chain:
         logger.warning("LLM chain is not available. Using fallback for suggestions.")
         
@@ -132,19 +333,44 @@ async def generate_nlp_suggestion(fact: SuggestionFact) -> str:
         except Exception as e:
             logger.error(f"Error in fallback suggestion formatting: {e}")
             return "Processing your financial options."
-        
 
+    if suggestion_text_cache is not None:
+        return await suggestion_text_cache.get_or_generate(
+            fact,
+            _generate_suggestion_text,
+            background_generate=partial(_generate_suggestion_text, priority=PRIORITY_BACKGROUND),
+        )
+    return await _generate_suggestion_text(fact)
+
+
+async def _generate_suggestion_text(fact: SuggestionFact, priority: int = PRIORITY_SUGGESTION) -> str:
+    """LLM suggestion text, micro-batched with concurrent requests when batching is enabled."""
+    if suggestion_batcher is not None:
+        return await suggestion_batcher.submit((fact, priority))
+    return await _generate_llm_suggestion(fact, priority)
+
+
+async def _generate_llm_suggestion(fact: SuggestionFact, priority: int = PRIORITY_SUGGESTION) -> str:
+    """Asks the LLM to phrase a SuggestionFact."""
     try:
         
         fact_dict_str = fact.model_dump_json(indent=2, exclude_none=True)
         logger.info(f"Generating NLP suggestion for fact:\n{fact_dict_str}")
 
-        response = await suggestion_chain.ainvoke({"suggestion_data": fact_dict_str})
+        async with _llm_slot(priority, timeout=settings.LLM_SUGGESTION_QUEUE_TIMEOUT, chain="suggestion"):
+            response = await suggestion_chain.ainvoke({"suggestion_data": fact_dict_str})
+        metrics.record_llm_usage(llm_provider_key or "none", "suggestion", response)
+        response_text = _content_text(response.content)
         
-        logger.info(f"LLM Response: {response}")
-        return response.strip()
+        logger.info(f"LLM Response: {response_text}")
+        return response_text.strip()
 
+    except HTTPException:
+        raise
     except Exception as e:
+        rate_limited = _provider_rate_limit_exception(e)
+        if rate_limited is not None:
+            raise rate_limited from e
         logger.error(f"Error generating NLP suggestion: {e}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -152,8 +378,126 @@ async def generate_nlp_suggestion(fact: SuggestionFact) -> str:
         ) from e
 
 
-async def generate_chat_response(user_message: str, user_context: Optional[str] = None) -> Dict[str, Any]:
-    """Generates a conversational response using the LLM, incorporating context."""
+def _parse_batch_texts(response: str, count: int) -> List[str]:
+    """Parses the batch prompt's reply: a JSON array of `count` strings, optionally in a ```json fence."""
+    text = response.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    texts = json.loads(text)
+    if not isinstance(texts, list) or len(texts) != count or not all(isinstance(t, str) and t.strip() for t in texts):
+        raise ValueError(f"Expected a JSON array of {count} non-empty strings")
+    return [t.strip() for t in texts]
+
+
+async def _generate_llm_suggestions_batch(items: List[Tuple[SuggestionFact, int]]) -> List[Union[str, Exception]]:
+    """
+    MicroBatcher handler: phrases several facts with one LLM call (one scheduler slot, at the
+    batch's most urgent priority). If the reply can't be parsed, each fact is retried on its own.
+    """
+    if len(items) == 1:
+        fact, priority = items[0]
+        try:
+            return [await _generate_llm_suggestion(fact, priority)]
+        except Exception as e:
+            return [e]
+
+    priority = min(p for _, p in items)
+    suggestions_data = json.dumps([fact.model_dump(exclude_none=True) for fact, _ in items], indent=2)
+    logger.info(f"Generating {len(items)} NLP suggestions in one batched LLM call")
+    try:
+        async with _llm_slot(priority, timeout=settings.LLM_SUGGESTION_QUEUE_TIMEOUT, chain="suggestion_batch"):
+            response = await suggestion_batch_chain.ainvoke({"suggestions_data": suggestions_data, "count": len(items)})
+        metrics.record_llm_usage(llm_provider_key or "none", "suggestion_batch", response)
+        texts = _parse_batch_texts(_content_text(response.content), len(items))
+    except HTTPException as e:
+        return [e] * len(items)
+    except Exception as e:
+        rate_limited = _provider_rate_limit_exception(e)
+        if rate_limited is not None:
+            return [rate_limited] * len(items)
+        logger.warning(f"Batched suggestion call failed ({e}); generating {len(items)} suggestion(s) individually.")
+        return await asyncio.gather(*[_generate_llm_suggestion(fact, p) for fact, p in items], return_exceptions=True)
+
+    logger.info(f"LLM batch response: {texts}")
+    return texts
+
+
+suggestion_batcher: Optional[MicroBatcher] = None # Built by init_llm()
+
+
+# Recent chat turns per user, so follow-up questions keep their context
+conversation_store: Optional[ConversationStore] = (
+    ConversationStore(
+        max_turns=settings.CHAT_MEMORY_MAX_TURNS,
+        idle_ttl=settings.CHAT_MEMORY_IDLE_TTL,
+        max_total_tokens=settings.CHAT_MEMORY_MAX_TOTAL_TOKENS,
+        max_summary_tokens=settings.CHAT_MEMORY_MAX_SUMMARY_TOKENS,
+    )
+    if settings.CHAT_MEMORY_ENABLED else None
+)
+if conversation_store is not None:
+    metrics.register_stats("chat_memory", "conversations", conversation_store.stats)
+
+
+def _chat_inputs(user_message: str, user_context: str, user_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Chat chain inputs. The user's history gets whatever is left of CHAT_PROMPT_TOKEN_BUDGET
+    after the message and context, so prompt size stays bounded however long the conversation.
+    """
+    history: List[Tuple[str, str]] = []
+    summary = ""
+    if conversation_store is not None and user_id is not None:
+        budget = settings.CHAT_PROMPT_TOKEN_BUDGET - estimate_tokens(user_message) - estimate_tokens(user_context)
+        history, summary = conversation_store.build_prompt_history(user_id, budget)
+    return {
+        "user_message": user_message,
+        "user_context": user_context,
+        "history": history,
+        "conversation_summary": summary or "(nothing earlier)",
+    }
+
+
+def _remember_exchange(user_id: Optional[str], user_message: str, ai_response_text: str) -> None:
+    if conversation_store is not None and user_id is not None and ai_response_text:
+        conversation_store.append_exchange(user_id, user_message, ai_response_text)
+
+
+TOOL_PARSE_FALLBACK_TEXT = "I understood your request but had a slight issue processing the details. Could you try rephrasing?"
+
+
+def _parse_action_intent(tool_calls: List[Dict[str, Any]]) -> Optional[AnyActionIntent]:
+    """Maps the first tool call of an LLM response to its action intent schema. Raises if the args don't validate."""
+    tool_call = tool_calls[0] # Get the first tool
+    tool_name = tool_call.get("name")
+    tool_args = tool_call.get("args", {})
+
+    logger.info(f"AI detected tool call: {tool_name} with args {tool_args}")
+
+    # Match the tool name to your Pydantic schema
+    if tool_name == "DepositActionIntent":
+        return DepositActionIntent(**tool_args)
+    elif tool_name == "SwapActionIntent":
+        return SwapActionIntent(**tool_args)
+    return None
+
+
+def _content_text(content: Any) -> str:
+    """Text of a message (chunk) content: a plain string, or the text parts of a multi-part content list."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part if isinstance(part, str) else part.get("text", "")
+            for part in content
+            if isinstance(part, str) or (isinstance(part, dict) and part.get("type") == "text")
+        )
+    return ""
+
+
+async def generate_chat_response(user_message: str, user_context: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Generates a conversational response using the LLM, incorporating context and (with a user_id) the user's earlier turns."""
+    await ensure_llm()
     if not chat_chain:
         logger.warning("Chat LLM chain not available. Returning generic fallback.")
         return {"text": "I'm currently unable to process chat messages. Please try again later.", "action_intent": None}
@@ -161,9 +505,18 @@ async def generate_chat_response(user_message: str, user_context: Optional[str]
     if not llm_with_tools:
         logger.warning("Chat chain is in text-only fallback mode.")
         try:
-            response_text = await chat_chain.ainvoke({"user_message": user_message, "user_context": user_context})
+            async with _llm_slot(PRIORITY_CHAT, timeout=settings.LLM_CHAT_QUEUE_TIMEOUT, chain="chat"):
+                response = await chat_chain.ainvoke(_chat_inputs(user_message, user_context or "No specific context provided.", user_id))
+            metrics.record_llm_usage(llm_provider_key or "none", "chat", response)
+            response_text = _content_text(response.content)
+            _remember_exchange(user_id, user_message, response_text.strip())
             return {"text": response_text.strip(), "action_intent": None}
+        except HTTPException:
+            raise
         except Exception as e:
+            rate_limited = _provider_rate_limit_exception(e)
+            if rate_limited is not None:
+                raise rate_limited from e
             logger.error(f"Error in text-only chat fallback: {e}", exc_info=True)
             return {"text": "Sorry, I encountered an issue while trying to respond.", "action_intent": None}
 
@@ -173,10 +526,9 @@ async def generate_chat_response(user_message: str, user_context: Optional[str]
         logger.info(f"Generating chat response for message: '{user_message}'")
         logger.debug(f"Context provided to chat LLM:\n{context_str}")
 
-        response = await chat_chain.ainvoke({
-            "user_message": user_message,
-            "user_context": context_str
-        })
+        async with _llm_slot(PRIORITY_CHAT, timeout=settings.LLM_CHAT_QUEUE_TIMEOUT, chain="chat"):
+            response = await chat_chain.ainvoke(_chat_inputs(user_message, context_str, user_id))
+        metrics.record_llm_usage(llm_provider_key or "none", "chat", response)
         ai_response_text = ""
         if isinstance(response.content, str):
             ai_response_text = response.content.strip()
@@ -191,31 +543,96 @@ async def generate_chat_response(user_message: str, user_context: Optional[str]
         action_intent_result: Optional[AnyActionIntent] = None
         if response.tool_calls:
             try:
-                tool_call = response.tool_calls[0] # Get the first tool
-                tool_name = tool_call.get("name")
-                tool_args = tool_call.get("args", {})
-                
-                logger.info(f"AI detected tool call: {tool_name} with args {tool_args}")
-                
-                # Match the tool name to your Pydantic schema
-                if tool_name == "DepositActionIntent":
-                    action_intent_result = DepositActionIntent(**tool_args)
-                elif tool_name == "SwapActionIntent":
-                    action_intent_result = SwapActionIntent(**tool_args)
-                    
+                action_intent_result = _parse_action_intent(response.tool_calls)
             except Exception as e:
                 # If parsing the tool fails, log it but don't crash
                 logger.error(f"Failed to parse AI tool call: {e}", exc_info=True)
                 action_intent_result = None
                 if not ai_response_text: # Ensure we at least send a text response
-                    ai_response_text = "I understood your request but had a slight issue processing the details. Could you try rephrasing?"
+                    ai_response_text = TOOL_PARSE_FALLBACK_TEXT
 
         logger.info(f"LLM Chat Response: {ai_response_text}")
         if action_intent_result:
             logger.info(f"LLM Action Intent: {action_intent_result.model_dump()}")
-            
+
+        _remember_exchange(user_id, user_message, ai_response_text)
         return {"text": ai_response_text, "action_intent": action_intent_result}
 
+    except HTTPException:
+        raise
     except Exception as e:
+        rate_limited = _provider_rate_limit_exception(e)
+        if rate_limited is not None:
+            raise rate_limited from e
         logger.error(f"Error generating chat response: {e}", exc_info=True)
-        return {"text": "Sorry, I encountered an issue while trying to respond. Please try asking differently.", "action_intent": None}
\ No newline at end of file
+        return {"text": "Sorry, I encountered an issue while trying to respond. Please try asking differently.", "action_intent": None}
+
+
+async def stream_chat_response(user_message: str, user_context: Optional[str] = None, user_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of generate_chat_response. Yields {"type": "delta", "text": ...} events
+    as the LLM produces text, then exactly one {"type": "final", "text": ..., "action_intent": ...}
+    event with the full text and the action intent parsed from any tool call.
+    If the LLM is overloaded (scheduler or provider), HTTPException 429/503 is raised
+    before the first event; later errors are reported in the final event, never raised.
+    """
+    await ensure_llm()
+    if not chat_chain:
+        logger.warning("Chat LLM chain not available. Returning generic fallback.")
+        text = "I'm currently unable to process chat messages. Please try again later."
+        yield {"type": "delta", "text": text}
+        yield {"type": "final", "text": text, "action_intent": None}
+        return
+
+    context_str = user_context if user_context else "No specific context provided."
+    logger.info(f"Streaming chat response for message: '{user_message}'")
+    logger.debug(f"Context provided to chat LLM:\n{context_str}")
+
+    started = time.perf_counter()
+    first_token_at: Optional[float] = None
+    text_parts: List[str] = []
+    message = None # AIMessageChunks are merged as they arrive, so tool call args assemble themselves
+    try:
+        async with _llm_slot(PRIORITY_CHAT, timeout=settings.LLM_CHAT_QUEUE_TIMEOUT, chain="chat_stream"):
+            async for chunk in chat_chain.astream(_chat_inputs(user_message, context_str, user_id)):
+                message = chunk if message is None else message + chunk
+                delta = _content_text(chunk.content)
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    logger.info(f"Chat stream: First token after {(first_token_at - started) * 1000:.0f} ms")
+                text_parts.append(delta)
+                yield {"type": "delta", "text": delta}
+    except HTTPException:
+        raise
+    except Exception as e:
+        rate_limited = _provider_rate_limit_exception(e) if not text_parts else None
+        if rate_limited is not None:
+            raise rate_limited from e
+        logger.error(f"Error streaming chat response: {e}", exc_info=True)
+        if not text_parts:
+            text = "Sorry, I encountered an issue while trying to respond. Please try asking differently."
+            yield {"type": "delta", "text": text}
+            yield {"type": "final", "text": text, "action_intent": None, "error": True}
+            return
+        yield {"type": "final", "text": "".join(text_parts).strip(), "action_intent": None, "error": True}
+        return
+
+    metrics.record_llm_usage(llm_provider_key or "none", "chat_stream", message)
+    ai_response_text = "".join(text_parts).strip()
+    action_intent_result: Optional[AnyActionIntent] = None
+    if message is not None and getattr(message, "tool_calls", None):
+        try:
+            action_intent_result = _parse_action_intent(message.tool_calls)
+        except Exception as e:
+            logger.error(f"Failed to parse AI tool call: {e}", exc_info=True)
+            if not ai_response_text:
+                ai_response_text = TOOL_PARSE_FALLBACK_TEXT
+                yield {"type": "delta", "text": ai_response_text}
+
+    logger.info(f"Chat stream complete in {(time.perf_counter() - started) * 1000:.0f} ms: {ai_response_text}")
+    if action_intent_result:
+        logger.info(f"LLM Action Intent: {action_intent_result.model_dump()}")
+    _remember_exchange(user_id, user_message, ai_response_text)
+    yield {"type": "final", "text": ai_response_text, "action_intent": action_intent_result}
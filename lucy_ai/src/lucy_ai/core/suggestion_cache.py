@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..api.schemas import SuggestionFact
+
+logger = logging.getLogger(__name__)
+
+# APYs are shown to users at 0.1% resolution, so facts that only differ below that phrase identically
+APY_QUANTUM_DECIMALS = 1
+
+SuggestionKey = Tuple[Optional[object], ...]
+
+
+def canonical_suggestion_key(fact: SuggestionFact) -> SuggestionKey:
+    """Canonical, quantized form of a fact: equal keys produce interchangeable suggestion text."""
+    def q(value: Optional[float]) -> Optional[float]:
+        # + 0.0 folds -0.0 into 0.0
+        return None if value is None else round(value, APY_QUANTUM_DECIMALS) + 0.0
+
+    return (
+        fact.suggestion_type,
+        fact.asset,
+        fact.protocol_name,
+        fact.recommended_pool_id,
+        q(fact.current_apy),
+        q(fact.apy),
+        q(fact.apy_gain),
+        fact.reasoning,
+    )
+
+
+class _CachedSuggestion:
+    __slots__ = ("variants", "generations", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.variants: List[str] = []
+        self.generations = 0 # Successful LLM calls, so a model that repeats itself isn't asked forever
+        self.expires_at = expires_at
+
+
+class SuggestionTextCache:
+    """
+    LRU/TTL cache of LLM suggestion text keyed on canonical_suggestion_key(fact).
+
+    Each key keeps up to `max_variants` phrasings. The first request for a key
+    waits for the LLM (concurrent first requests share that call); afterwards a
+    random cached phrasing is served immediately and, until `max_variants`
+    phrasings have been generated, one more is generated in the background.
+    Failed generations are never cached.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, max_variants: int = 3):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_variants = max(1, max_variants)
+        self._entries: "OrderedDict[SuggestionKey, _CachedSuggestion]" = OrderedDict()
+        self._in_flight: Dict[SuggestionKey, asyncio.Future] = {} # Foreground generations, joined by concurrent misses
+        self._filling: Dict[SuggestionKey, asyncio.Future] = {} # Background variant fills, never joined by a reader
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "hit_ratio": self.hit_ratio}
+
+    def _lookup(self, key: SuggestionKey) -> Optional[_CachedSuggestion]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _add_variant(self, key: SuggestionKey, text: str) -> None:
+        entry = self._lookup(key)
+        if entry is None:
+            entry = _CachedSuggestion(time.monotonic() + self.ttl)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        entry.generations += 1
+        if text not in entry.variants and len(entry.variants) < self.max_variants:
+            entry.variants.append(text)
+
+    async def _generate(
+        self,
+        key: SuggestionKey,
+        fact: SuggestionFact,
+        generate: Callable[[SuggestionFact], Awaitable[str]],
+        registry: Dict[SuggestionKey, asyncio.Future],
+    ) -> str:
+        try:
+            text = await generate(fact)
+            self._add_variant(key, text)
+            return text
+        finally:
+            registry.pop(key, None)
+
+    def _start_generation(self, key: SuggestionKey, fact: SuggestionFact, generate: Callable[[SuggestionFact], Awaitable[str]]) -> asyncio.Future:
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._generate(key, fact, generate, self._in_flight))
+            self._in_flight[key] = future
+        return future
+
+    def _fill_variant_in_background(self, key: SuggestionKey, fact: SuggestionFact, generate: Callable[[SuggestionFact], Awaitable[str]]) -> None:
+        # Kept out of _in_flight: a reader that misses (entry expired or evicted meanwhile) must
+        # not end up waiting on a background-priority call, so it starts its own generation
+        if key in self._in_flight or key in self._filling:
+            return
+        task = asyncio.ensure_future(self._generate(key, fact, generate, self._filling))
+        self._filling[key] = task
+
+        def _done(t: asyncio.Future) -> None:
+            if not t.cancelled() and t.exception() is not None:
+                logger.warning(f"Suggestion cache: Background variant generation failed: {t.exception()}")
+
+        task.add_done_callback(_done)
+
+    async def get_or_generate(
+        self,
+        fact: SuggestionFact,
+        generate: Callable[[SuggestionFact], Awaitable[str]],
+        background_generate: Optional[Callable[[SuggestionFact], Awaitable[str]]] = None,
+    ) -> str:
+        """Cached text for `fact`, else `generate(fact)`. Extra variants use `background_generate` (default: `generate`)."""
+        key = canonical_suggestion_key(fact)
+        entry = self._lookup(key)
+        if entry is not None and entry.variants:
+            self.hits += 1
+            if entry.generations < self.max_variants:
+                self._fill_variant_in_background(key, fact, background_generate or generate)
+            return random.choice(entry.variants)
+
+        self.misses += 1
+        # Shield so one caller going away doesn't cancel the call for everyone else
+        return await asyncio.shield(self._start_generation(key, fact, generate))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def aclose(self) -> None:
+        tasks = list(self._filling.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._filling.clear()
@@ -1,9 +1,15 @@
+import asyncio
 import logging
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse, Response
+from contextlib import asynccontextmanager, contextmanager
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
+from typing import Any, Dict, Literal
+
+_import_started = time.perf_counter() # Start of the app's own imports, for the startup report
 
 # --- Configuration Loading ---
 class Settings(BaseSettings):
@@ -17,18 +23,107 @@ class Settings(BaseSettings):
 
     # Lucy AI Config
     MAX_MVP_RISK_SCORE: int = 3
+    POOL_REGISTRY_REFRESH_INTERVAL: float = 60.0 # Seconds between live yield pool refreshes
 
     # LLM Config (Matching personality.py)
     OPENAI_API_KEY: str | None = None # Default to None
     GOOGLE_API_KEY: str | None = None # Default to None
     LLM_MODEL_NAME_OPENAI: str = "gpt-4o-mini" # Default model
     LLM_MODEL_NAME_GEMINI: str = "gemini-1.5-flash-latest" # Default model
+    # Suggestion text cache keyed on the canonical (0.1% APY resolution) SuggestionFact
+    SUGGESTION_CACHE_ENABLED: bool = True
+    SUGGESTION_CACHE_MAX_ENTRIES: int = 1024
+    SUGGESTION_CACHE_TTL: float = 3600.0 # Seconds before a fact's phrasings are regenerated
+    SUGGESTION_CACHE_VARIANTS: int = 3 # Phrasings kept per fact, to keep responses varied
+    # Concurrent suggestion cache misses are phrased together in one LLM call
+    SUGGESTION_BATCH_ENABLED: bool = True
+    SUGGESTION_BATCH_WINDOW_MS: float = 20.0 # Max extra latency a suggestion waits for batch-mates
+    SUGGESTION_BATCH_MAX_SIZE: int = 8 # A full batch is sent immediately
+    # Per-user chat memory (see core/conversation_memory.py)
+    CHAT_MEMORY_ENABLED: bool = True
+    CHAT_MEMORY_MAX_TURNS: int = 20 # Messages (user + Lucy) kept verbatim per user; older ones are summarized
+    CHAT_MEMORY_IDLE_TTL: float = 1800.0 # Seconds without messages before a conversation is forgotten
+    CHAT_MEMORY_MAX_TOTAL_TOKENS: int = 2000000 # Across all users; least recently active conversations go first
+    CHAT_MEMORY_MAX_SUMMARY_TOKENS: int = 400 # Per user
+    CHAT_PROMPT_TOKEN_BUDGET: int = 3000 # Estimated tokens for message + context + history per chat prompt
+    # LLM admission control (see core/llm_scheduler.py): per-provider concurrency cap, bounded priority queue
+    LLM_MAX_CONCURRENCY: int = 16 # Concurrent LLM calls per provider
+    LLM_PROVIDER_MAX_CONCURRENCY: dict[str, int] = {} # Per-provider overrides, e.g. {"openai": 32, "gemini": 8}
+    LLM_MAX_QUEUE: int = 64 # Waiting calls beyond this are rejected with 429 + Retry-After
+    LLM_CHAT_QUEUE_TIMEOUT: float = 10.0 # Max seconds a chat waits for a slot before a 503
+    LLM_SUGGESTION_QUEUE_TIMEOUT: float = 5.0 # Max seconds suggestion text waits for a slot before a 503
+
+    # Verified JWT cache (see api/token_cache.py)
+    JWT_CACHE_ENABLED: bool = True
+    JWT_CACHE_MAX_ENTRIES: int = 10000
+    JWT_CACHE_MAX_TTL: float = 300.0 # Seconds; entries never outlive the token's `exp` claim
+
+    # Per-user chat context snapshots (see api/context_snapshot.py)
+    CHAT_CONTEXT_CACHE_ENABLED: bool = True
+    CHAT_CONTEXT_MAX_ENTRIES: int = 10000
+    CHAT_CONTEXT_MAX_AGE: float = 15.0 # Seconds a user's vault/balance context is reused without refetching
+    CHAT_CONTEXT_MODE: Literal["full", "compact", "auto"] = "auto" # auto: list every vault while that fits, else aggregate
+    CHAT_CONTEXT_TOP_N: int = 10 # Largest vaults / balances listed individually in compact mode
+    CHAT_CONTEXT_MAX_TOKENS: int = 800 # Hard cap on the vault + balance context, in tokenizer (tiktoken) tokens
+
+    # Prometheus metrics (GET /metrics, see utils/metrics.py)
+    METRICS_ENABLED: bool = True
 
     # External Service URLs
     # Correct default for Docker Compose network
     SENTI_BACKEND_API_URL: str = "http://senti-backend:5000/api"
+    # Shared connection pool for Senti backend calls (see services/senti_backend.py)
+    SENTI_BACKEND_HTTP2: bool = True
+    SENTI_BACKEND_MAX_CONNECTIONS: int = 100
+    SENTI_BACKEND_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    SENTI_BACKEND_KEEPALIVE_EXPIRY: float = 30.0 # Seconds an idle connection is kept open
+    SENTI_BACKEND_CONNECT_TIMEOUT: float = 3.0
+    SENTI_BACKEND_VAULTS_TIMEOUT: float = 10.0 # Per-call timeout for /vault/user/:userId
+    SENTI_BACKEND_REWARDS_TIMEOUT: float = 5.0 # Per-call timeout for /vault/rewards/:vaultPubkey
+    VAULTS_RESULT_TTL: float = 2.0 # Seconds a coalesced vault list is reused (0 = only share in-flight calls)
     # Default to devnet, can be overridden by .env
     SOLANA_RPC_URL: str = "https://api.devnet.solana.com"
+    # Several providers, comma-separated: calls go to the fastest healthy one (overrides SOLANA_RPC_URL when set).
+    # The per_mint fetch mode and the balance websocket (unless SOLANA_WS_URL is set) use the first one only.
+    SOLANA_RPC_URLS: str = ""
+    SOLANA_RPC_HEDGE_ENABLED: bool = True # With several providers, resend slow reads to the runner-up
+    SOLANA_RPC_HEDGE_MIN_DELAY_MS: float = 50.0 # Hedge after max(this, the provider's p95 latency)
+    SOLANA_RPC_BREAKER_FAILURES: int = 5 # Consecutive failures before a provider's circuit opens
+    SOLANA_RPC_BREAKER_COOLDOWN: float = 30.0 # Seconds before an open circuit lets a trial call through
+    SOLANA_RPC_TIMEOUT: float = 10.0
+    SOLANA_RPC_HEALTH_INTERVAL: float = 15.0 # Seconds between background /health probes
+    SOLANA_RPC_HEALTH_FAILURES: int = 3 # Consecutive failed probes before requests fail fast with 503
+    # "parsed": one jsonParsed getTokenAccountsByOwner for all SPL balances; "per_mint": legacy per-mint/per-account calls
+    SOLANA_BALANCE_FETCH_MODE: Literal["parsed", "per_mint"] = "parsed"
+    # JSON-RPC batching: calls issued within this window share one HTTP POST (0 disables batching)
+    SOLANA_RPC_BATCH_WINDOW_MS: float = 2.0
+    SOLANA_RPC_MAX_BATCH_SIZE: int = 100
+    SOLANA_RPC_MAX_CONNECTIONS: int = 50
+    # POST /api/v1/balances/batch
+    BALANCES_BATCH_MAX_WALLETS: int = 1000
+    BALANCES_BATCH_CONCURRENCY: int = 32 # Wallets fetched concurrently per batch request
+    BALANCES_RESULT_TTL: float = 2.0 # Seconds a coalesced balance result is reused (0 = only share in-flight calls)
+    # Balance cache invalidated by Solana websocket account/program subscriptions
+    SOLANA_WS_URL: str | None = None # Defaults to SOLANA_RPC_URL with ws(s)://
+    BALANCE_CACHE_ENABLED: bool = True
+    BALANCE_CACHE_MAX_WALLETS: int = 1000 # Watched wallets; least recently used are unsubscribed first
+    BALANCE_CACHE_IDLE_TTL: float = 600.0 # Seconds without reads before a wallet is unsubscribed
+    BALANCE_CACHE_MAX_AGE: float = 300.0 # Safety net: refetch even without a pushed change
+
+    # Token price cache (CoinGecko)
+    COINGECKO_API_URL: str = "https://api.coingecko.com/api/v3"
+    PRICE_CACHE_TTL: float = 60.0 # Seconds a price is considered fresh
+    PRICE_CACHE_MAX_STALE: float = 600.0 # Seconds a stale price may still be served while revalidating
+    PRICE_REFRESH_INTERVAL: float = 30.0 # Seconds between background refreshes of all known tokens
+
+    # Cache behind the price, pool and balance lookups (see utils/shared_cache.py)
+    # "memory": per-worker LRU; "sqlite": one WAL-mode file shared by every worker on the host
+    SHARED_CACHE_BACKEND: Literal["memory", "sqlite"] = "memory"
+    SHARED_CACHE_PATH: str = "/tmp/lucy_ai_cache.sqlite3"
+    SHARED_CACHE_MAX_ENTRIES: int = 100000
+    SHARED_CACHE_LEASE_SECONDS: float = 10.0 # How long one worker may hold a key's refresh before another takes over
+    SHARED_CACHE_BUSY_TIMEOUT_MS: float = 5.0 # sqlite: longest wait for another worker's write lock; then the call counts as a miss
+    SHARED_CACHE_PURGE_INTERVAL: float = 60.0 # sqlite: seconds between purges of expired/excess rows (run in a worker thread)
 
     # CORS Configuration
     # Accept either a comma-separated list or a single origin
@@ -44,23 +139,86 @@ settings = Settings()
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
 logger = logging.getLogger(__name__)
 
+# Filled in by the lifespan; reported in the startup log and by /ready
+startup_report: Dict[str, Any] = {"completed": False, "stages": {}}
+
+@contextmanager
+def _startup_stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_report["stages"][name] = round(time.perf_counter() - started, 3)
+
 # --- Application Lifespan (Handles Startup Logic) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- On Startup ---
     logger.info("🚀 Lucy AI Service starting up...")
+    startup_started = time.perf_counter()
     
-    # Import personality HERE to ensure settings are loaded BEFORE LLM init
+    # The LLM SDKs are slow to import, so the provider and chains are built in the background;
+    # requests arriving earlier wait for it (see personality.ensure_llm) and /ready reports 503 until then
     from .core import personality
-    llm_info = personality.get_llm_info() # Get info about which LLM *actually* loaded
+    personality.start_llm_warmup()
     
-    logger.info(f"🧠 LLM: {llm_info}")
+    logger.info("🧠 LLM: Warming up in the background")
     logger.info(f"🛡️  Risk Score: Max {settings.MAX_MVP_RISK_SCORE}")
-    
+
+    # Shared, keep-alive connection pool to the Senti backend
+    from .services import senti_backend
+    with _startup_stage("senti_backend"):
+        app.state.senti_backend_client = await senti_backend.init_backend_client()
+    logger.info(f"🔌 Senti backend pool: {settings.SENTI_BACKEND_API_URL} (max {settings.SENTI_BACKEND_MAX_CONNECTIONS} connections, http2={settings.SENTI_BACKEND_HTTP2})")
+
+    # Backend of the price, pool and balance caches (sqlite shares them between workers)
+    from .services import solana_rpc
+    with _startup_stage("shared_cache"):
+        app.state.cache_backend = await solana_rpc.init_cache_backend()
+    logger.info(f"🗄️  Shared cache: {settings.SHARED_CACHE_BACKEND}" + (f" ({settings.SHARED_CACHE_PATH})" if settings.SHARED_CACHE_BACKEND == "sqlite" else ""))
+
+    # Long-lived Solana RPC client with background health tracking
+    with _startup_stage("solana_rpc"):
+        app.state.solana_rpc_client = await solana_rpc.init_rpc_client()
+    logger.info(f"⛓️  Solana RPC: {', '.join(solana_rpc.rpc_endpoints())} (health check every {settings.SOLANA_RPC_HEALTH_INTERVAL:.0f}s)")
+    with _startup_stage("balance_cache"):
+        app.state.balance_cache = await solana_rpc.init_balance_cache()
+    with _startup_stage("price_cache"):
+        app.state.price_cache = await solana_rpc.init_price_cache()
+    logger.info(f"💲 Price cache: refreshing every {settings.PRICE_REFRESH_INTERVAL:.0f}s (ttl {settings.PRICE_CACHE_TTL:.0f}s)")
+
+    from .services import pool_registry
+    with _startup_stage("pool_registry"):
+        app.state.pool_registry = await pool_registry.init_pool_registry()
+    logger.info(f"🏊 Pool registry: {len(app.state.pool_registry.pools)} pool(s), refreshing every {settings.POOL_REGISTRY_REFRESH_INTERVAL:.0f}s")
+
+    # tiktoken downloads its encoding on first use; load it here rather than on the first chat request
+    from .api import chat_context
+    with _startup_stage("tokenizer"):
+        await asyncio.to_thread(chat_context.load_tokenizer)
+
+    startup_report["lifespan_seconds"] = round(time.perf_counter() - startup_started, 3)
+    startup_report["completed"] = True
+    stages = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in startup_report["stages"].items())
+    logger.info(
+        f"⏱️  Startup: app import {startup_report['import_seconds']:.2f}s, lifespan {startup_report['lifespan_seconds']:.2f}s ({stages}); "
+        f"LLM {'ready' if personality.is_llm_ready() else 'still warming up'}"
+    )
+
     yield # --- Application is now running ---
     
     # --- On Shutdown ---
     logger.info("Lucy AI Service shutting down...")
+    if personality.suggestion_text_cache is not None:
+        await personality.suggestion_text_cache.aclose()
+    if personality.suggestion_batcher is not None:
+        await personality.suggestion_batcher.aclose()
+    await pool_registry.close_pool_registry()
+    await solana_rpc.close_price_cache()
+    await solana_rpc.close_balance_cache()
+    await solana_rpc.close_rpc_client()
+    solana_rpc.close_cache_backend()
+    await senti_backend.close_backend_client()
 
 # --- FastAPI App Initialization ---
 app = FastAPI(
@@ -98,10 +256,16 @@ app.add_middleware(
     allow_headers=allow_headers,
 )
 
+# Outermost middleware (added last), so route latency covers CORS handling too
+if settings.METRICS_ENABLED:
+    from .utils.metrics import MetricsMiddleware
+    app.add_middleware(MetricsMiddleware)
+
 # --- Include API Router ---
 # Import router here, after app is defined and middleware added
 from .api.endpoints import router as api_router
 app.include_router(api_router, prefix="/api/v1")
+startup_report["import_seconds"] = round(time.perf_counter() - _import_started, 3)
 
 # --- Root Endpoint ---
 @app.get("/", tags=["Health"])
@@ -111,6 +275,32 @@ async def read_root():
 
     return {"status": "ok", "message": "Lucy AI Service is running!"}
 
+@app.get("/ready", tags=["Health"])
+async def read_ready():
+    """
+    Readiness check: 503 until startup has finished and the LLM is warm, so load balancers
+    only route traffic to fully warmed instances. `/` only reports that the process is up.
+    """
+    from .core import personality
+    ready = startup_report["completed"] and personality.is_llm_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "starting",
+            "llm": personality.get_llm_info(),
+            "llm_init_seconds": round(personality.llm_init_seconds, 3) if personality.llm_init_seconds is not None else None,
+            "startup": startup_report,
+        },
+    )
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", tags=["Health"], include_in_schema=False)
+    async def read_metrics():
+        """Prometheus scrape endpoint."""
+        from .utils.metrics import render_latest
+        content, content_type = render_latest()
+        return Response(content=content, media_type=content_type)
+
 # --- Uvicorn Runner (for direct execution `python src/lucy_ai/main.py`) ---
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from ..api.schemas import YieldPool
+from ..utils.shared_cache import SharedCache
+from ..utils import metrics
+
+try:
+    from ..main import settings
+except ImportError:
+    class MockSettings:
+        POOL_REGISTRY_REFRESH_INTERVAL: float = 60.0
+    settings = MockSettings()
+
+logger = logging.getLogger(__name__)
+
+# A pool source is any coroutine function returning the pools it currently knows about,
+# e.g. solana_rpc.get_live_yield_opportunities (the default, mock-backed source).
+PoolSource = Callable[[], Awaitable[List[YieldPool]]]
+
+MAX_RISK_SCORE = 5 # Risk scores run 1 (safest) .. 5
+
+
+class PoolRegistry:
+    """
+    Live yield pools, refreshed in the background from pluggable sources and
+    indexed so request handlers never scan pool lists:
+
+    - `best_safe_pool(asset, max_risk)` is a dict lookup: for every asset and every
+      risk ceiling the highest-APY pool at or below it is precomputed on refresh
+    - `version` is bumped whenever the pool data actually changes, so derived
+      caches can tell when to rebuild
+
+    When sources list the same pool_id, the later source wins. With a `store`, the merged pool
+    list is shared: a worker reuses a list another one pulled within half a refresh interval,
+    and only the worker holding the refresh lease pulls the sources.
+    """
+    def __init__(self, sources: Sequence[PoolSource], refresh_interval: float = 60.0, store: Optional[SharedCache] = None):
+        self.sources = list(sources)
+        self.refresh_interval = refresh_interval
+        self.store = store
+        self.version = 0
+        self._pools: Tuple[YieldPool, ...] = ()
+        self._pools_by_asset: Dict[str, Tuple[YieldPool, ...]] = {}
+        self._best_by_asset_and_risk: Dict[Tuple[str, int], YieldPool] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def pools(self) -> Tuple[YieldPool, ...]:
+        return self._pools
+
+    def pools_for_asset(self, asset: str) -> Tuple[YieldPool, ...]:
+        """Pools for an asset, highest APY first."""
+        return self._pools_by_asset.get(asset, ())
+
+    def best_safe_pool(self, asset: str, max_risk_score: int) -> Optional[YieldPool]:
+        """Highest-APY pool for `asset` with risk_score <= max_risk_score, in O(1)."""
+        return self._best_by_asset_and_risk.get((asset, min(max_risk_score, MAX_RISK_SCORE)))
+
+    def load(self, pools: Sequence[YieldPool]) -> bool:
+        """Replaces the registry contents and rebuilds the indexes. Returns True if anything changed."""
+        merged: Dict[str, YieldPool] = {}
+        for pool in pools:
+            merged[pool.pool_id] = pool
+        new_pools = tuple(merged.values())
+        if new_pools == self._pools:
+            return False
+
+        pools_by_asset: Dict[str, List[YieldPool]] = {}
+        for pool in new_pools:
+            pools_by_asset.setdefault(pool.asset, []).append(pool)
+
+        best_by_asset_and_risk: Dict[Tuple[str, int], YieldPool] = {}
+        for asset, asset_pools in pools_by_asset.items():
+            # Stable sort keeps the first pool on APY ties, matching max() over the source order
+            asset_pools.sort(key=lambda p: -p.current_apy)
+            for risk_ceiling in range(0, MAX_RISK_SCORE + 1):
+                best = next((p for p in asset_pools if p.risk_score <= risk_ceiling), None)
+                if best is not None:
+                    best_by_asset_and_risk[(asset, risk_ceiling)] = best
+
+        self._pools = new_pools
+        self._pools_by_asset = {asset: tuple(asset_pools) for asset, asset_pools in pools_by_asset.items()}
+        self._best_by_asset_and_risk = best_by_asset_and_risk
+        self.version += 1
+        logger.info(f"Pool registry: Loaded {len(new_pools)} pool(s), version {self.version}")
+        return True
+
+    async def _pull_sources(self) -> Optional[List[YieldPool]]:
+        """Pulls every source concurrently; None if any of them failed."""
+        results = await asyncio.gather(*[source() for source in self.sources], return_exceptions=True)
+        pools: List[YieldPool] = []
+        for source, result in zip(self.sources, results):
+            if isinstance(result, Exception):
+                logger.error(f"Pool registry: Source {getattr(source, '__name__', source)} failed: {result}")
+                return None
+            pools.extend(result)
+        return pools
+
+    async def refresh(self) -> bool:
+        """Pulls every source concurrently. A failing source keeps the previous data."""
+        if self.store is None:
+            pools = await self._pull_sources()
+        else:
+            pools = await self.store.load("live", self._pull_sources, ttl=self.refresh_interval * 2, max_age=self.refresh_interval / 2)
+        if pools is None:
+            return False
+        return self.load(pools)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Pool registry: Background refresh failed: {e}", exc_info=True)
+
+    async def start(self) -> None:
+        """Loads the pools once, then keeps refreshing them in the background."""
+        await self.refresh()
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def aclose(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+_registry: Optional[PoolRegistry] = None
+metrics.register_stats("shared_cache", "pools", lambda: _registry.store.stats() if _registry is not None and _registry.store is not None else None)
+
+
+def _encode_pools(pools: List[YieldPool]) -> List[Dict[str, Any]]:
+    return [pool.model_dump() for pool in pools]
+
+
+def _decode_pools(data: List[Dict[str, Any]]) -> List[YieldPool]:
+    return [YieldPool.model_validate(item) for item in data]
+
+
+def _pools_store() -> SharedCache:
+    from .solana_rpc import shared_cache
+    return shared_cache("pools", encode=_encode_pools, decode=_decode_pools)
+
+
+def get_pool_registry() -> PoolRegistry:
+    """Returns the process-wide registry (empty until init_pool_registry has run)."""
+    global _registry
+    if _registry is None:
+        from .solana_rpc import get_live_yield_opportunities
+        _registry = PoolRegistry([get_live_yield_opportunities], refresh_interval=settings.POOL_REGISTRY_REFRESH_INTERVAL, store=_pools_store())
+    return _registry
+
+
+async def init_pool_registry(sources: Optional[Sequence[PoolSource]] = None) -> PoolRegistry:
+    """Loads the registry (optionally from custom sources) and starts its refresher. Called from the app lifespan."""
+    global _registry
+    if sources is not None:
+        await close_pool_registry()
+        _registry = PoolRegistry(sources, refresh_interval=settings.POOL_REGISTRY_REFRESH_INTERVAL, store=_pools_store())
+    registry = get_pool_registry()
+    await registry.start()
+    return registry
+
+
+async def close_pool_registry() -> None:
+    if _registry is not None:
+        await _registry.aclose()
@@ -1,36 +1,114 @@
 import httpx
 import logging
 from typing import List, Dict, Any, Optional
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 import asyncio 
+from contextlib import asynccontextmanager
 from fastapi import HTTPException
+from ..utils.singleflight import SingleFlight
+from ..utils import metrics
 
 try:
     from ..main import settings
 except ImportError:
     class MockSettings:
         SENTI_BACKEND_API_URL: str = "http://localhost:5000/api" 
+        SENTI_BACKEND_HTTP2: bool = True
+        SENTI_BACKEND_MAX_CONNECTIONS: int = 100
+        SENTI_BACKEND_MAX_KEEPALIVE_CONNECTIONS: int = 20
+        SENTI_BACKEND_KEEPALIVE_EXPIRY: float = 30.0
+        SENTI_BACKEND_CONNECT_TIMEOUT: float = 3.0
+        SENTI_BACKEND_VAULTS_TIMEOUT: float = 10.0
+        SENTI_BACKEND_REWARDS_TIMEOUT: float = 5.0
+        VAULTS_RESULT_TTL: float = 2.0
     settings = MockSettings()
 
 
 logger = logging.getLogger(__name__)
 
+# Shared pooled client, created/closed by the app lifespan (see main.py)
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def create_backend_client() -> httpx.AsyncClient:
+    """Builds a pooled, keep-alive HTTP client for the Senti backend."""
+    limits = httpx.Limits(
+        max_connections=settings.SENTI_BACKEND_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.SENTI_BACKEND_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.SENTI_BACKEND_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(settings.SENTI_BACKEND_VAULTS_TIMEOUT, connect=settings.SENTI_BACKEND_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(http2=settings.SENTI_BACKEND_HTTP2, limits=limits, timeout=timeout)
+
+
+async def init_backend_client() -> httpx.AsyncClient:
+    """Creates the shared backend client. Called once from the app lifespan."""
+    global _http_client
+    if _http_client is None:
+        _http_client = create_backend_client()
+        logger.info("Senti backend: Shared HTTP client created.")
+    return _http_client
+
+
+async def close_backend_client() -> None:
+    """Closes the shared backend client, releasing pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        logger.info("Senti backend: Shared HTTP client closed.")
+
+
+@asynccontextmanager
+async def _backend_client(client: Optional[httpx.AsyncClient] = None):
+    """
+    Yields the injected client, else the shared one. Outside the app lifespan
+    (scripts, REPL) a short-lived client is created and closed instead.
+    """
+    if client is not None:
+        yield client
+    elif _http_client is not None:
+        yield _http_client
+    else:
+        logger.debug("Senti backend: No shared HTTP client initialised, using a one-off client.")
+        async with create_backend_client() as one_off_client:
+            yield one_off_client
+
 class UserVaultData(BaseModel):
     id: str 
+    name: Optional[str] = None
     token: str 
     totalDeposits: float 
     yieldRate: float 
     locked: bool 
     lockPeriodDays: Optional[int] = None 
 
+# Validates a whole /vault/user response body in one pass, straight from the bytes
+_user_vaults_adapter = TypeAdapter(List[UserVaultData])
+
 class RewardResponse(BaseModel):
     vault_pubkey: str
     accrued_rewards: float
     asset: str
 
-async def get_user_vaults(user_id: str, auth_token: str) -> List[UserVaultData]:
+# Dashboard loads fire /suggestions, /chat and /balances together; they share one vault fetch
+_vaults_flight = SingleFlight("user_vaults", result_ttl=settings.VAULTS_RESULT_TTL)
+metrics.register_cache("user_vaults", _vaults_flight.stats)
+
+
+@metrics.instrument_stage("get_user_vaults")
+async def get_user_vaults(user_id: str, auth_token: str, client: Optional[httpx.AsyncClient] = None) -> List[UserVaultData]:
     """
     Fetches all vaults associated with a user ID from the Senti Backend API.
+    Concurrent calls for the same user and token share one upstream request, and the
+    result is reused for VAULTS_RESULT_TTL seconds. Errors propagate unchanged.
+    """
+    vaults = await _vaults_flight.do((user_id, auth_token), lambda: _fetch_user_vaults(user_id, auth_token, client))
+    return list(vaults)
+
+
+async def _fetch_user_vaults(user_id: str, auth_token: str, client: Optional[httpx.AsyncClient] = None) -> List[UserVaultData]:
+    """
     Makes a GET request to /api/vault/user/:userId
     """
     url = f"{settings.SENTI_BACKEND_API_URL}/vault/user/{user_id}"
@@ -38,8 +116,8 @@ async def get_user_vaults(user_id: str, auth_token: str) -> List[UserVaultData]:
     logger.info(f"Attempting to fetch vaults for user_id: {user_id} from {url}")
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client: 
-            response = await client.get(url, headers=headers)
+        async with _backend_client(client) as http_client:
+            response = await http_client.get(url, headers=headers, timeout=settings.SENTI_BACKEND_VAULTS_TIMEOUT)
             response.raise_for_status() 
             if response.status_code == 401:
                  logger.error(f"Authentication failed (401) fetching vaults for user {user_id}. Token might be invalid or expired.")
@@ -48,19 +126,15 @@ async def get_user_vaults(user_id: str, auth_token: str) -> List[UserVaultData]:
             if response.status_code == 404:
                 logger.info(f"No vaults found (404) for user {user_id}. Returning empty list.")
                 return []
-            raw_data = response.json()
-            logger.debug(f"Received raw vault data for user {user_id}: {raw_data}")
+            logger.debug(f"Received {len(response.content)} bytes of vault data for user {user_id}")
 
             try:
-                validated_vaults = [VaultResponse.model_validate(vault).model_dump(by_alias=True) for vault in raw_data]
-                logger.info(f"Successfully fetched and validated {len(validated_vaults)} vaults for user {user_id}")
-                return validated_vaults
+                validated_vaults = _user_vaults_adapter.validate_json(response.content)
             except ValidationError as e:
                 logger.error(f"Data validation error for user vaults {user_id}: {e}")
-                return raw_data 
-            except Exception as e:
-                logger.error(f"Unexpected error processing vault data for user {user_id}: {e}", exc_info=True)
-                raise 
+                validated_vaults = _salvage_vaults(response, user_id)
+            logger.info(f"Successfully fetched and validated {len(validated_vaults)} vaults for user {user_id}")
+            return validated_vaults
 
     except httpx.HTTPStatusError as e:
         logger.error(f"HTTP error fetching vaults for user {user_id}: Status {e.response.status_code}, Response: {e.response.text}")
@@ -76,7 +150,21 @@ async def get_user_vaults(user_id: str, auth_token: str) -> List[UserVaultData]:
         raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching user vaults.") from e
 
 
-async def get_vault_rewards(vault_pubkey: str, auth_token: str) -> Optional[Dict[str, Any]]:
+def _salvage_vaults(response: httpx.Response, user_id: str) -> List[UserVaultData]:
+    """Slow path for a body that failed validation as a whole: keeps the vaults that validate on their own."""
+    raw_data = response.json()
+    if not isinstance(raw_data, list):
+        raise ValueError(f"Expected a list of vaults, got {type(raw_data).__name__}")
+    vaults: List[UserVaultData] = []
+    for vault in raw_data:
+        try:
+            vaults.append(UserVaultData.model_validate(vault))
+        except ValidationError as e:
+            logger.warning(f"Skipping invalid vault for user {user_id}: {e}")
+    return vaults
+
+
+async def get_vault_rewards(vault_pubkey: str, auth_token: str, client: Optional[httpx.AsyncClient] = None) -> Optional[Dict[str, Any]]:
     """
     Fetches accrued rewards for a specific vault from the Senti Backend API.
     Makes a GET request to /api/vault/rewards/:vaultPubkey
@@ -86,8 +174,8 @@ async def get_vault_rewards(vault_pubkey: str, auth_token: str) -> Optional[Dict
     logger.info(f"Attempting to fetch rewards for vault_pubkey: {vault_pubkey} from {url}")
 
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client: 
-            response = await client.get(url, headers=headers)
+        async with _backend_client(client) as http_client:
+            response = await http_client.get(url, headers=headers, timeout=settings.SENTI_BACKEND_REWARDS_TIMEOUT)
 
             if response.status_code == 404:
                 logger.warn(f"No rewards found (404) for vault {vault_pubkey}")
@@ -1,28 +1,44 @@
+import abc
 import logging
-from typing import List, Optional, Dict, Any
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Tuple, Deque
 import asyncio
+import itertools
 import httpx  
 import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from decimal import Decimal
 
+logger = logging.getLogger(__name__)
+
 try:
     from solders.pubkey import Pubkey
-    from solana.rpc.async_api import AsyncClient
     from solana.rpc.types import TokenAccountOpts, Commitment
     from solana.exceptions import SolanaRpcException
 except ImportError:
     logger.error("Failed to import 'solana' library. Please install it with 'pip install solana'")
     raise ImportError("Please install the 'solana' library: pip install solana")
 
+if TYPE_CHECKING:
+    # solana.rpc.async_api is the slow part of the solana stack to import; see create_rpc_client
+    from solana.rpc.async_api import AsyncClient
+
 from fastapi import HTTPException
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
+from ..utils.singleflight import SingleFlight
+from ..utils.shared_cache import CacheBackend, SharedCache, create_cache_backend
+from ..utils import metrics
+from .solana_subscriptions import BalanceSubscriptionCache
 try:
-    from ..api.schemas import TokenBalance, WalletBalanceResponse, YieldPool
+    from ..api.schemas import TokenBalance, WalletBalanceResponse, WalletBalanceError, BatchWalletBalanceResponse, YieldPool
 except ImportError:
     # Handle standalone execution for testing
     logger.warning("Could not import schemas from ..api.schemas. Using dummy models for standalone test.")
     class TokenBalance(BaseModel): pass
     class WalletBalanceResponse(BaseModel): pass
+    class WalletBalanceError(BaseModel): pass
+    class BatchWalletBalanceResponse(BaseModel): pass
     class YieldPool(BaseModel): pass
 
 try:
@@ -31,15 +47,114 @@ except ImportError:
     logger.warning("Could not import settings from ..main. Using MockSettings.")
     class MockSettings:
         SOLANA_RPC_URL: str = "https://api.devnet.solana.com"
+        SOLANA_RPC_URLS: str = ""
+        SOLANA_RPC_HEDGE_ENABLED: bool = True
+        SOLANA_RPC_HEDGE_MIN_DELAY_MS: float = 50.0
+        SOLANA_RPC_BREAKER_FAILURES: int = 5
+        SOLANA_RPC_BREAKER_COOLDOWN: float = 30.0
+        SOLANA_RPC_TIMEOUT: float = 10.0
+        SOLANA_RPC_HEALTH_INTERVAL: float = 15.0
+        SOLANA_RPC_HEALTH_FAILURES: int = 3
+        SOLANA_BALANCE_FETCH_MODE: str = "parsed"
+        SOLANA_RPC_BATCH_WINDOW_MS: float = 2.0
+        SOLANA_RPC_MAX_BATCH_SIZE: int = 100
+        SOLANA_RPC_MAX_CONNECTIONS: int = 50
+        BALANCES_BATCH_MAX_WALLETS: int = 1000
+        BALANCES_BATCH_CONCURRENCY: int = 32
+        PRICE_CACHE_TTL: float = 60.0
+        COINGECKO_API_URL: str = "https://api.coingecko.com/api/v3"
+        PRICE_CACHE_MAX_STALE: float = 600.0
+        PRICE_REFRESH_INTERVAL: float = 30.0
+        BALANCES_RESULT_TTL: float = 2.0
+        SOLANA_WS_URL: Optional[str] = None
+        BALANCE_CACHE_ENABLED: bool = True
+        BALANCE_CACHE_MAX_WALLETS: int = 1000
+        BALANCE_CACHE_IDLE_TTL: float = 600.0
+        BALANCE_CACHE_MAX_AGE: float = 300.0
+        SHARED_CACHE_BACKEND: str = "memory"
+        SHARED_CACHE_PATH: str = "/tmp/lucy_ai_cache.sqlite3"
+        SHARED_CACHE_MAX_ENTRIES: int = 100000
+        SHARED_CACHE_LEASE_SECONDS: float = 10.0
+        SHARED_CACHE_BUSY_TIMEOUT_MS: float = 5.0
+        SHARED_CACHE_PURGE_INTERVAL: float = 60.0
     settings = MockSettings()
 
-logger = logging.getLogger(__name__)
+RPC_COMMITMENT: Commitment = "confirmed"
+
+# RpcRouter: share of calls sent to a random non-best endpoint, and methods never hedged (not idempotent)
+_RPC_EXPLORE_PROBABILITY = 0.02
+_RPC_UNHEDGED_PREFIXES = ("send", "request")
+
+# Backs the price, pool and balance caches; with "sqlite" every worker on the host shares them.
+# Owned by the app lifespan (see main.py), or created on first use outside it.
+_cache_backend: Optional[CacheBackend] = None
+_cache_purge_task: Optional[asyncio.Task] = None
+metrics.register_stats("shared_cache_backend", settings.SHARED_CACHE_BACKEND, lambda: {"entries": _cache_backend.entry_count()} if _cache_backend is not None else None)
+
+
+def get_cache_backend() -> CacheBackend:
+    global _cache_backend
+    if _cache_backend is None:
+        _cache_backend = create_cache_backend(
+            settings.SHARED_CACHE_BACKEND, settings.SHARED_CACHE_PATH, settings.SHARED_CACHE_MAX_ENTRIES,
+            busy_timeout=settings.SHARED_CACHE_BUSY_TIMEOUT_MS / 1000,
+        )
+    return _cache_backend
+
+
+async def _purge_loop(backend: CacheBackend, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            # Large DELETEs on a shared file; kept off the event loop
+            await asyncio.to_thread(backend.purge)
+        except Exception as e:
+            logger.warning(f"Shared cache: Purge failed: {e}")
+
+
+async def init_cache_backend() -> CacheBackend:
+    """
+    Creates and connects the cache backend. Called once from the app lifespan, which also
+    purges a shared backend every SHARED_CACHE_PURGE_INTERVAL seconds from then on.
+    """
+    global _cache_purge_task
+    backend = get_cache_backend()
+    backend.open()
+    if backend.shared and _cache_purge_task is None:
+        _cache_purge_task = asyncio.create_task(_purge_loop(backend, settings.SHARED_CACHE_PURGE_INTERVAL))
+    return backend
+
+
+def close_cache_backend() -> None:
+    global _cache_backend, _cache_purge_task
+    if _cache_purge_task is not None:
+        _cache_purge_task.cancel()
+        _cache_purge_task = None
+    if _cache_backend is not None:
+        _cache_backend.close()
+        _cache_backend = None
+
+
+def shared_cache(namespace: str, **kwargs: Any) -> SharedCache:
+    """A namespace of the cache backend, with the configured refresh lease duration."""
+    return SharedCache(get_cache_backend, namespace, lease_duration=settings.SHARED_CACHE_LEASE_SECONDS, **kwargs)
+
+# Long-lived RPC client/transport and their health state, owned by the app lifespan (see main.py)
+_rpc_client: Optional["AsyncClient"] = None
+_rpc_transport: Optional["SolanaRpcTransport | RpcRouter"] = None
+_rpc_healthy: bool = True
+_rpc_health_task: Optional[asyncio.Task] = None
 
 KNOWN_TOKENS = {
     "USDC": Pubkey.from_string("Gh9ZwEmdLJ8DscKNTkTqPbNwLNNBjuSzaG9Vp2KGtKJr"), # <-- DEVNET USDC
     "USDT": Pubkey.from_string("Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB"), # <-- DEVNET USDT
 }
 
+MINT_TO_SYMBOL: Dict[str, str] = {str(mint): symbol for symbol, mint in KNOWN_TOKENS.items()}
+
+# SPL Token program; owns every classic token account
+TOKEN_PROGRAM_ID = Pubkey.from_string("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA")
+
 TOKEN_DECIMALS = {
     "USDC": 6,
     "USDT": 6,
@@ -60,9 +175,698 @@ MOCK_LIVE_POOLS_DATA: List[Dict[str, Any]] = [
 ]
 
 
+class RpcCallError(Exception):
+    """
+    A JSON-RPC call failed: transport error, HTTP error or an RPC `error` object. `retryable`
+    is False for an `error` object, which another endpoint would most likely return too.
+    """
+    def __init__(self, method: str, message: str, retryable: bool = True):
+        super().__init__(f"{method}: {message}")
+        self.method = method
+        self.retryable = retryable
+
+
+class SolanaRpcTransport:
+    """
+    Minimal JSON-RPC transport over a pooled httpx session.
+    Returns the raw `result` of each call; decoding is left to the caller.
+    """
+    def __init__(self, endpoint: str, timeout: float, max_connections: int):
+        self.endpoint = endpoint
+        self._session = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._ids = itertools.count(1)
+
+    async def _post(self, payload: Any, method_label: str) -> Any:
+        try:
+            response = await self._session.post(self.endpoint, json=payload)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            raise RpcCallError(method_label, f"HTTP {e.response.status_code}") from e
+        except (httpx.HTTPError, ValueError) as e:
+            raise RpcCallError(method_label, f"{type(e).__name__}: {e}") from e
+
+    @staticmethod
+    def _unwrap(method: str, item: Any) -> Any:
+        if not isinstance(item, dict):
+            raise RpcCallError(method, f"Malformed JSON-RPC response: {item!r}")
+        if item.get("error") is not None:
+            raise RpcCallError(method, str(item["error"]), retryable=False)
+        return item.get("result")
+
+    async def call(self, method: str, params: List[Any]) -> Any:
+        payload = {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+        with metrics.track_rpc_call(method):
+            return self._unwrap(method, await self._post(payload, method))
+
+    async def is_connected(self) -> bool:
+        """Health check against the node's /health endpoint."""
+        try:
+            response = await self._session.get(self.endpoint.rstrip("/") + "/health")
+            return response.status_code == httpx.codes.OK
+        except httpx.HTTPError as e:
+            logger.warning(f"Solana RPC: Health check failed: {e}")
+            return False
+
+    async def aclose(self) -> None:
+        await self._session.aclose()
+
+
+class BatchingRpcTransport(SolanaRpcTransport):
+    """
+    Collects calls for a short window and sends them as ONE JSON-RPC batch POST,
+    then resolves each caller's future from the matching response `id`.
+    Calls from concurrent requests (and concurrent calls within one request)
+    share the same HTTP request, which is what the provider bills and rate-limits on.
+    """
+    def __init__(self, endpoint: str, timeout: float, max_connections: int, window: float, max_batch_size: int):
+        super().__init__(endpoint, timeout, max_connections)
+        self._window = window
+        self._max_batch_size = max_batch_size
+        self._pending: List[Tuple[int, str, List[Any], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._in_flight: set[asyncio.Task] = set()
+
+    async def call(self, method: str, params: List[Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((next(self._ids), method, params, future))
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._window, self._flush)
+        with metrics.track_rpc_call(method):
+            return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send_batch(self, batch: List[Tuple[int, str, List[Any], asyncio.Future]]) -> None:
+        payload = [{"jsonrpc": "2.0", "id": call_id, "method": method, "params": params} for call_id, method, params, _ in batch]
+        methods_label = ",".join(sorted({method for _, method, _, _ in batch}))
+        logger.debug(f"Solana RPC: Sending batch of {len(batch)} call(s): {methods_label}")
+        try:
+            data = await self._post(payload, f"batch[{methods_label}]")
+            if not isinstance(data, list):
+                # Some nodes answer a whole batch with a single error object
+                raise RpcCallError(f"batch[{methods_label}]", f"Non-batch response: {data!r}")
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        responses_by_id = {item.get("id"): item for item in data if isinstance(item, dict)}
+        for call_id, method, _, future in batch:
+            if future.done(): # Caller was cancelled while the batch was in flight
+                continue
+            try:
+                future.set_result(self._unwrap(method, responses_by_id.get(call_id)))
+            except RpcCallError as e:
+                future.set_exception(e)
+
+    async def aclose(self) -> None:
+        self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        await super().aclose()
+
+
+class RpcEndpoint:
+    """
+    One RPC provider behind the router: its transport, EWMA latency and error rate, recent
+    latencies (for the hedge delay) and a circuit breaker. The breaker opens after
+    `breaker_failures` consecutive failures, lets one trial call through after
+    `breaker_cooldown` seconds, and closes again when that call succeeds.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, url: str, transport: SolanaRpcTransport, alpha: float = 0.2, breaker_failures: int = 5, breaker_cooldown: float = 30.0):
+        self.url = url
+        self.name = httpx.URL(url).netloc.decode() or url # For logs and metrics; provider URLs often carry an API key
+        self.transport = transport
+        self.alpha = alpha
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.latency: Optional[float] = None # EWMA, seconds; None until the first call
+        self.error_rate = 0.0 # EWMA of failures (1) and successes (0)
+        self.probe_ok = True # Last background /health probe
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._recent: Deque[float] = deque(maxlen=200)
+        self.calls = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        if self.state == self.OPEN and now - self._opened_at >= self.breaker_cooldown:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            return not self._trial_in_flight
+        return self.state == self.CLOSED
+
+    def score(self) -> float:
+        """Lower is better: expected latency, inflated by the recent error rate."""
+        return (self.latency or 0.0) * (1 + 10 * self.error_rate)
+
+    def p95(self) -> Optional[float]:
+        if len(self._recent) < 20:
+            return None
+        ordered = sorted(self._recent)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def _observe(self, elapsed: float) -> None:
+        self.latency = elapsed if self.latency is None else self.alpha * elapsed + (1 - self.alpha) * self.latency
+        self._recent.append(elapsed)
+
+    def begin(self) -> None:
+        self.calls += 1
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = True
+
+    def record_success(self, elapsed: float) -> None:
+        self._observe(elapsed)
+        self.error_rate *= 1 - self.alpha
+        self._consecutive_failures = 0
+        self._trial_in_flight = False
+        if self.state != self.CLOSED:
+            logger.info(f"Solana RPC: Circuit closed for {self.name}")
+            self.state = self.CLOSED
+
+    def record_failure(self, elapsed: float) -> None:
+        self._observe(elapsed)
+        self.failures += 1
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self._consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._consecutive_failures >= self.breaker_failures):
+            logger.error(f"Solana RPC: Circuit opened for {self.name} after {self._consecutive_failures} consecutive failure(s)")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def record_abandoned(self, elapsed: float) -> None:
+        """A call cancelled because another one answered first: at least this slow, but not failed."""
+        self._observe(elapsed)
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, float]:
+        p95 = self.p95()
+        return {
+            "latency_ewma_ms": round((self.latency or 0.0) * 1000, 3),
+            "latency_p95_ms": round(p95 * 1000, 3) if p95 is not None else 0.0,
+            "error_rate": round(self.error_rate, 4),
+            "circuit_open": {self.CLOSED: 0, self.HALF_OPEN: 0.5, self.OPEN: 1}[self.state],
+            "probe_ok": int(self.probe_ok),
+            "calls": self.calls,
+            "failures": self.failures,
+        }
+
+
+class RpcRouter:
+    """
+    Spreads JSON-RPC calls over several providers, with the transport interface of
+    SolanaRpcTransport. Each call goes to the available endpoint with the best score (EWMA
+    latency inflated by error rate); endpoints failing their /health probe or with an open
+    circuit are skipped while any other is usable. A transport failure is retried once on the
+    next endpoint. With `hedge`, a read that hasn't answered within the primary's p95 latency
+    (at least `hedge_min_delay`) is also sent to the runner-up, and the first answer wins.
+    """
+    def __init__(self, endpoints: List[RpcEndpoint], hedge: bool = True, hedge_min_delay: float = 0.05):
+        if not endpoints:
+            raise ValueError("RpcRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedges = 0 # Hedged requests sent
+        self.hedge_wins = 0 # ... that answered first
+        self.failovers = 0
+
+    def ranked(self) -> List[RpcEndpoint]:
+        """Usable endpoints, best first. If none passed its health probe, the probe is ignored."""
+        now = time.monotonic()
+        usable = [e for e in self.endpoints if e.available(now)]
+        ranked = sorted([e for e in usable if e.probe_ok] or usable, key=RpcEndpoint.score)
+        if len(ranked) > 1 and random.random() < _RPC_EXPLORE_PROBABILITY:
+            # Now and then try another endpoint first, so a recovered provider's EWMA gets refreshed
+            explore = random.choice(ranked[1:])
+            ranked.remove(explore)
+            ranked.insert(0, explore)
+        return ranked
+
+    async def _attempt(self, endpoint: RpcEndpoint, method: str, params: List[Any]) -> Any:
+        endpoint.begin()
+        started = time.monotonic()
+        try:
+            result = await endpoint.transport.call(method, params)
+        except RpcCallError as e:
+            if e.retryable:
+                endpoint.record_failure(time.monotonic() - started)
+            else:
+                endpoint.record_success(time.monotonic() - started) # The endpoint answered; the call itself was bad
+            raise
+        except asyncio.CancelledError:
+            endpoint.record_abandoned(time.monotonic() - started)
+            raise
+        endpoint.record_success(time.monotonic() - started)
+        return result
+
+    async def call(self, method: str, params: List[Any]) -> Any:
+        ranked = self.ranked()
+        if not ranked:
+            raise RpcCallError(method, "All RPC endpoints are unavailable (circuits open)")
+        primary, backup = ranked[0], (ranked[1] if len(ranked) > 1 else None)
+        if backup is not None and self.hedge and not method.startswith(_RPC_UNHEDGED_PREFIXES):
+            return await self._hedged_call(method, params, primary, backup)
+        try:
+            return await self._attempt(primary, method, params)
+        except RpcCallError as e:
+            if backup is None or not e.retryable:
+                raise
+            logger.warning(f"Solana RPC: {method} failed on {primary.name} ({e}); retrying on {backup.name}")
+            self.failovers += 1
+            return await self._attempt(backup, method, params)
+
+    async def _hedged_call(self, method: str, params: List[Any], primary: RpcEndpoint, backup: RpcEndpoint) -> Any:
+        first = asyncio.ensure_future(self._attempt(primary, method, params))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=max(self.hedge_min_delay, primary.p95() or 0.0))
+            if done:
+                error = first.exception()
+                if error is None:
+                    return first.result()
+                if not isinstance(error, RpcCallError) or not error.retryable:
+                    raise error
+                logger.warning(f"Solana RPC: {method} failed on {primary.name} ({error}); retrying on {backup.name}")
+                self.failovers += 1
+                return await self._attempt(backup, method, params)
+
+            self.hedges += 1
+            second = asyncio.ensure_future(self._attempt(backup, method, params))
+            pending.add(second)
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if not isinstance(error, RpcCallError) or not error.retryable:
+                        raise error
+                    last_error = error
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def is_connected(self) -> bool:
+        """Probes every endpoint's /health; True while at least one is up."""
+        results = await asyncio.gather(*[e.transport.is_connected() for e in self.endpoints], return_exceptions=True)
+        for endpoint, result in zip(self.endpoints, results):
+            alive = result is True
+            if alive != endpoint.probe_ok:
+                logger.log(logging.INFO if alive else logging.WARNING, f"Solana RPC: Health probe for {endpoint.name}: {'up' if alive else 'down'}")
+            endpoint.probe_ok = alive
+        return any(e.probe_ok for e in self.endpoints)
+
+    def endpoint_stats(self, name: str) -> Optional[Dict[str, float]]:
+        for endpoint in self.endpoints:
+            if endpoint.name == name:
+                return endpoint.stats()
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {"endpoints": len(self.endpoints), "hedges": self.hedges, "hedge_wins": self.hedge_wins, "failovers": self.failovers}
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*[e.transport.aclose() for e in self.endpoints], return_exceptions=True)
+
+
+def rpc_endpoints() -> List[str]:
+    """SOLANA_RPC_URLS (comma-separated) if set, else SOLANA_RPC_URL."""
+    urls = [url.strip() for url in settings.SOLANA_RPC_URLS.split(",") if url.strip()]
+    return urls or ([settings.SOLANA_RPC_URL] if settings.SOLANA_RPC_URL else [])
+
+
+def create_rpc_client() -> "AsyncClient":
+    """
+    Builds a solana-py RPC client for the "per_mint" fetch mode. It talks to the first endpoint
+    only: its calls bypass the RpcRouter (no ranking, hedging, failover or breakers). Its
+    underlying httpx session pools keep-alive connections.
+    """
+    from solana.rpc.async_api import AsyncClient # Deferred: keeps it off the module import path
+    return AsyncClient(rpc_endpoints()[0], commitment=RPC_COMMITMENT, timeout=settings.SOLANA_RPC_TIMEOUT)
+
+
+def _create_endpoint_transport(url: str) -> SolanaRpcTransport:
+    """Batching is disabled when SOLANA_RPC_BATCH_WINDOW_MS is 0."""
+    if settings.SOLANA_RPC_BATCH_WINDOW_MS > 0:
+        return BatchingRpcTransport(
+            url,
+            timeout=settings.SOLANA_RPC_TIMEOUT,
+            max_connections=settings.SOLANA_RPC_MAX_CONNECTIONS,
+            window=settings.SOLANA_RPC_BATCH_WINDOW_MS / 1000,
+            max_batch_size=settings.SOLANA_RPC_MAX_BATCH_SIZE,
+        )
+    return SolanaRpcTransport(url, timeout=settings.SOLANA_RPC_TIMEOUT, max_connections=settings.SOLANA_RPC_MAX_CONNECTIONS)
+
+
+def create_rpc_transport() -> "SolanaRpcTransport | RpcRouter":
+    """The JSON-RPC transport for one endpoint, or an RpcRouter over several."""
+    urls = rpc_endpoints()
+    if len(urls) == 1:
+        return _create_endpoint_transport(urls[0])
+    endpoints = [
+        RpcEndpoint(url, _create_endpoint_transport(url), breaker_failures=settings.SOLANA_RPC_BREAKER_FAILURES, breaker_cooldown=settings.SOLANA_RPC_BREAKER_COOLDOWN)
+        for url in urls
+    ]
+    for endpoint in endpoints:
+        if endpoint.name not in _registered_endpoint_metrics:
+            _registered_endpoint_metrics.add(endpoint.name)
+            metrics.register_stats("rpc_endpoint", endpoint.name, lambda name=endpoint.name: _rpc_transport.endpoint_stats(name) if isinstance(_rpc_transport, RpcRouter) else None)
+    return RpcRouter(endpoints, hedge=settings.SOLANA_RPC_HEDGE_ENABLED, hedge_min_delay=settings.SOLANA_RPC_HEDGE_MIN_DELAY_MS / 1000)
+
+
+_registered_endpoint_metrics: set[str] = set() # register_stats is append-only; one source per endpoint name
+metrics.register_stats("rpc_router", "solana", lambda: _rpc_transport.stats() if isinstance(_rpc_transport, RpcRouter) else None)
+
+
+async def _rpc_health_loop(transport: "SolanaRpcTransport | RpcRouter", interval: float, failures_to_trip: int) -> None:
+    """
+    Probes the RPC node(s) in the background so requests don't have to. The node is only
+    marked unhealthy after `failures_to_trip` consecutive failed probes, so one dropped
+    /health call doesn't turn every balance request into a 503 until the next probe.
+    """
+    global _rpc_healthy
+    consecutive_failures = 0
+    while True:
+        try:
+            is_alive = await transport.is_connected()
+        except Exception as e:
+            logger.warning(f"Solana RPC: Health probe raised: {e}")
+            is_alive = False
+        consecutive_failures = 0 if is_alive else consecutive_failures + 1
+        if is_alive and not _rpc_healthy:
+            logger.info(f"Solana RPC: Node is healthy again: {', '.join(rpc_endpoints())}")
+            _rpc_healthy = True
+        elif not is_alive and _rpc_healthy:
+            if consecutive_failures >= failures_to_trip:
+                logger.error(f"Solana RPC: {consecutive_failures} consecutive health probes failed for {', '.join(rpc_endpoints())}")
+                _rpc_healthy = False
+            else:
+                logger.warning(f"Solana RPC: Health probe failed ({consecutive_failures}/{failures_to_trip}) for {', '.join(rpc_endpoints())}")
+        await asyncio.sleep(interval)
+
+
+async def init_rpc_client() -> Optional["AsyncClient"]:
+    """
+    Creates the shared RPC transport (and, in "per_mint" fetch mode, the solana-py client)
+    and starts the health monitor. Called once from the app lifespan.
+    """
+    global _rpc_client, _rpc_transport, _rpc_health_task, _rpc_healthy
+    if _rpc_transport is None:
+        if settings.SOLANA_BALANCE_FETCH_MODE == "per_mint":
+            _rpc_client = create_rpc_client()
+            if len(rpc_endpoints()) > 1:
+                logger.warning("Solana RPC: per_mint fetch mode uses the first of SOLANA_RPC_URLS only; switch to \"parsed\" for routing and failover")
+        _rpc_transport = create_rpc_transport()
+        _rpc_healthy = True
+        _rpc_health_task = asyncio.create_task(_rpc_health_loop(_rpc_transport, settings.SOLANA_RPC_HEALTH_INTERVAL, settings.SOLANA_RPC_HEALTH_FAILURES))
+        logger.info(f"Solana RPC: Shared client created ({type(_rpc_transport).__name__}).")
+    return _rpc_client
+
+
+async def close_rpc_client() -> None:
+    """Stops the health monitor and closes the shared RPC client/transport."""
+    global _rpc_client, _rpc_transport, _rpc_health_task
+    if _rpc_health_task is not None:
+        _rpc_health_task.cancel()
+        try:
+            await _rpc_health_task
+        except asyncio.CancelledError:
+            pass
+        _rpc_health_task = None
+    if _rpc_transport is not None:
+        await _rpc_transport.aclose()
+        _rpc_transport = None
+    if _rpc_client is not None:
+        await _rpc_client.close()
+        _rpc_client = None
+        logger.info("Solana RPC: Shared client closed.")
+
+
+def is_rpc_healthy() -> bool:
+    """Last known RPC health, as seen by the background monitor."""
+    return _rpc_healthy
+
+
+@asynccontextmanager
+async def _rpc_client_scope():
+    """Yields the shared RPC client, or a one-off client outside the app lifespan."""
+    if _rpc_client is not None:
+        yield _rpc_client
+    else:
+        logger.debug("Solana RPC: No shared client initialised, using a one-off client.")
+        async with create_rpc_client() as one_off_client:
+            yield one_off_client
+
+
+@asynccontextmanager
+async def _rpc_transport_scope():
+    """Yields the shared JSON-RPC transport, or a one-off transport outside the app lifespan."""
+    if _rpc_transport is not None:
+        yield _rpc_transport
+    else:
+        one_off_transport = create_rpc_transport()
+        try:
+            yield one_off_transport
+        finally:
+            await one_off_transport.aclose()
+
+
+def _build_token_balance(symbol: str, total_balance_raw: int, mint: Optional[str] = None) -> TokenBalance:
+    """Converts a raw on-chain amount into a TokenBalance using the token's decimals."""
+    decimals = TOKEN_DECIMALS.get(symbol, 0)
+    balance_ui = Decimal(total_balance_raw) / (Decimal(10)**decimals) if decimals > 0 else Decimal(total_balance_raw)
+    return TokenBalance(
+        token_symbol=symbol,
+        amount_ui=float(balance_ui.quantize(Decimal('0.0001'))),
+        amount_raw=str(total_balance_raw),
+        token_mint=mint
+    )
+
+
+async def _fetch_sol_balance(transport: SolanaRpcTransport, owner_pubkey: Pubkey, wallet_address: str) -> Optional[TokenBalance]:
+    """Fetches the native SOL balance. Errors are logged and yield None."""
+    try:
+        result = await transport.call("getBalance", [str(owner_pubkey), {"commitment": RPC_COMMITMENT}])
+        if result and result.get("value") is not None:
+            sol_balance = _build_token_balance("SOL", int(result["value"]))
+            logger.debug(f"Solana RPC: Found SOL balance: {sol_balance.amount_ui}")
+            return sol_balance
+        logger.warning(f"Solana RPC: SOL balance RPC returned None for {wallet_address}")
+    except RpcCallError as e:
+        logger.error(f"Solana RPC: RPC Error (SOL balance) for {wallet_address}: {e}")
+    except Exception as e:
+        logger.error(f"Solana RPC: Unexpected error (SOL balance): {e}", exc_info=True)
+    return None
+
+
+async def _fetch_spl_balances_parsed(transport: SolanaRpcTransport, owner_pubkey: Pubkey, wallet_address: str) -> List[TokenBalance]:
+    """
+    Fetches every SPL token account of the owner in ONE getTokenAccountsByOwner(programId=Token)
+    call with jsonParsed encoding, then sums amounts per known mint locally.
+    """
+    try:
+        result = await transport.call("getTokenAccountsByOwner", [
+            str(owner_pubkey),
+            {"programId": str(TOKEN_PROGRAM_ID)},
+            {"encoding": "jsonParsed", "commitment": RPC_COMMITMENT},
+        ])
+    except RpcCallError as e:
+        logger.error(f"Solana RPC: RPC Error (parsed token accounts) for {wallet_address}: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Solana RPC: Unexpected error (parsed token accounts) for {wallet_address}: {e}", exc_info=True)
+        return []
+
+    totals_raw: Dict[str, int] = {}
+    for keyed_account in (result or {}).get("value") or []:
+        try:
+            info = keyed_account["account"]["data"]["parsed"]["info"]
+            symbol = MINT_TO_SYMBOL.get(info["mint"])
+            if symbol is None:
+                continue # Not a token Lucy tracks
+            totals_raw[symbol] = totals_raw.get(symbol, 0) + int(info["tokenAmount"]["amount"])
+        except (KeyError, TypeError, ValueError) as e_parse:
+            logger.warning(f"Solana RPC: Error parsing token account {keyed_account.get('pubkey') if isinstance(keyed_account, dict) else keyed_account}: {e_parse}")
+
+    token_balances: List[TokenBalance] = []
+    for symbol, mint_pubkey in KNOWN_TOKENS.items():
+        total_balance_raw = totals_raw.get(symbol, 0)
+        if total_balance_raw > 0:
+            token_balances.append(_build_token_balance(symbol, total_balance_raw, str(mint_pubkey)))
+            logger.debug(f"Solana RPC: Found {symbol} total balance: {token_balances[-1].amount_ui}")
+        else:
+            logger.debug(f"Solana RPC: No non-zero balance found for {symbol}")
+    return token_balances
+
+
+async def _fetch_spl_balances(transport: SolanaRpcTransport, owner_pubkey: Pubkey, wallet_address: str) -> List[TokenBalance]:
+    """SPL balances using the configured SOLANA_BALANCE_FETCH_MODE."""
+    if settings.SOLANA_BALANCE_FETCH_MODE == "per_mint":
+        async with _rpc_client_scope() as client:
+            return await _fetch_spl_balances_per_mint(client, owner_pubkey, wallet_address)
+    return await _fetch_spl_balances_parsed(transport, owner_pubkey, wallet_address)
+
+
+async def _fetch_spl_balances_per_mint(client: "AsyncClient", owner_pubkey: Pubkey, wallet_address: str) -> List[TokenBalance]:
+    """Legacy fetch: one getTokenAccountsByOwner per known mint plus one getTokenAccountBalance per account."""
+    token_balances: List[TokenBalance] = []
+    for symbol, mint_pubkey in KNOWN_TOKENS.items():
+        try:
+            opts = TokenAccountOpts(mint=mint_pubkey)
+            token_accounts_resp = await client.get_token_accounts_by_owner(owner_pubkey, opts=opts)
+
+            total_balance_raw = 0
+            if token_accounts_resp.value:
+                logger.debug(f"Found {len(token_accounts_resp.value)} token account(s) for {symbol}")
+                balance_tasks = [client.get_token_account_balance(acc.pubkey) for acc in token_accounts_resp.value]
+                balance_responses = await asyncio.gather(*balance_tasks, return_exceptions=True)
+                
+                for resp in balance_responses:
+                    if isinstance(resp, SolanaRpcException):
+                        logger.warning(f"Solana RPC: RPC error (token balance) for {symbol}: {resp}")
+                    elif isinstance(resp, Exception):
+                        logger.warning(f"Solana RPC: Unexpected error (token balance) for {symbol}: {resp}", exc_info=True)
+                    elif resp.value and resp.value.amount:
+                        try:
+                            amount_int = int(resp.value.amount)
+                            total_balance_raw += amount_int
+                        except (ValueError, TypeError) as e_parse:
+                            logger.warning(f"Solana RPC: Error parsing balance amount '{resp.value.amount}': {e_parse}")
+                    else:
+                        logger.warning(f"Solana RPC: No balance amount found for {symbol} account.")
+
+            if total_balance_raw > 0:
+                token_balances.append(_build_token_balance(symbol, total_balance_raw, str(mint_pubkey)))
+                logger.debug(f"Solana RPC: Found {symbol} total balance: {token_balances[-1].amount_ui}")
+            else:
+                logger.debug(f"Solana RPC: No non-zero balance found for {symbol}")
+        except SolanaRpcException as e:
+             logger.error(f"Solana RPC: RPC Error (token accounts) for {symbol} / {wallet_address}: {e}")
+        except Exception as e: 
+             logger.error(f"Solana RPC: Unexpected error (token accounts) for {symbol}: {e}", exc_info=True)
+    return token_balances
+
+
+# Concurrent calls within the worker share one load; results are kept in the cache backend
+_balances_flight = SingleFlight("wallet_balances_inflight")
+metrics.register_cache("wallet_balances_inflight", _balances_flight.stats)
+_balances_store = shared_cache(
+    "balances",
+    encode=lambda balances: balances.model_dump(mode="json"),
+    decode=WalletBalanceResponse.model_validate,
+)
+metrics.register_cache("wallet_balances", _balances_store.stats)
+
+# Push-invalidated balance cache, owned by the app lifespan (None when disabled)
+_balance_cache: Optional[BalanceSubscriptionCache] = None
+metrics.register_cache("balance_subscriptions", lambda: _balance_cache.stats() if _balance_cache is not None else None)
+
+
+def _derive_ws_url(rpc_url: str) -> str:
+    """Solana nodes serve the websocket API on the same host: http(s):// -> ws(s)://"""
+    if rpc_url.startswith("https://"):
+        return "wss://" + rpc_url[len("https://"):]
+    if rpc_url.startswith("http://"):
+        return "ws://" + rpc_url[len("http://"):]
+    return rpc_url
+
+
+async def init_balance_cache(ws_url: Optional[str] = None) -> Optional[BalanceSubscriptionCache]:
+    """Starts the websocket-backed balance cache. Called once from the app lifespan."""
+    global _balance_cache
+    if not settings.BALANCE_CACHE_ENABLED:
+        logger.info("Solana RPC: Balance cache disabled.")
+        return None
+    if _balance_cache is None:
+        _balance_cache = BalanceSubscriptionCache(
+            ws_url or settings.SOLANA_WS_URL or _derive_ws_url(rpc_endpoints()[0]),
+            token_program_id=str(TOKEN_PROGRAM_ID),
+            max_wallets=settings.BALANCE_CACHE_MAX_WALLETS,
+            idle_ttl=settings.BALANCE_CACHE_IDLE_TTL,
+            max_age=settings.BALANCE_CACHE_MAX_AGE,
+            commitment=RPC_COMMITMENT,
+            on_invalidate=_balances_store.delete,
+        )
+        await _balance_cache.start()
+    return _balance_cache
+
+
+async def close_balance_cache() -> None:
+    global _balance_cache
+    if _balance_cache is not None:
+        await _balance_cache.aclose()
+        _balance_cache = None
+
+
+@metrics.instrument_stage("get_wallet_balances")
 async def get_wallet_balances(wallet_address: str) -> Optional[WalletBalanceResponse]:
     """
     Fetches SOL and known SPL token balances for a given wallet address via Solana RPC.
+    Served from the push-invalidated balance cache when the wallet is watched and
+    unchanged. Otherwise concurrent calls for the same address share one fetch (one per
+    host with the sqlite cache backend), and the result is reused for BALANCES_RESULT_TTL
+    seconds. Errors propagate unchanged.
+    """
+    if _balance_cache is not None:
+        cached = _balance_cache.get(wallet_address)
+        if cached is not None:
+            logger.debug(f"Solana RPC: Balance cache hit for {wallet_address}")
+            return cached
+    return await _balances_flight.do(wallet_address, lambda: _load_wallet_balances(wallet_address))
+
+
+async def _load_wallet_balances(wallet_address: str) -> Optional[WalletBalanceResponse]:
+    if settings.BALANCES_RESULT_TTL <= 0:
+        return await _fetch_and_cache_wallet_balances(wallet_address)
+    # A result another worker fetched skips the websocket cache: its subscription would start after the fetch
+    return await _balances_store.load(wallet_address, lambda: _fetch_and_cache_wallet_balances(wallet_address), ttl=settings.BALANCES_RESULT_TTL)
+
+
+async def _fetch_and_cache_wallet_balances(wallet_address: str) -> Optional[WalletBalanceResponse]:
+    balance_cache = _balance_cache
+    ticket = None
+    if balance_cache is not None:
+        try:
+            Pubkey.from_string(wallet_address) # Don't subscribe to garbage; the fetch reports the 400
+            ticket = balance_cache.begin_fetch(wallet_address)
+        except (ValueError, TypeError):
+            pass
+    balances = await _fetch_wallet_balances(wallet_address)
+    if ticket is not None and balances is not None:
+        balance_cache.complete_fetch(wallet_address, balances, ticket)
+    return balances
+
+
+async def _fetch_wallet_balances(wallet_address: str) -> Optional[WalletBalanceResponse]:
+    """
+    In the default "parsed" fetch mode this costs two concurrent RPC calls regardless
+    of how many token accounts the wallet holds.
     """
     logger.info(f"Solana RPC: Fetching balances for wallet: {wallet_address}")
     try:
@@ -71,83 +875,25 @@ async def get_wallet_balances(wallet_address: str) -> Optional[WalletBalanceResp
         logger.error(f"Solana RPC: Invalid wallet address format: {wallet_address}")
         raise HTTPException(status_code=400, detail="Invalid wallet address format provided.")
 
-    token_balances: List[TokenBalance] = []
-    rpc_url = settings.SOLANA_RPC_URL
-    if not rpc_url:
+    rpc_urls = rpc_endpoints()
+    if not rpc_urls:
         logger.error("Solana RPC: SOLANA_RPC_URL is not configured.")
         raise HTTPException(status_code=500, detail="Solana RPC endpoint not configured.")
 
-    logger.debug(f"Solana RPC: Connecting to {rpc_url}")
-    commitment: Commitment = "confirmed" 
+    # With several endpoints the router's per-endpoint breakers decide instead
+    if not is_rpc_healthy() and not isinstance(_rpc_transport, RpcRouter):
+        logger.error(f"Solana RPC: Node marked unhealthy by background monitor: {', '.join(rpc_urls)}")
+        raise HTTPException(status_code=503, detail="Could not connect to Solana RPC.")
 
     try:
-        async with AsyncClient(rpc_url, commitment=commitment) as client:
-            is_alive = await client.is_connected()
-            if not is_alive:
-                 logger.error(f"Solana RPC: Failed to connect to RPC: {rpc_url}")
-                 raise HTTPException(status_code=503, detail="Could not connect to Solana RPC.")
-
-            try:
-                sol_balance_resp = await client.get_balance(owner_pubkey)
-                if sol_balance_resp.value is not None:
-                    sol_raw = sol_balance_resp.value
-                    sol_ui = Decimal(sol_raw) / (Decimal(10)**TOKEN_DECIMALS["SOL"])
-                    token_balances.append(TokenBalance(
-                        token_symbol="SOL",
-                        amount_ui=float(sol_ui.quantize(Decimal('0.0001'))), 
-                        amount_raw=str(sol_raw)
-                    ))
-                    logger.debug(f"Solana RPC: Found SOL balance: {sol_ui}")
-                else:
-                     logger.warning(f"Solana RPC: SOL balance RPC returned None for {wallet_address}")
-            except SolanaRpcException as e:
-                 logger.error(f"Solana RPC: RPC Error (SOL balance) for {wallet_address}: {e}")
-
-            except Exception as e:
-                 logger.error(f"Solana RPC: Unexpected error (SOL balance): {e}", exc_info=True)
+        async with _rpc_transport_scope() as transport:
+            # With a batching transport both calls leave in the same HTTP request
+            sol_balance, spl_balances = await asyncio.gather(
+                _fetch_sol_balance(transport, owner_pubkey, wallet_address),
+                _fetch_spl_balances(transport, owner_pubkey, wallet_address),
+            )
+        token_balances: List[TokenBalance] = ([sol_balance] if sol_balance else []) + spl_balances
 
-            for symbol, mint_pubkey in KNOWN_TOKENS.items():
-                try:
-                    opts = TokenAccountOpts(mint=mint_pubkey)
-                    token_accounts_resp = await client.get_token_accounts_by_owner(owner_pubkey, opts=opts)
-
-                    total_balance_raw = 0
-                    if token_accounts_resp.value:
-                        logger.debug(f"Found {len(token_accounts_resp.value)} token account(s) for {symbol}")
-                        balance_tasks = [client.get_token_account_balance(acc.pubkey) for acc in token_accounts_resp.value]
-                        balance_responses = await asyncio.gather(*balance_tasks, return_exceptions=True)
-                        
-                        for resp in balance_responses:
-                            if isinstance(resp, SolanaRpcException):
-                                logger.warning(f"Solana RPC: RPC error (token balance) for {symbol}: {resp}")
-                            elif isinstance(resp, Exception):
-                                logger.warning(f"Solana RPC: Unexpected error (token balance) for {symbol}: {resp}", exc_info=True)
-                            elif resp.value and resp.value.amount:
-                                try:
-                                    amount_int = int(resp.value.amount)
-                                    total_balance_raw += amount_int
-                                except (ValueError, TypeError) as e_parse:
-                                    logger.warning(f"Solana RPC: Error parsing balance amount '{resp.value.amount}': {e_parse}")
-                            else:
-                                logger.warning(f"Solana RPC: No balance amount found for {symbol} account.")
-
-                    decimals = TOKEN_DECIMALS.get(symbol, 0)
-                    balance_ui = Decimal(total_balance_raw) / (Decimal(10)**decimals) if decimals > 0 else Decimal(total_balance_raw)
-
-                    if total_balance_raw > 0:
-                        token_balances.append(TokenBalance(
-                            token_symbol=symbol,
-                            amount_ui=float(balance_ui.quantize(Decimal('0.0001'))),
-                            amount_raw=str(total_balance_raw),
-                            token_mint=str(mint_pubkey)
-                        ))
-                        logger.debug(f"Solana RPC: Found {symbol} total balance: {balance_ui}")
-                    else:
-                        logger.debug(f"Solana RPC: No non-zero balance found for {symbol}")
-                except SolanaRpcException as e:
-                     logger.error(f"Solana RPC: RPC Error (token accounts) for {symbol} / {wallet_address}: {e}")
-                except Exception as e: 
-                     logger.error(f"Solana RPC: Unexpected error (token accounts) for {symbol}: {e}", exc_info=True)
         if not token_balances:
              logger.warning(f"Solana RPC: Found no SOL or known SPL balances for {wallet_address}")
              return WalletBalanceResponse(wallet_address=wallet_address, balances=[])
@@ -155,7 +901,7 @@ async def get_wallet_balances(wallet_address: str) -> Optional[WalletBalanceResp
         logger.info(f"Solana RPC: Successfully fetched {len(token_balances)} balance(s) for {wallet_address}")
         return WalletBalanceResponse(wallet_address=wallet_address, balances=token_balances)
 
-    except SolanaRpcException as e:
+    except (SolanaRpcException, RpcCallError) as e:
         logger.error(f"Solana RPC: Solana RPC Error during balance fetch for {wallet_address}: {e}")
         raise HTTPException(status_code=503, detail=f"Solana RPC Error: Could not connect or fetch data.") from e
     except Exception as e:
@@ -163,25 +909,74 @@ async def get_wallet_balances(wallet_address: str) -> Optional[WalletBalanceResp
         raise HTTPException(status_code=500, detail="Unexpected error fetching wallet balances.") from e
 
 
-async def get_token_prices(token_symbols: List[str]) -> Dict[str, Optional[float]]:
+@metrics.instrument_stage("get_wallet_balances_batch")
+async def get_wallet_balances_batch(wallet_addresses: List[str]) -> BatchWalletBalanceResponse:
     """
-    Fetches the current USD price for given token symbols using CoinGecko's free API.
-    Returns prices as floats.
+    Fetches balances for many wallets. Duplicate addresses are fetched once and at most
+    BALANCES_BATCH_CONCURRENCY wallets are in flight at a time; their RPC calls are merged
+    into shared JSON-RPC batches by the transport. Per-wallet failures are reported in
+    `errors` instead of failing the whole batch.
     """
-    prices: Dict[str, Optional[float]] = {symbol: None for symbol in token_symbols}
-    api_ids_to_fetch = [TOKEN_API_IDS.get(s) for s in token_symbols if TOKEN_API_IDS.get(s)]
+    unique_addresses = list(dict.fromkeys(wallet_addresses))
+    if len(unique_addresses) > settings.BALANCES_BATCH_MAX_WALLETS:
+        raise HTTPException(status_code=400, detail=f"Too many wallet addresses (max {settings.BALANCES_BATCH_MAX_WALLETS}).")
+    logger.info(f"Solana RPC: Fetching balances for {len(unique_addresses)} unique wallet(s) ({len(wallet_addresses)} requested)")
 
-    if not api_ids_to_fetch:
-        logger.warning("Price Service: No valid CoinGecko API IDs found for requested symbols.")
-        return prices
+    semaphore = asyncio.Semaphore(settings.BALANCES_BATCH_CONCURRENCY)
 
-    ids_param = ",".join(list(set(api_ids_to_fetch)))
-    url = f"https://api.coingecko.com/api/v3/simple/price?ids={ids_param}&vs_currencies=usd"
-    logger.info(f"Price Service: Fetching prices from CoinGecko for IDs: {ids_param}")
+    async def fetch_one(wallet_address: str) -> Optional[WalletBalanceResponse]:
+        async with semaphore:
+            return await get_wallet_balances(wallet_address)
 
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(url)
+    outcomes = await asyncio.gather(*[fetch_one(address) for address in unique_addresses], return_exceptions=True)
+
+    results: List[WalletBalanceResponse] = []
+    errors: List[WalletBalanceError] = []
+    for wallet_address, outcome in zip(unique_addresses, outcomes):
+        if isinstance(outcome, HTTPException):
+            errors.append(WalletBalanceError(wallet_address=wallet_address, status_code=outcome.status_code, detail=str(outcome.detail)))
+        elif isinstance(outcome, Exception):
+            logger.error(f"Solana RPC: Unexpected error in batch balance fetch for {wallet_address}: {outcome}", exc_info=outcome)
+            errors.append(WalletBalanceError(wallet_address=wallet_address, status_code=500, detail="Unexpected error fetching wallet balances."))
+        elif outcome is None:
+            errors.append(WalletBalanceError(wallet_address=wallet_address, status_code=404, detail="Could not retrieve balances for the wallet address."))
+        else:
+            results.append(outcome)
+
+    logger.info(f"Solana RPC: Batch balance fetch done: {len(results)} ok, {len(errors)} failed")
+    return BatchWalletBalanceResponse(results=results, errors=errors)
+
+
+class PriceSource(abc.ABC):
+    """Where USD prices come from. Swap in StaticPriceSource for tests and benchmarks."""
+    @abc.abstractmethod
+    async def fetch_prices(self, token_symbols: List[str]) -> Dict[str, float]:
+        """Returns prices for the symbols it could resolve; failures are logged, not raised."""
+
+    async def aclose(self) -> None:
+        pass
+
+
+class CoinGeckoPriceSource(PriceSource):
+    """CoinGecko's free simple/price API over a pooled client."""
+    def __init__(self, base_url: str = "https://api.coingecko.com/api/v3", timeout: float = 5.0):
+        self.base_url = base_url
+        self._session = httpx.AsyncClient(timeout=timeout)
+
+    async def fetch_prices(self, token_symbols: List[str]) -> Dict[str, float]:
+        prices: Dict[str, float] = {}
+        api_ids_to_fetch = [TOKEN_API_IDS.get(s) for s in token_symbols if TOKEN_API_IDS.get(s)]
+
+        if not api_ids_to_fetch:
+            logger.warning("Price Service: No valid CoinGecko API IDs found for requested symbols.")
+            return prices
+
+        ids_param = ",".join(list(set(api_ids_to_fetch)))
+        url = f"{self.base_url}/simple/price?ids={ids_param}&vs_currencies=usd"
+        logger.info(f"Price Service: Fetching prices from CoinGecko for IDs: {ids_param}")
+
+        try:
+            response = await self._session.get(url)
             response.raise_for_status()
             data = response.json()
             logger.debug(f"Price Service: Received price data: {data}")
@@ -194,17 +989,230 @@ async def get_token_prices(token_symbols: List[str]) -> Dict[str, Optional[float
                     except (ValueError, TypeError):
                          logger.error(f"Price Service: Could not convert price for {symbol} to float: {data[api_id]['usd']}")
 
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Price Service: HTTP error fetching prices from CoinGecko: Status {e.response.status_code}, Response: {e.response.text}")
-    except httpx.RequestError as e:
-        logger.error(f"Price Service: Network error fetching prices from CoinGecko: {e}")
-    except (KeyError, ValueError, TypeError) as e:
-         logger.error(f"Price Service: Error parsing price data from CoinGecko: {e}")
-    except Exception as e:
-        logger.error(f"Price Service: Unexpected error fetching prices: {e}", exc_info=True)
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Price Service: HTTP error fetching prices from CoinGecko: Status {e.response.status_code}, Response: {e.response.text}")
+        except httpx.RequestError as e:
+            logger.error(f"Price Service: Network error fetching prices from CoinGecko: {e}")
+        except (KeyError, ValueError, TypeError) as e:
+             logger.error(f"Price Service: Error parsing price data from CoinGecko: {e}")
+        except Exception as e:
+            logger.error(f"Price Service: Unexpected error fetching prices: {e}", exc_info=True)
+
+        return prices
 
+    async def aclose(self) -> None:
+        await self._session.aclose()
+
+
+class StaticPriceSource(PriceSource):
+    """Local stand-in that serves fixed prices and counts fetches."""
+    def __init__(self, prices: Dict[str, float]):
+        self.prices = dict(prices)
+        self.fetch_count = 0
+
+    async def fetch_prices(self, token_symbols: List[str]) -> Dict[str, float]:
+        self.fetch_count += 1
+        return {s: self.prices[s] for s in token_symbols if s in self.prices}
+
+
+class PriceCache:
+    """
+    In-process USD price cache keyed by symbol with stale-while-revalidate semantics:
+    - younger than `ttl`: served as is
+    - between `ttl` and `max_stale`: served as is, refreshed in the background
+    - missing or older than `max_stale`: fetched inline (one shared fetch for concurrent readers)
+    A background refresher keeps every symbol in TOKEN_API_IDS warm, so readers
+    normally never wait on the network.
+
+    With a `store`, prices are also written to it and prices another worker fetched are
+    adopted; each symbol is fetched only by the worker holding its refresh lease.
+    """
+    def __init__(self, source: PriceSource, ttl: float, max_stale: float, store: Optional[SharedCache] = None):
+        self.source = source
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.store = store
+        self._entries: Dict[str, Tuple[float, float]] = {} # symbol -> (price, fetched_at)
+        self._misses: Dict[str, float] = {} # symbol -> last failed fetch, so unknown symbols aren't refetched on every read
+        self._revalidate_task: Optional[asyncio.Task] = None
+        self._fill_lock = asyncio.Lock()
+        self._refresher_task: Optional[asyncio.Task] = None
+        self.hits = 0 # Per symbol: served without waiting on the source (fresh or stale)
+        self.misses = 0 # Per symbol: fetched inline
+
+    def _adopt_shared(self, token_symbols: List[str]) -> None:
+        """Takes prices from the store that are newer than ours."""
+        now = time.monotonic()
+        for symbol in token_symbols:
+            entry = self.store.get(symbol)
+            if entry is None:
+                continue
+            fetched_at = now - entry.age
+            local = self._entries.get(symbol)
+            if local is None or fetched_at > local[1]:
+                self._entries[symbol] = (float(entry.value), fetched_at)
+                self._misses.pop(symbol, None)
+
+    async def refresh(self, token_symbols: List[str], max_age: float = 0.0) -> None:
+        """
+        Fetches the symbols from the source; failed symbols keep their previous price. With a
+        store, symbols priced within `max_age` seconds by any worker are adopted instead, and
+        symbols whose refresh lease another worker holds are left to it.
+        """
+        leases: Dict[str, str] = {}
+        if self.store is not None:
+            self._adopt_shared(token_symbols)
+            now = time.monotonic()
+            due = [s for s in token_symbols if s not in self._entries or now - self._entries[s][1] > max_age]
+            for symbol in due:
+                owner = self.store.acquire_lease(symbol)
+                if owner is not None:
+                    leases[symbol] = owner
+            token_symbols = list(leases)
+            if not token_symbols:
+                return
+
+        try:
+            prices = await self.source.fetch_prices(token_symbols)
+            fetched_at = time.monotonic()
+            for symbol in token_symbols:
+                if symbol in prices:
+                    self._entries[symbol] = (prices[symbol], fetched_at)
+                    self._misses.pop(symbol, None)
+                    if self.store is not None:
+                        self.store.set(symbol, prices[symbol], ttl=self.max_stale)
+                else:
+                    self._misses[symbol] = fetched_at
+        finally:
+            for symbol, owner in leases.items():
+                self.store.release_lease(symbol, owner)
 
-    logger.info(f"Price Service: Fetched prices: {prices}")
+    def _revalidate_in_background(self, token_symbols: List[str]) -> None:
+        if self._revalidate_task is None or self._revalidate_task.done():
+            logger.debug(f"Price Service: Revalidating stale prices in background: {token_symbols}")
+            self._revalidate_task = asyncio.create_task(self._revalidate(token_symbols))
+
+    async def _revalidate(self, token_symbols: List[str]) -> None:
+        try:
+            await self.refresh(token_symbols, max_age=self.ttl)
+        except Exception as e:
+            # The stale prices stay in place until max_stale; the next read retries
+            logger.error(f"Price Service: Background revalidation failed: {e}", exc_info=True)
+
+    def _usable_symbols(self, token_symbols: List[str], now: float) -> Tuple[List[str], List[str]]:
+        """Splits symbols into (stale-but-usable, missing-or-expired)."""
+        stale, missing = [], []
+        for symbol in token_symbols:
+            entry = self._entries.get(symbol)
+            if entry is None or now - entry[1] > self.max_stale:
+                if now - self._misses.get(symbol, float("-inf")) > self.ttl:
+                    missing.append(symbol)
+            elif now - entry[1] > self.ttl:
+                stale.append(symbol)
+        return stale, missing
+
+    async def get(self, token_symbols: List[str]) -> Dict[str, Optional[float]]:
+        stale, missing = self._usable_symbols(token_symbols, time.monotonic())
+        if self.store is not None and (stale or missing):
+            self._adopt_shared(stale + missing)
+            stale, missing = self._usable_symbols(token_symbols, time.monotonic())
+        self.hits += len(token_symbols) - len(missing)
+        self.misses += len(missing)
+        if stale:
+            self._revalidate_in_background(stale)
+        if missing:
+            async with self._fill_lock:
+                # Another reader may have filled these while we waited for the lock
+                _, still_missing = self._usable_symbols(missing, time.monotonic())
+                if still_missing:
+                    await self.refresh(still_missing, max_age=self.ttl)
+                if still_missing and self.store is not None:
+                    # Symbols being fetched by the worker holding their lease
+                    _, still_missing = self._usable_symbols(still_missing, time.monotonic())
+                    for symbol in still_missing:
+                        await self.store.wait_for(symbol, max_age=self.ttl)
+                    self._adopt_shared(still_missing)
+
+        now = time.monotonic()
+        prices: Dict[str, Optional[float]] = {}
+        for symbol in token_symbols:
+            entry = self._entries.get(symbol)
+            prices[symbol] = entry[0] if entry is not None and now - entry[1] <= self.max_stale else None
+        return prices
+
+    async def _refresh_loop(self, interval: float) -> None:
+        symbols = list(TOKEN_API_IDS.keys())
+        while True:
+            try:
+                # Prices another worker fetched during the last half interval are reused
+                await self.refresh(symbols, max_age=interval / 2)
+                logger.debug(f"Price Service: Background refresh done for {symbols}")
+            except Exception as e:
+                logger.error(f"Price Service: Background refresh failed: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def start_refresher(self, interval: float) -> None:
+        if self._refresher_task is None:
+            self._refresher_task = asyncio.create_task(self._refresh_loop(interval))
+
+    async def aclose(self) -> None:
+        for task in (self._refresher_task, self._revalidate_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresher_task = self._revalidate_task = None
+        await self.source.aclose()
+
+
+_price_cache: Optional[PriceCache] = None
+_prices_store = shared_cache("prices")
+metrics.register_stats("shared_cache", "prices", _prices_store.stats)
+metrics.register_cache("token_prices", lambda: _price_cache.stats() if _price_cache is not None else None)
+
+
+def get_price_cache() -> PriceCache:
+    """Returns the process-wide price cache, creating a CoinGecko-backed one on first use."""
+    global _price_cache
+    if _price_cache is None:
+        _price_cache = PriceCache(
+            CoinGeckoPriceSource(settings.COINGECKO_API_URL), ttl=settings.PRICE_CACHE_TTL, max_stale=settings.PRICE_CACHE_MAX_STALE, store=_prices_store,
+        )
+    return _price_cache
+
+
+async def init_price_cache(source: Optional[PriceSource] = None) -> PriceCache:
+    """Creates the price cache (optionally with a custom source) and starts its background refresher."""
+    global _price_cache
+    if source is not None:
+        if _price_cache is not None:
+            await _price_cache.aclose()
+        _price_cache = PriceCache(source, ttl=settings.PRICE_CACHE_TTL, max_stale=settings.PRICE_CACHE_MAX_STALE, store=_prices_store)
+    cache = get_price_cache()
+    cache.start_refresher(settings.PRICE_REFRESH_INTERVAL)
+    return cache
+
+
+async def close_price_cache() -> None:
+    global _price_cache
+    if _price_cache is not None:
+        await _price_cache.aclose()
+        _price_cache = None
+
+
+@metrics.instrument_stage("get_token_prices")
+async def get_token_prices(token_symbols: List[str]) -> Dict[str, Optional[float]]:
+    """
+    Returns the current USD price for given token symbols from the price cache.
+    Symbols with no known price map to None.
+    """
+    prices = await get_price_cache().get(token_symbols)
+    logger.debug(f"Price Service: Prices: {prices}")
     return prices
 
 
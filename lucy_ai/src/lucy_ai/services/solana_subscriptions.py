@@ -0,0 +1,298 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# SPL token account layout: mint (32 bytes) | owner (32 bytes) | ... ; 165 bytes total
+TOKEN_ACCOUNT_SIZE = 165
+TOKEN_ACCOUNT_OWNER_OFFSET = 32
+
+
+class _WatchedWallet:
+    __slots__ = ("address", "subscription_ids", "confirmed_at", "version", "value", "last_used", "subscribe_task")
+
+    def __init__(self, address: str):
+        self.address = address
+        self.subscription_ids: List[int] = []
+        self.confirmed_at: Optional[float] = None # When both subscriptions were acknowledged
+        self.version = 0 # Bumped on every pushed change
+        self.value: Optional[Tuple[Any, float]] = None # (cached result, stored_at)
+        self.last_used = time.monotonic()
+        self.subscribe_task: Optional[asyncio.Task] = None
+
+
+class BalanceSubscriptionCache:
+    """
+    Wallet balance cache invalidated by pushes from the Solana websocket API.
+
+    Every cached wallet holds two subscriptions on one shared connection:
+    `accountSubscribe` on the wallet (SOL lamports) and `programSubscribe` on the
+    Token program filtered by owner (any of its token accounts, including new ones).
+    A notification drops the cached value; the next read refetches over RPC.
+
+    A value is only cached if the wallet's subscriptions were confirmed before
+    its fetch started and no change was pushed meanwhile, so an update can't slip
+    in between fetch and subscribe. Idle wallets are evicted LRU-style and
+    unsubscribed. On disconnect everything is invalidated once and re-subscribed after
+    reconnecting; failed reconnect attempts leave the (already empty) cache alone.
+
+    `on_invalidate` is told about pushed changes, and on disconnect only about wallets
+    whose value this cache held, so a result stored elsewhere isn't dropped on every retry.
+    `connect` defaults to websockets.connect and can be swapped for a local stand-in.
+    """
+    def __init__(
+        self,
+        ws_url: str,
+        token_program_id: str,
+        max_wallets: int = 1000,
+        idle_ttl: float = 600.0,
+        max_age: float = 300.0,
+        commitment: str = "confirmed",
+        on_invalidate: Optional[Callable[[str], None]] = None,
+        connect: Callable[..., Any] = websockets.connect,
+    ):
+        self.ws_url = ws_url
+        self.token_program_id = token_program_id
+        self.max_wallets = max_wallets
+        self.idle_ttl = idle_ttl
+        self.max_age = max_age # Safety net in case a notification is ever lost
+        self.commitment = commitment
+        self.on_invalidate = on_invalidate
+        self._connect = connect
+        self._wallets: "OrderedDict[str, _WatchedWallet]" = OrderedDict()
+        self._wallet_by_subscription: Dict[int, _WatchedWallet] = {}
+        self._pending_requests: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._ws: Any = None
+        self._connected = asyncio.Event()
+        self._connection_task: Optional[asyncio.Task] = None
+        self._sweeper_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # --- Public API ---
+
+    async def start(self) -> None:
+        if self._connection_task is None:
+            self._connection_task = asyncio.create_task(self._run_connection())
+            self._sweeper_task = asyncio.create_task(self._sweep_idle())
+
+    async def aclose(self) -> None:
+        for task in (self._connection_task, self._sweeper_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._connection_task = self._sweeper_task = None
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+
+    def get(self, address: str) -> Optional[Any]:
+        wallet = self._wallets.get(address)
+        if wallet is None or wallet.value is None or wallet.confirmed_at is None:
+            self.misses += 1
+            return None
+        value, stored_at = wallet.value
+        if time.monotonic() - stored_at > self.max_age:
+            wallet.value = None
+            self.misses += 1
+            return None
+        self._touch(wallet)
+        self.hits += 1
+        return value
+
+    def begin_fetch(self, address: str) -> Tuple[int, float]:
+        """Starts watching the wallet (if needed) and returns a ticket for complete_fetch."""
+        wallet = self._wallets.get(address)
+        if wallet is None:
+            wallet = _WatchedWallet(address)
+            self._wallets[address] = wallet
+            self._evict_over_capacity()
+            if self._connected.is_set():
+                wallet.subscribe_task = asyncio.create_task(self._subscribe(wallet))
+        self._touch(wallet)
+        return wallet.version, time.monotonic()
+
+    def complete_fetch(self, address: str, value: Any, ticket: Tuple[int, float]) -> None:
+        """Caches a fetched value if no change could have been missed since the fetch began."""
+        wallet = self._wallets.get(address)
+        if wallet is None:
+            return
+        version, started_at = ticket
+        if wallet.confirmed_at is not None and wallet.confirmed_at <= started_at and wallet.version == version:
+            wallet.value = (value, time.monotonic())
+
+    def invalidate(self, address: str) -> None:
+        wallet = self._wallets.get(address)
+        if wallet is not None:
+            self._invalidate_wallet(wallet)
+
+    @property
+    def watched_wallets(self) -> int:
+        return len(self._wallets)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._wallets), "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+    # --- Bookkeeping ---
+
+    def _touch(self, wallet: _WatchedWallet) -> None:
+        wallet.last_used = time.monotonic()
+        self._wallets.move_to_end(wallet.address)
+
+    def _invalidate_wallet(self, wallet: _WatchedWallet, changed: bool = True) -> None:
+        """`changed`: a change was pushed, rather than the value merely becoming unverifiable."""
+        wallet.version += 1
+        held_value = wallet.value is not None
+        if held_value:
+            wallet.value = None
+            self.invalidations += 1
+        if self.on_invalidate is not None and (changed or held_value):
+            self.on_invalidate(wallet.address)
+
+    def _evict_over_capacity(self) -> None:
+        while len(self._wallets) > self.max_wallets:
+            _, wallet = self._wallets.popitem(last=False)
+            self._forget(wallet)
+
+    def _forget(self, wallet: _WatchedWallet) -> None:
+        logger.debug(f"Balance cache: Evicting {wallet.address}")
+        if wallet.subscribe_task is not None and not wallet.subscribe_task.done():
+            wallet.subscribe_task.cancel()
+        subscription_ids, wallet.subscription_ids = wallet.subscription_ids, []
+        for subscription_id in subscription_ids:
+            self._wallet_by_subscription.pop(subscription_id, None)
+        if subscription_ids and self._connected.is_set():
+            asyncio.create_task(self._unsubscribe(subscription_ids))
+
+    async def _sweep_idle(self) -> None:
+        interval = max(1.0, min(60.0, self.idle_ttl / 4))
+        while True:
+            await asyncio.sleep(interval)
+            cutoff = time.monotonic() - self.idle_ttl
+            # OrderedDict is in LRU order, so idle wallets are at the front
+            while self._wallets:
+                wallet = next(iter(self._wallets.values()))
+                if wallet.last_used > cutoff:
+                    break
+                self._wallets.pop(wallet.address)
+                self._forget(wallet)
+
+    # --- Websocket protocol ---
+
+    async def _request(self, method: str, params: List[Any]) -> Any:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending_requests[request_id] = future
+        try:
+            await self._ws.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+            return await asyncio.wait_for(future, timeout=10.0)
+        finally:
+            self._pending_requests.pop(request_id, None)
+
+    async def _subscribe(self, wallet: _WatchedWallet) -> None:
+        try:
+            account_sub, program_sub = await asyncio.gather(
+                self._request("accountSubscribe", [wallet.address, {"encoding": "base64", "commitment": self.commitment}]),
+                self._request("programSubscribe", [self.token_program_id, {
+                    "encoding": "base64",
+                    "commitment": self.commitment,
+                    "filters": [
+                        {"dataSize": TOKEN_ACCOUNT_SIZE},
+                        {"memcmp": {"offset": TOKEN_ACCOUNT_OWNER_OFFSET, "bytes": wallet.address}},
+                    ],
+                }]),
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Balance cache: Could not subscribe to {wallet.address}: {e}")
+            return
+        if self._wallets.get(wallet.address) is not wallet:
+            # Evicted while subscribing
+            asyncio.create_task(self._unsubscribe([account_sub, program_sub]))
+            return
+        wallet.subscription_ids = [account_sub, program_sub]
+        self._wallet_by_subscription[account_sub] = wallet
+        self._wallet_by_subscription[program_sub] = wallet
+        wallet.confirmed_at = time.monotonic()
+        logger.debug(f"Balance cache: Watching {wallet.address} (subscriptions {account_sub}, {program_sub})")
+
+    async def _unsubscribe(self, subscription_ids: List[int]) -> None:
+        # Order matches _subscribe: [account, program]
+        methods = ["accountUnsubscribe", "programUnsubscribe"]
+        for method, subscription_id in zip(methods, subscription_ids):
+            try:
+                await self._request(method, [subscription_id])
+            except Exception as e:
+                logger.debug(f"Balance cache: {method}({subscription_id}) failed: {e}")
+
+    def _handle_message(self, raw: Any) -> None:
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning(f"Balance cache: Ignoring non-JSON websocket message: {raw!r}")
+            return
+        if "id" in message:
+            future = self._pending_requests.get(message["id"])
+            if future is not None and not future.done():
+                if message.get("error") is not None:
+                    future.set_exception(RuntimeError(str(message["error"])))
+                else:
+                    future.set_result(message.get("result"))
+            return
+        if message.get("method") in ("accountNotification", "programNotification"):
+            subscription_id = (message.get("params") or {}).get("subscription")
+            wallet = self._wallet_by_subscription.get(subscription_id)
+            if wallet is not None:
+                logger.debug(f"Balance cache: Change pushed for {wallet.address} ({message['method']})")
+                self._invalidate_wallet(wallet)
+
+    def _reset_after_disconnect(self) -> None:
+        was_connected = self._connected.is_set()
+        self._connected.clear()
+        self._ws = None
+        self._wallet_by_subscription.clear()
+        for future in self._pending_requests.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Websocket disconnected"))
+        if not was_connected:
+            return # A failed reconnect attempt: nothing was subscribed or cached since the last reset
+        for wallet in self._wallets.values():
+            wallet.subscription_ids = []
+            wallet.confirmed_at = None
+            self._invalidate_wallet(wallet, changed=False)
+
+    async def _run_connection(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                async with self._connect(self.ws_url, ping_interval=20) as ws:
+                    self._ws = ws
+                    self._connected.set()
+                    backoff = 1.0
+                    logger.info(f"Balance cache: Connected to {self.ws_url}")
+                    for wallet in list(self._wallets.values()):
+                        wallet.subscribe_task = asyncio.create_task(self._subscribe(wallet))
+                    async for raw in ws:
+                        self._handle_message(raw)
+                logger.warning("Balance cache: Websocket closed by server.")
+            except asyncio.CancelledError:
+                self._reset_after_disconnect()
+                raise
+            except Exception as e:
+                logger.warning(f"Balance cache: Websocket error ({self.ws_url}): {e}")
+            self._reset_after_disconnect()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, disable_created_metrics, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.gc_collector import GCCollector
+from prometheus_client.platform_collector import PlatformCollector
+from prometheus_client.process_collector import ProcessCollector
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Skip the *_created series: they double the series count and nothing here queries them
+disable_created_metrics()
+
+# A registry of our own (rather than prometheus_client's global one), so importing the app
+# twice - e.g. under two package paths in tests - can't fail on duplicate registration
+REGISTRY = CollectorRegistry()
+ProcessCollector(registry=REGISTRY)
+PlatformCollector(registry=REGISTRY)
+GCCollector(registry=REGISTRY)
+
+# From a warm cache hit (ms) up to a slow LLM reply (tens of seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HTTP_REQUESTS = Counter(
+    "lucy_http_requests_total", "HTTP requests by route template and status code",
+    ["method", "route", "status"], registry=REGISTRY,
+)
+HTTP_LATENCY = Histogram(
+    "lucy_http_request_duration_seconds", "HTTP request latency (to the end of the response body) by route template",
+    ["method", "route"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+HTTP_IN_FLIGHT = Gauge("lucy_http_requests_in_flight", "HTTP requests currently being served", registry=REGISTRY)
+
+STAGE_LATENCY = Histogram(
+    "lucy_stage_duration_seconds", "Latency of internal stages (upstream fetches, engine) as seen by their callers",
+    ["stage", "outcome"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+STAGE_IN_FLIGHT = Gauge("lucy_stage_in_flight", "Stage calls currently running", ["stage"], registry=REGISTRY)
+
+RPC_LATENCY = Histogram(
+    "lucy_solana_rpc_call_duration_seconds", "Solana JSON-RPC call latency by method (including batching wait)",
+    ["method", "outcome"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+
+LLM_LATENCY = Histogram(
+    "lucy_llm_call_duration_seconds", "LLM chain call latency, from scheduler admission to the last token",
+    ["provider", "chain", "outcome"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+LLM_IN_FLIGHT = Gauge("lucy_llm_calls_in_flight", "LLM chain calls currently running", ["provider"], registry=REGISTRY)
+LLM_TOKENS = Counter(
+    "lucy_llm_tokens_total", "LLM tokens reported by the provider",
+    ["provider", "chain", "kind"], registry=REGISTRY,
+)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Times a block into lucy_stage_duration_seconds{stage, outcome} and counts it as in flight."""
+    in_flight = STAGE_IN_FLIGHT.labels(stage)
+    in_flight.inc()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        in_flight.dec()
+        STAGE_LATENCY.labels(stage, outcome).observe(time.perf_counter() - started)
+
+
+def instrument_stage(stage: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Decorator form of track_stage for coroutine functions."""
+    def decorator(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with track_stage(stage):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def track_rpc_call(method: str) -> Iterator[None]:
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled" # E.g. the losing half of a hedged call
+        raise
+    finally:
+        RPC_LATENCY.labels(method, outcome).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def track_llm_call(provider: str, chain: str) -> Iterator[None]:
+    in_flight = LLM_IN_FLIGHT.labels(provider)
+    in_flight.inc()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        in_flight.dec()
+        LLM_LATENCY.labels(provider, chain, outcome).observe(time.perf_counter() - started)
+
+
+def record_llm_usage(provider: str, chain: str, message: Any) -> None:
+    """Counts the tokens of an AIMessage(Chunk) that carries LangChain `usage_metadata`."""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    LLM_TOKENS.labels(provider, chain, "input").inc(usage.get("input_tokens", 0))
+    LLM_TOKENS.labels(provider, chain, "output").inc(usage.get("output_tokens", 0))
+
+
+# --- Scrape-time stats ---
+# Caches and schedulers already count their own hits/misses; rather than adding work to their
+# hot paths, their stats() are read only when Prometheus scrapes.
+
+StatsSource = Callable[[], Optional[Dict[str, float]]]
+
+_cache_sources: List[Tuple[str, StatsSource]] = []
+_stats_sources: List[Tuple[str, str, StatsSource]] = [] # (metric prefix, label value, source)
+
+
+def register_cache(name: str, stats: StatsSource) -> None:
+    """
+    Exposes a cache's stats() as lucy_cache_* metrics. `stats` returns a dict with `hits` and
+    `misses` (and optionally `entries`), or None while the cache doesn't exist.
+    """
+    _cache_sources.append((name, stats))
+
+
+def register_stats(prefix: str, name: str, stats: StatsSource) -> None:
+    """
+    Exposes every numeric field of stats() as a gauge lucy_<prefix>_<field>{name=...}, e.g. the
+    LLM scheduler's running/queued counts as lucy_llm_scheduler_running{name="openai"}.
+    """
+    _stats_sources.append((prefix, name, stats))
+
+
+def _read(name: str, stats: StatsSource) -> Optional[Dict[str, float]]:
+    try:
+        return stats()
+    except Exception as e: # A broken source must not break the whole scrape
+        logger.warning(f"Metrics: Reading stats of {name} failed: {e}")
+        return None
+
+
+class _StatsCollector:
+    def collect(self) -> Iterator[Any]:
+        hits = CounterMetricFamily("lucy_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("lucy_cache_misses", "Cache misses", labels=["cache"])
+        ratio = GaugeMetricFamily("lucy_cache_hit_ratio", "Cache hits / lookups since start", labels=["cache"])
+        entries = GaugeMetricFamily("lucy_cache_entries", "Entries currently cached", labels=["cache"])
+        for name, source in _cache_sources:
+            stats = _read(name, source)
+            if not stats:
+                continue
+            lookups = stats["hits"] + stats["misses"]
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            ratio.add_metric([name], stats["hits"] / lookups if lookups else 0.0)
+            if "entries" in stats:
+                entries.add_metric([name], stats["entries"])
+        yield from (hits, misses, ratio, entries)
+
+        families: Dict[str, GaugeMetricFamily] = {}
+        for prefix, name, source in _stats_sources:
+            for field, value in (_read(name, source) or {}).items():
+                if not isinstance(value, (int, float)):
+                    continue
+                metric_name = f"lucy_{prefix}_{field}"
+                family = families.get(metric_name)
+                if family is None:
+                    family = families[metric_name] = GaugeMetricFamily(metric_name, f"{prefix} {field}", labels=["name"])
+                family.add_metric([name], value)
+        yield from families.values()
+
+
+REGISTRY.register(_StatsCollector())
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """The current metrics in Prometheus text format, with their content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def _route_label(scope: Dict[str, Any]) -> str:
+    route = scope.get("route") # Set by the router once matched
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    # Some FastAPI versions keep an included router's routes without the router prefix
+    # (/chat/{user_id} rather than /api/v1/chat/{user_id}); take the prefix from the request path
+    extra_segments = scope["path"].count("/") - template.count("/")
+    if extra_segments > 0:
+        template = "/".join(scope["path"].split("/")[:extra_segments + 1]) + template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no per-request task or body buffering, unlike BaseHTTPMiddleware)
+    recording per-route request counts and latency. Routes are labelled by their template,
+    e.g. /chat/{user_id}, so user ids never become label values.
+    """
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route_label = _route_label(scope)
+            method = scope["method"]
+            HTTP_LATENCY.labels(method, route_label).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route_label, str(status_code)).inc()
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, Set, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# A batch handler returns one result per item, in order; an Exception in the list fails only that item
+BatchHandler = Callable[[List[T]], Awaitable[List[Union[R, Exception]]]]
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects items submitted within `window` seconds of the first one and hands
+    them to `handler` as one batch, then fans the results back out to the
+    callers. A batch is sent early once it reaches `max_batch_size`, so the
+    extra latency per item is bounded by the window. If the handler itself
+    raises, every item of that batch fails with the same exception.
+    """
+    def __init__(self, name: str, handler: BatchHandler, window: float = 0.02, max_batch_size: int = 8):
+        self.name = name
+        self.handler = handler
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    async def submit(self, item: T) -> R:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        # Shield so one caller going away doesn't cancel the batch for everyone else
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._send_batch(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send_batch(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        logger.debug(f"MicroBatcher[{self.name}]: Sending batch of {len(batch)}")
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch handler returned {len(results)} result(s) for {len(batch)} item(s)")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except BaseException:
+            for _, future in batch:
+                future.cancel()
+            raise
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        return {"batches": self.batches, "items": self.items, "average_batch_size": self.average_batch_size}
+
+    async def aclose(self) -> None:
+        """Sends whatever is still pending and waits for in-flight batches."""
+        self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
@@ -0,0 +1,396 @@
+import abc
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Literal, NamedTuple, Optional, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CacheBackendKind = Literal["memory", "sqlite"]
+
+
+class CacheBusy(Exception):
+    """A shared backend was locked by another worker for longer than its busy timeout."""
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    stored_at: float # Wall clock (time.time()), comparable across processes
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+
+class CacheBackend(abc.ABC):
+    """
+    Key/value store with per-key expiry and refresh leases. `shared` backends are visible to
+    every worker on the host, so their values must be JSON-serialisable; in-process ones store
+    objects as they are.
+    """
+    shared = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Stores `value`, dropped after `ttl` seconds."""
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def acquire_lease(self, key: str, owner: str, duration: float) -> bool:
+        """Takes the refresh lease for `key` unless another owner holds an unexpired one."""
+
+    @abc.abstractmethod
+    def release_lease(self, key: str, owner: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def entry_count(self) -> int:
+        ...
+
+    def open(self) -> None:
+        """Connects eagerly, so configuration errors surface at startup rather than on first use."""
+        pass
+
+    def purge(self) -> None:
+        """Drops expired entries and leases. Backends that evict as they go need not override it."""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU; every worker has its own. Leases only coordinate tasks within the process."""
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float, float]]" = OrderedDict() # key -> (value, stored_at, expires_at)
+        self._leases: Dict[str, Tuple[str, float]] = {} # key -> (owner, expires_at)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        if item[2] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return CacheEntry(item[0], item[1])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        self._entries[key] = (value, now, now + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def acquire_lease(self, key: str, owner: str, duration: float) -> bool:
+        now = time.time()
+        holder = self._leases.get(key)
+        if holder is not None and holder[0] != owner and holder[1] > now:
+            return False
+        self._leases[key] = (owner, now + duration)
+        return True
+
+    def release_lease(self, key: str, owner: str) -> None:
+        holder = self._leases.get(key)
+        if holder is not None and holder[0] == owner:
+            del self._leases[key]
+
+    def entry_count(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    One SQLite file in WAL mode shared by every worker on the host: readers never block the
+    writer, and writes are small single-statement transactions. Values are stored as JSON.
+
+    Calls run on the caller's thread (the event loop), so a write waits at most `busy_timeout`
+    for another worker's lock and then raises CacheBusy, which SharedCache treats as a miss.
+    Expired rows, and the oldest beyond `max_entries`, are deleted by `purge`, which is meant
+    for a worker thread (see solana_rpc.init_cache_backend) and uses a connection of its own.
+    """
+    shared = True
+
+    def __init__(self, path: str, max_entries: int = 100_000, busy_timeout: float = 0.005, purge_batch: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.busy_timeout = busy_timeout
+        self.purge_batch = purge_batch
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._purge_conn: Optional[sqlite3.Connection] = None
+        self._purge_pid: Optional[int] = None
+        self._purge_lock = threading.Lock() # Keeps close() from closing the purge connection mid-purge
+
+    def _connect(self, busy_timeout: float) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Setup may wait for workers starting at the same time; afterwards calls wait at most busy_timeout
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # A cache can lose its last writes on power loss
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+        conn.execute(f"PRAGMA busy_timeout = {max(0, int(busy_timeout * 1000))}")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not cross a fork; uvicorn/gunicorn workers each open their own
+        if self._conn is None or self._pid != os.getpid():
+            self._conn, self._pid = self._connect(self.busy_timeout), os.getpid()
+            logger.info(f"Shared cache: Using SQLite cache at {self.path}")
+        return self._conn
+
+    def _execute(self, sql: str, params: Tuple[Any, ...] = ()) -> sqlite3.Cursor:
+        try:
+            return self._connection().execute(sql, params)
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e) or "busy" in str(e):
+                raise CacheBusy(str(e)) from e
+            raise
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        row = self._execute(
+            "SELECT value, stored_at FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return CacheEntry(json.loads(row[0]), row[1]) if row is not None else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        self._execute(
+            "INSERT INTO entries (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, stored_at = excluded.stored_at, expires_at = excluded.expires_at",
+            (key, json.dumps(value, separators=(",", ":")), now, now + ttl),
+        )
+
+    def delete(self, key: str) -> None:
+        self._execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def acquire_lease(self, key: str, owner: str, duration: float) -> bool:
+        now = time.time()
+        # The upsert only overwrites an expired lease or our own, so exactly one worker gets it
+        cursor = self._execute(
+            "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at <= ? OR leases.owner = excluded.owner",
+            (key, owner, now + duration, now),
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, key: str, owner: str) -> None:
+        self._execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def entry_count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def open(self) -> None:
+        self._connection()
+
+    def purge(self) -> None:
+        """
+        Blocking: run it in a worker thread. Deletes in batches of `purge_batch` rows, one transaction
+        each, so other workers' writes are never locked out for long; it waits for their locks in turn.
+        """
+        with self._purge_lock:
+            if self._purge_conn is None or self._purge_pid != os.getpid():
+                self._purge_conn, self._purge_pid = self._connect(busy_timeout=5.0), os.getpid()
+            conn = self._purge_conn
+            now = time.time()
+            batch = self.purge_batch
+            statements = [
+                ("DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries WHERE expires_at <= ? LIMIT ?)", (now, batch)),
+                ("DELETE FROM leases WHERE rowid IN (SELECT rowid FROM leases WHERE expires_at <= ? LIMIT ?)", (now, batch)),
+                # Newest max_entries rows stay
+                ("DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY stored_at DESC LIMIT ? OFFSET ?)", (batch, self.max_entries)),
+            ]
+            deleted = 0
+            for sql, params in statements:
+                while True:
+                    rowcount = conn.execute(sql, params).rowcount
+                    deleted += rowcount
+                    if rowcount < batch:
+                        break
+            if deleted:
+                logger.debug(f"Shared cache: Purged {deleted} row(s) from {self.path}")
+
+    def close(self) -> None:
+        with self._purge_lock:
+            for conn, pid in ((self._conn, self._pid), (self._purge_conn, self._purge_pid)):
+                if conn is not None and pid == os.getpid():
+                    conn.close()
+            self._conn = self._purge_conn = None
+
+
+def create_cache_backend(kind: CacheBackendKind, path: str, max_entries: int, busy_timeout: float = 0.005) -> CacheBackend:
+    if kind == "sqlite":
+        return SQLiteCacheBackend(path, max_entries=max_entries, busy_timeout=busy_timeout)
+    return MemoryCacheBackend(max_entries=max_entries)
+
+
+# Lease owners are host:pid plus a per-lease counter, so tasks within one worker exclude each other too.
+# The pid is read per lease: workers forked after import share this module's state.
+_HOSTNAME = socket.gethostname()
+_owner_ids = itertools.count(1)
+
+
+class SharedCache:
+    """
+    A namespaced view of a CacheBackend with single-writer refresh: on a miss only the caller
+    holding the key's lease runs the fetch (one worker per key on a shared backend), and the
+    others wait up to `lease_duration` for its result before fetching themselves.
+    `encode`/`decode` convert values to and from JSON data for shared backends. `backend` may
+    be a function returning it, so the backend can be created later (e.g. in the app lifespan).
+    A busy shared backend reads as a miss, and grants the lease so the caller fetches itself.
+    """
+    def __init__(
+        self,
+        backend: Union[CacheBackend, Callable[[], CacheBackend]],
+        namespace: str,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda data: data,
+        lease_duration: float = 10.0,
+        poll_interval: float = 0.02,
+    ):
+        self._backend = (lambda: backend) if isinstance(backend, CacheBackend) else backend
+        self.namespace = namespace
+        self.encode = encode
+        self.decode = decode
+        self.lease_duration = lease_duration
+        self.poll_interval = poll_interval
+        self.hits = 0 # Served from the backend, including values another worker fetched while we waited
+        self.misses = 0 # Fetched by this worker
+        self.waits = 0 # Waited on another worker's lease
+        self.busy = 0 # Calls that gave up on another worker's lock (handled like a miss)
+        self.errors = 0 # Backend failures (the caller falls back to fetching)
+
+    @property
+    def backend(self) -> CacheBackend:
+        return self._backend()
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _failed(self, action: str, key: str, error: Exception) -> None:
+        if isinstance(error, CacheBusy):
+            self.busy += 1
+            logger.debug(f"Shared cache[{self.namespace}]: {action} of {key!r} skipped, backend busy")
+        else:
+            self.errors += 1
+            logger.warning(f"Shared cache[{self.namespace}]: {action} of {key!r} failed: {error}")
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[CacheEntry]:
+        """The cached entry, if any (and no older than `max_age`). Backend failures read as a miss."""
+        try:
+            entry = self.backend.get(self._key(key))
+        except Exception as e:
+            self._failed("Read", key, e)
+            return None
+        if entry is None or (max_age is not None and entry.age > max_age):
+            return None
+        if self.backend.shared:
+            return CacheEntry(self.decode(entry.value), entry.stored_at)
+        return entry
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            self.backend.set(self._key(key), self.encode(value) if self.backend.shared else value, ttl)
+        except Exception as e:
+            self._failed("Write", key, e)
+
+    def delete(self, key: str) -> None:
+        try:
+            self.backend.delete(self._key(key))
+        except Exception as e:
+            self._failed("Delete", key, e)
+
+    def acquire_lease(self, key: str) -> Optional[str]:
+        """
+        Takes the refresh lease for `key`, returning the owner token to release it with, or None
+        while someone else holds it. A failing backend grants it, so refreshes never stall.
+        """
+        owner = f"{_HOSTNAME}:{os.getpid()}:{next(_owner_ids)}"
+        try:
+            return owner if self.backend.acquire_lease(self._key(key), owner, self.lease_duration) else None
+        except Exception as e:
+            self._failed("Lease", key, e)
+            return owner
+
+    def release_lease(self, key: str, owner: str) -> None:
+        try:
+            self.backend.release_lease(self._key(key), owner)
+        except Exception as e:
+            self._failed("Lease release", key, e)
+
+    async def wait_for(self, key: str, max_age: Optional[float] = None) -> Optional[CacheEntry]:
+        """
+        Polls for the value another lease holder is fetching. None if the holder gives up
+        (e.g. its fetch failed) or its lease runs out first.
+        """
+        self.waits += 1
+        deadline = time.monotonic() + self.lease_duration
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            entry = self.get(key, max_age)
+            if entry is not None:
+                return entry
+            owner = self.acquire_lease(key)
+            if owner is not None: # Lease released; the holder may have stored the value just before
+                self.release_lease(key, owner)
+                return self.get(key, max_age)
+        return None
+
+    async def load(self, key: str, fetch: Callable[[], Awaitable[T]], ttl: float, max_age: Optional[float] = None) -> T:
+        """
+        The cached value if it is no older than `max_age` (default `ttl`), else the result of
+        `fetch`, stored for `ttl` seconds. Concurrent misses across workers run `fetch` once.
+        Exceptions from `fetch` propagate and are not cached; None results are not cached.
+        """
+        max_age = ttl if max_age is None else max_age
+        entry = self.get(key, max_age)
+        if entry is not None:
+            self.hits += 1
+            return entry.value
+
+        owner = self.acquire_lease(key)
+        if owner is None:
+            entry = await self.wait_for(key, max_age)
+            if entry is not None:
+                self.hits += 1
+                return entry.value
+            logger.warning(f"Shared cache[{self.namespace}]: Lease holder for {key!r} didn't deliver; fetching")
+            owner = self.acquire_lease(key)
+        try:
+            self.misses += 1
+            value = await fetch()
+            if value is not None:
+                self.set(key, value, ttl)
+            return value
+        finally:
+            if owner is not None:
+                self.release_lease(key, owner)
+
+    def stats(self) -> Dict[str, int]:
+        """This worker's view; `entries` is left out because the backend is shared between namespaces."""
+        return {"hits": self.hits, "misses": self.misses, "waits": self.waits, "busy": self.busy, "errors": self.errors}
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Request coalescing: concurrent callers asking for the same key share one
+    in-flight upstream call. Successful results are kept for `result_ttl`
+    seconds to absorb bursts; exceptions are never cached and are re-raised
+    unchanged to every waiter.
+    """
+    def __init__(self, name: str, result_ttl: float = 0.0, max_entries: int = 10_000):
+        self.name = name
+        self.result_ttl = result_ttl
+        self.max_entries = max_entries
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._results: Dict[Hashable, Tuple[Any, float]] = {} # key -> (value, expires_at)
+        self.hits = 0 # Served from the result cache
+        self.shared = 0 # Joined an in-flight call
+        self.misses = 0 # Started an upstream call
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[1] > time.monotonic():
+                self.hits += 1
+                return cached[0]
+            del self._results[key]
+
+        future = self._in_flight.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(self._run(key, fn))
+            self._in_flight[key] = future
+        else:
+            self.shared += 1
+            logger.debug(f"SingleFlight[{self.name}]: Joining in-flight call for {key!r}")
+        # Shield so one caller going away doesn't cancel the call for everyone else
+        return await asyncio.shield(future)
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        try:
+            value = await fn()
+            if self.result_ttl > 0:
+                self._store(key, value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        if len(self._results) >= self.max_entries:
+            self._results = {k: v for k, v in self._results.items() if v[1] > now}
+            if len(self._results) >= self.max_entries:
+                self._results.pop(next(iter(self._results)))
+        self._results[key] = (value, now + self.result_ttl)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._results.pop(key, None)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """`hits` counts both result-cache hits and callers that joined an in-flight call."""
+        return {"hits": self.hits + self.shared, "shared": self.shared, "misses": self.misses, "entries": len(self._results)}
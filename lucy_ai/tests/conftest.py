@@ -0,0 +1,12 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Tests import the app as `src.lucy_ai...` and the fakes as `benchmarks...`, like the benchmarks do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+from jose import jwt
+
+from src.lucy_ai.api import endpoints
+from src.lucy_ai.api.schemas import BatchWalletBalanceResponse
+from src.lucy_ai.main import app
+
+pytestmark = pytest.mark.anyio
+
+WALLETS = ["9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin", "4Nd1mBQtrMJVYVfKf2PJy9NZUZdTAsp7D4xWLs4gDB4T"]
+
+
+def _auth(claims: Dict[str, Any]) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {jwt.encode(claims, endpoints.SECRET_KEY, algorithm=endpoints.ALGORITHM)}"}
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    requested: List[List[str]] = []
+
+    async def fake_batch(wallet_addresses: List[str]) -> BatchWalletBalanceResponse:
+        requested.append(wallet_addresses)
+        return BatchWalletBalanceResponse(results=[], errors=[])
+
+    monkeypatch.setattr(endpoints, "get_wallet_balances_batch", fake_batch)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lucy") as http:
+        yield http, requested
+
+
+async def test_user_token_is_rejected(client):
+    http, requested = client
+    response = await http.post("/api/v1/balances/batch", json={"wallet_addresses": WALLETS},
+                               headers=_auth({"userId": "alice", "solanaPubkey": WALLETS[0]}))
+    assert response.status_code == 403
+    assert requested == []
+
+
+async def test_service_token_is_accepted(client):
+    http, requested = client
+    response = await http.post("/api/v1/balances/batch", json={"wallet_addresses": WALLETS}, headers=_auth({"role": "service"}))
+    assert response.status_code == 200
+    assert requested == [WALLETS]
+
+
+async def test_missing_token_is_unauthorized(client):
+    http, _ = client
+    response = await http.post("/api/v1/balances/batch", json={"wallet_addresses": WALLETS})
+    assert response.status_code == 401
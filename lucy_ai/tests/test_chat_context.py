@@ -0,0 +1,117 @@
+from typing import List
+
+import pytest
+
+from src.lucy_ai.api import chat_context
+from src.lucy_ai.api.chat_context import count_tokens, render_balances, render_vaults
+from src.lucy_ai.api.endpoints import _balances_section, _vaults_section, _with_usd_values, settings
+from src.lucy_ai.api.schemas import TokenBalance, WalletBalanceResponse
+from src.lucy_ai.services.senti_backend import UserVaultData
+
+WALLET = "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"
+
+
+def test_compact_balances_rank_and_total_by_usd_price():
+    fetched = WalletBalanceResponse(wallet_address=WALLET, balances=[
+        TokenBalance(token_symbol="BONK", amount_ui=5_000_000.0),
+        TokenBalance(token_symbol="SOL", amount_ui=10.0),
+        TokenBalance(token_symbol="USDC", amount_ui=200.0),
+    ])
+    priced = _with_usd_values(fetched, {"SOL": 150.0, "USDC": 1.0, "BONK": None})
+
+    assert [bal.value_usd for bal in fetched.balances] == [None, None, None] # Shared with the caches: untouched
+    assert [bal.value_usd for bal in priced.balances] == [None, 1500.0, 200.0]
+
+    text = render_balances(priced, mode="compact", top_n=2)
+    assert text.splitlines()[1:3] == ["- Wallet: 10.0000 SOL", "- Wallet: 200.0000 USDC"]
+    assert "Total value of priced tokens: $1,700.00" in text
+
+
+def test_without_prices_balances_pass_through():
+    fetched = WalletBalanceResponse(wallet_address=WALLET, balances=[TokenBalance(token_symbol="SOL", amount_ui=1.0)])
+    error = RuntimeError("price source down")
+    assert _with_usd_values(fetched, error) is fetched
+    assert _with_usd_values(error, {"SOL": 150.0}) is error
+
+
+class CharEncoding:
+    """Stand-in tokenizer: one token per character, so CJK and emoji cost far more than chars/4."""
+    def encode(self, text: str, disallowed_special=()) -> List[int]:
+        return [ord(c) for c in text]
+
+
+def _cjk_vaults(count: int) -> List[UserVaultData]:
+    return [
+        UserVaultData(id=f"v{i}", name=f"稳定收益金库 🚀🌕 第{i}号", token=("USDC", "SOL")[i % 2],
+                      totalDeposits=1234567.89 + i, yieldRate=0.0512, locked=i % 3 == 0, lockPeriodDays=30 if i % 3 == 0 else None)
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(params=["chars", "tiktoken"])
+def tokenizer(request, monkeypatch):
+    if request.param == "chars":
+        monkeypatch.setattr(chat_context, "_encoding", CharEncoding())
+        monkeypatch.setattr(chat_context, "_encoding_loaded", True)
+    else:
+        chat_context.load_tokenizer()
+        # Offline the encoding can't be downloaded, and counts fall back to UTF-8 bytes
+    return request.param
+
+
+@pytest.mark.parametrize("mode", ["full", "compact", "auto"])
+@pytest.mark.parametrize("count", [1, 40, 400])
+def test_non_latin_context_stays_under_the_token_cap(tokenizer, mode, count):
+    for max_tokens in (40, 200, 600):
+        text = render_vaults(_cjk_vaults(count), mode=mode, top_n=10, max_tokens=max_tokens)
+        assert count_tokens(text) <= max_tokens, (max_tokens, text)
+        assert text.startswith("User's Vaults")
+
+
+def test_whole_context_stays_under_the_configured_cap(tokenizer):
+    balances = WalletBalanceResponse(wallet_address=WALLET, balances=[
+        TokenBalance(token_symbol=f"ミーム{i}🐸", amount_ui=123456789.0 + i) for i in range(200)
+    ])
+    text = "\n".join(render() for _, render in [_vaults_section(_cjk_vaults(500)), _balances_section(balances)])
+    assert count_tokens(text) <= settings.CHAT_CONTEXT_MAX_TOKENS
+
+
+def test_fit_drops_whole_lines_and_marks_the_cut(monkeypatch):
+    monkeypatch.setattr(chat_context, "_encoding", CharEncoding())
+    monkeypatch.setattr(chat_context, "_encoding_loaded", True)
+    assert chat_context._fit(["aaaa", "bbbb"], 9) == "aaaa\nbbbb"
+    assert chat_context._fit(["aaaa", "bbbb", "cccc"], 9) == "aaaa\n…"
+    assert chat_context._fit(["a" * 50], 10) == "a" * 8 + "\n…"
+
+
+def test_compact_vaults_rank_and_weight_by_usd_value():
+    vaults = [
+        UserVaultData(id="u", name="Stable", token="USDC", totalDeposits=1000.0, yieldRate=0.05, locked=False),
+        UserVaultData(id="s", name="Staked", token="SOL", totalDeposits=10.0, yieldRate=0.10, locked=False),
+        UserVaultData(id="b", name="Meme", token="BONK", totalDeposits=5_000_000.0, yieldRate=0.50, locked=False),
+    ]
+    text = render_vaults(vaults, mode="compact", top_n=2, prices={"USDC": 1.0, "SOL": 150.0})
+    lines = text.splitlines()
+    # 10 SOL ($1,500) outranks 1,000 USDC ($1,000); unpriced BONK goes last despite the larger raw amount
+    assert [line.split(":")[0] for line in lines[1:4]] == ["- SOL Unlocked", "- USDC Unlocked", "- BONK Unlocked"]
+    assert "10.00 SOL ($1,500.00) total" in lines[1]
+    # (1500 * 10% + 1000 * 5%) / 2500, not skewed by the BONK amount
+    assert "Total value of priced vaults: $2,500.00, value-weighted avg APY: 8.00%" in text
+    largest = lines.index("Largest 2 vault(s):")
+    assert lines[largest + 1:largest + 3] == [
+        "- Vault 'Staked': 10.00 SOL, APY: 10.00%, Status: Unlocked",
+        "- Vault 'Stable': 1000.00 USDC, APY: 5.00%, Status: Unlocked",
+    ]
+
+    # Without prices, amounts are all there is to rank by
+    unpriced = render_vaults(vaults, mode="compact", top_n=2).splitlines()
+    assert unpriced[1].startswith("- BONK Unlocked")
+    assert "Total value" not in "\n".join(unpriced)
+
+
+def test_vault_section_rerenders_when_prices_change():
+    vaults = [UserVaultData(id="s", token="SOL", totalDeposits=10.0, yieldRate=0.10, locked=False)]
+    before, _ = _vaults_section(vaults, {"SOL": 150.0, "USDC": 1.0})
+    same, _ = _vaults_section(vaults, {"SOL": 150.0, "USDC": 1.01}) # Price of a token the user doesn't hold
+    after, _ = _vaults_section(vaults, {"SOL": 160.0, "USDC": 1.0})
+    assert before == same != after
@@ -0,0 +1,65 @@
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+from jose import jwt
+
+from benchmarks.fake_llm import FakeChatModel
+from src.lucy_ai.api import endpoints
+from src.lucy_ai.api.schemas import WalletBalanceResponse
+from src.lucy_ai.core import personality
+from src.lucy_ai.main import app
+
+pytestmark = pytest.mark.anyio
+
+ALICE = {"userId": "alice", "solanaPubkey": "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"}
+MALLORY = {"userId": "mallory", "solanaPubkey": "4Nd1mBQtrMJVYVfKf2PJy9NZUZdTAsp7D4xWLs4gDB4T"}
+
+
+def _auth(claims: Dict[str, Any]) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {jwt.encode(claims, endpoints.SECRET_KEY, algorithm=endpoints.ALGORITHM)}"}
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    personality.install_llm(FakeChatModel(latency_ms=0, jitter_ms=0), provider_key="fake")
+    personality.conversation_store.clear()
+
+    async def no_vaults(user_id: str, auth_token: str) -> List[Any]:
+        return []
+
+    async def no_balances(wallet_address: str) -> WalletBalanceResponse:
+        return WalletBalanceResponse(wallet_address=wallet_address, balances=[])
+
+    async def no_prices(token_symbols: List[str]) -> Dict[str, Any]:
+        return {}
+
+    monkeypatch.setattr(endpoints, "get_user_vaults", no_vaults)
+    monkeypatch.setattr(endpoints, "get_wallet_balances", no_balances)
+    monkeypatch.setattr(endpoints, "get_token_prices", no_prices)
+    prompts: List[Dict[str, Any]] = []
+    chat_inputs = personality._chat_inputs
+    monkeypatch.setattr(personality, "_chat_inputs", lambda *args: prompts.append(chat_inputs(*args)) or prompts[-1])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lucy") as http:
+        yield http, prompts
+
+
+async def test_callers_cannot_read_each_others_history(client):
+    http, prompts = client
+    secret = "my seed phrase hint is orange-falcon"
+    response = await http.post("/api/v1/chat/alice", json={"message": secret}, headers=_auth(ALICE))
+    assert response.status_code == 200
+
+    # Mallory addresses Alice's conversation with her own valid token
+    for path in ("/api/v1/chat/alice", "/api/v1/chat/alice/stream"):
+        response = await http.post(path, json={"message": "What did I tell you earlier?"}, headers=_auth(MALLORY))
+        assert response.status_code == 200
+        assert secret not in str(prompts[-1]["history"]) + prompts[-1]["conversation_summary"]
+        assert "orange-falcon" not in response.text
+
+    # Alice still sees her own turn, and nothing of Mallory's
+    response = await http.post("/api/v1/chat/alice", json={"message": "And now?"}, headers=_auth(ALICE))
+    assert response.status_code == 200
+    alice_history = str(prompts[-1]["history"])
+    assert secret in alice_history
+    assert "What did I tell you earlier?" not in alice_history
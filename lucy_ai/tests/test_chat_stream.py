@@ -0,0 +1,122 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Tuple
+
+import httpx
+import pytest
+from jose import jwt
+
+from benchmarks.fake_llm import FakeChatModel
+from src.lucy_ai.api import endpoints
+from src.lucy_ai.api.schemas import WalletBalanceResponse
+from src.lucy_ai.core import personality
+from src.lucy_ai.main import app
+
+pytestmark = pytest.mark.anyio
+
+ALICE = {"userId": "alice", "solanaPubkey": "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"}
+STREAM_PATH = "/api/v1/chat/alice/stream"
+
+
+def _auth(claims: Dict[str, Any]) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {jwt.encode(claims, endpoints.SECRET_KEY, algorithm=endpoints.ALGORITHM)}"}
+
+
+def _parse_sse(body: str) -> List[Tuple[str, Any]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture(autouse=True)
+def no_upstreams(monkeypatch):
+    personality.conversation_store.clear()
+
+    async def no_vaults(user_id: str, auth_token: str) -> List[Any]:
+        return []
+
+    async def no_balances(wallet_address: str) -> WalletBalanceResponse:
+        return WalletBalanceResponse(wallet_address=wallet_address, balances=[])
+
+    async def no_prices(token_symbols: List[str]) -> Dict[str, Any]:
+        return {}
+
+    monkeypatch.setattr(endpoints, "get_user_vaults", no_vaults)
+    monkeypatch.setattr(endpoints, "get_wallet_balances", no_balances)
+    monkeypatch.setattr(endpoints, "get_token_prices", no_prices)
+
+
+def _install(**kwargs: Any) -> FakeChatModel:
+    model = FakeChatModel(**{"latency_ms": 0, "jitter_ms": 0, "first_token_ms": 0, **kwargs})
+    personality.install_llm(model, provider_key="fake")
+    return model
+
+
+async def _stream(message: str) -> Tuple[httpx.Response, List[Tuple[str, Any]]]:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lucy") as http:
+        response = await http.post(STREAM_PATH, json={"message": message}, headers=_auth(ALICE))
+    return response, _parse_sse(response.text)
+
+
+async def test_deltas_then_one_final():
+    _install(stream_chunks=4)
+    response, events = await _stream("deposit 25 USDC please")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    names = [name for name, _ in events]
+    assert names[-1] == "final" and names.count("final") == 1
+    assert set(names[:-1]) == {"delta"} and len(names) > 2
+    final = events[-1][1]
+    assert final["response"] == "".join(data["text"] for name, data in events if name == "delta")
+    assert final["action_intent"]["action_type"] == "DEPOSIT_VAULT"
+    assert (final["action_intent"]["amount"], final["action_intent"]["token"]) == (25.0, "USDC")
+
+
+async def test_mid_stream_failure_ends_with_a_single_error_event():
+    _install(stream_chunks=4, fail_after_chunks=2)
+    response, events = await _stream("How are my vaults doing?")
+    assert response.status_code == 200
+    assert [name for name, _ in events] == ["delta", "delta", "error"]
+    assert events[-1][1] == {"detail": "Failed to get response from AI."}
+
+
+async def test_client_disconnect_releases_the_llm_slot():
+    model = _install(stream_chunks=50, latency_ms=10_000)
+    scheduler = personality.get_llm_scheduler("fake")
+    first_body = asyncio.Event()
+    request_sent = False
+    sent: List[Dict[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": json.dumps({"message": "Hi Lucy"}).encode(), "more_body": False}
+        # The client hangs up as soon as the first event arrives
+        await first_body.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        sent.append(message)
+        if message["type"] == "http.response.body" and message.get("body"):
+            assert scheduler.stats()["running"] == 1
+            first_body.set()
+
+    headers = [(b"content-type", b"application/json")] + [(k.lower().encode(), v.encode()) for k, v in _auth(ALICE).items()]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": STREAM_PATH, "raw_path": STREAM_PATH.encode(), "root_path": "", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 1234), "server": ("lucy", 80),
+    }
+    started = time.perf_counter()
+    await asyncio.wait_for(app(scope, receive, send), timeout=5.0)
+
+    # The 10 s generation was abandoned right after the first delta, and its slot returned
+    assert time.perf_counter() - started < 2.0
+    assert sent[0]["status"] == 200
+    assert model.calls == 1
+    assert scheduler.stats()["running"] == 0
@@ -0,0 +1,109 @@
+import itertools
+import random
+from typing import Dict, List, Sequence
+
+import pytest
+
+from src.lucy_ai.api.schemas import YieldPool
+from src.lucy_ai.core import engine
+from src.lucy_ai.core.engine import (
+    AVAILABLE_POOLS_MVP, MAX_MVP_RISK_SCORE, SUPPORTED_ENGINE_ASSETS,
+    find_best_yield_suggestion, find_best_yield_suggestions_batch,
+)
+from src.lucy_ai.services.senti_backend import UserVaultData
+
+# Few distinct values so ties (equal APYs, equal yield rates) and the 0.5% threshold boundary come up often
+POOL_APYS = [5.5, 5.8, 6.0, 6.5, 7.0]
+YIELD_RATES = [0.05, 0.055, 0.06, 0.065, 0.07]
+TOKENS = list(SUPPORTED_ENGINE_ASSETS) + ["BONK"] # Vaults in unsupported tokens are ignored by both paths
+
+
+@pytest.fixture(autouse=True)
+def quiet_engine(monkeypatch):
+    # The scalar path logs every decision at INFO; thousands of them slow the test down
+    monkeypatch.setattr(engine.logger, "disabled", True)
+
+
+def _random_pools(rng: random.Random) -> List[YieldPool]:
+    return [
+        YieldPool(
+            pool_id=f"pool-{i}", protocol_name=f"Protocol {i}", asset=rng.choice(SUPPORTED_ENGINE_ASSETS),
+            current_apy=rng.choice(POOL_APYS), risk_score=rng.randint(1, MAX_MVP_RISK_SCORE + 2),
+        )
+        for i in range(rng.randint(0, 12))
+    ]
+
+
+def _random_vaults(rng: random.Random, user_id: str) -> List[UserVaultData]:
+    return [
+        UserVaultData(
+            id=f"{user_id}-{i}", name=rng.choice([f"Vault {i}", None]), token=rng.choice(TOKENS),
+            totalDeposits=rng.uniform(0, 10_000), yieldRate=rng.choice(YIELD_RATES), locked=rng.random() < 0.4,
+        )
+        for i in range(rng.randint(0, 6))
+    ]
+
+
+def _assert_batch_matches_scalar(vaults_by_user: Dict[str, List[UserVaultData]], pools: Sequence[YieldPool]) -> None:
+    batch = find_best_yield_suggestions_batch(vaults_by_user, SUPPORTED_ENGINE_ASSETS, pools)
+    assert list(batch) == list(vaults_by_user)
+    for user_id, vaults in vaults_by_user.items():
+        for asset in SUPPORTED_ENGINE_ASSETS:
+            expected = find_best_yield_suggestion(asset, vaults, list(pools))
+            assert batch[user_id][asset].model_dump() == expected.model_dump(), (user_id, asset)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_batch_matches_scalar_on_random_inputs(seed):
+    rng = random.Random(seed)
+    pools = _random_pools(rng)
+    vaults_by_user = {f"user-{u}": _random_vaults(rng, f"user-{u}") for u in range(rng.randint(1, 25))}
+    _assert_batch_matches_scalar(vaults_by_user, pools)
+
+
+@pytest.mark.parametrize("asset,risk_score", list(itertools.product(SUPPORTED_ENGINE_ASSETS, range(1, MAX_MVP_RISK_SCORE + 2))))
+def test_batch_matches_scalar_for_every_asset_and_risk(asset, risk_score):
+    pools = [YieldPool(pool_id="only", protocol_name="Only", asset=asset, current_apy=6.0, risk_score=risk_score)]
+    rng = random.Random(f"{asset}/{risk_score}")
+    vaults_by_user = {f"user-{u}": _random_vaults(rng, f"user-{u}") for u in range(20)}
+    _assert_batch_matches_scalar(vaults_by_user, pools)
+
+
+def test_ties_resolve_to_the_first_pool_and_vault():
+    pools = [
+        YieldPool(pool_id="first", protocol_name="First", asset="USDC", current_apy=6.0, risk_score=1),
+        YieldPool(pool_id="second", protocol_name="Second", asset="USDC", current_apy=6.0, risk_score=1),
+    ]
+    vaults = {
+        "holder": [
+            UserVaultData(id="a", name="Vault A", token="USDC", totalDeposits=1, yieldRate=0.06, locked=False),
+            UserVaultData(id="b", name="Vault B", token="USDC", totalDeposits=1, yieldRate=0.06, locked=False),
+        ],
+        "newcomer": [],
+    }
+    _assert_batch_matches_scalar(vaults, pools)
+    batch = find_best_yield_suggestions_batch(vaults, SUPPORTED_ENGINE_ASSETS, pools)
+    assert batch["holder"]["USDC"].protocol_name == "Vault A"
+    assert batch["newcomer"]["USDC"].recommended_pool_id == "first"
+
+
+def test_empty_pools_and_users():
+    vaults = {"user": [UserVaultData(id="a", token="SOL", totalDeposits=1, yieldRate=0.05, locked=False)]}
+    _assert_batch_matches_scalar(vaults, [])
+    assert {f.suggestion_type for f in find_best_yield_suggestions_batch(vaults, SUPPORTED_ENGINE_ASSETS, [])["user"].values()} == {"NO_SUGGESTION"}
+    assert find_best_yield_suggestions_batch({}, SUPPORTED_ENGINE_ASSETS, AVAILABLE_POOLS_MVP) == {}
+
+
+def test_locked_vaults_are_treated_as_no_position():
+    vaults = {
+        "locked_only": [UserVaultData(id="a", token="USDC", totalDeposits=1, yieldRate=0.20, locked=True, lockPeriodDays=30)],
+        "locked_and_unlocked": [
+            UserVaultData(id="a", token="USDC", totalDeposits=1, yieldRate=0.20, locked=True, lockPeriodDays=30),
+            UserVaultData(id="b", name="Open", token="USDC", totalDeposits=1, yieldRate=0.01, locked=False),
+        ],
+    }
+    _assert_batch_matches_scalar(vaults, AVAILABLE_POOLS_MVP)
+    batch = find_best_yield_suggestions_batch(vaults, SUPPORTED_ENGINE_ASSETS, AVAILABLE_POOLS_MVP)
+    assert batch["locked_only"]["USDC"].suggestion_type == "DEPOSIT_TO_BEST"
+    assert batch["locked_and_unlocked"]["USDC"].suggestion_type == "MOVE_TO_BETTER_YIELD"
+    assert batch["locked_and_unlocked"]["USDC"].current_apy == 1.0
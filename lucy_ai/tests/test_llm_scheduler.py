@@ -0,0 +1,133 @@
+import asyncio
+from typing import List
+
+import pytest
+from fastapi import HTTPException
+
+from src.lucy_ai.core import personality
+from src.lucy_ai.core.llm_scheduler import (
+    PRIORITY_BACKGROUND, PRIORITY_CHAT, PRIORITY_SUGGESTION, LLMOverloadedError, LLMScheduler,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def _hold(scheduler: LLMScheduler, priority: int, release: asyncio.Event, order: List[str], name: str, timeout=None) -> None:
+    async with scheduler.slot(priority, timeout=timeout):
+        order.append(name)
+        await release.wait()
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_waiters_are_admitted_by_priority_then_arrival():
+    scheduler = LLMScheduler("test", max_concurrency=1, max_queue=10)
+    release, order = asyncio.Event(), []
+    release.set() # Queued callers leave as soon as they are admitted
+    gate = asyncio.Event()
+    holder = asyncio.create_task(_hold(scheduler, PRIORITY_CHAT, gate, order, "holder"))
+    await _settle()
+
+    tasks = [
+        asyncio.create_task(_hold(scheduler, priority, release, order, name))
+        for priority, name in [
+            (PRIORITY_BACKGROUND, "background"), (PRIORITY_SUGGESTION, "suggestion-1"),
+            (PRIORITY_CHAT, "chat"), (PRIORITY_SUGGESTION, "suggestion-2"),
+        ]
+    ]
+    await _settle()
+    assert scheduler.stats()["queued"] == 4
+    gate.set()
+    await asyncio.gather(holder, *tasks)
+    assert order == ["holder", "chat", "suggestion-1", "suggestion-2", "background"]
+    assert scheduler.stats() == {"running": 0, "queued": 0, "admitted": 5, "rejected": 0, "timed_out": 0}
+
+
+async def test_full_queue_rejects_with_429_and_displaces_lower_priority():
+    scheduler = LLMScheduler("test", max_concurrency=1, max_queue=2)
+    gate, order = asyncio.Event(), []
+    holder = asyncio.create_task(_hold(scheduler, PRIORITY_CHAT, gate, order, "holder"))
+    await _settle()
+    old_bg = asyncio.create_task(_hold(scheduler, PRIORITY_BACKGROUND, gate, order, "old-bg"))
+    new_bg = asyncio.create_task(_hold(scheduler, PRIORITY_BACKGROUND, gate, order, "new-bg"))
+    await _settle()
+
+    # Same priority as everything queued: nothing to displace
+    with pytest.raises(LLMOverloadedError) as rejected:
+        await _hold(scheduler, PRIORITY_BACKGROUND, gate, order, "too-late")
+    assert rejected.value.status_code == 429 and rejected.value.reason == "queue full"
+
+    # A chat request takes the place of the newest background waiter
+    chat = asyncio.create_task(_hold(scheduler, PRIORITY_CHAT, gate, order, "chat"))
+    await _settle()
+    assert new_bg.done()
+    with pytest.raises(LLMOverloadedError) as displaced:
+        await new_bg
+    assert displaced.value.status_code == 429 and "displaced" in displaced.value.reason
+
+    gate.set()
+    await asyncio.gather(holder, old_bg, chat)
+    assert order == ["holder", "chat", "old-bg"]
+    assert scheduler.stats()["rejected"] == 2
+
+
+async def test_deadline_gives_up_with_503():
+    scheduler = LLMScheduler("test", max_concurrency=1, max_queue=4)
+    gate, order = asyncio.Event(), []
+    holder = asyncio.create_task(_hold(scheduler, PRIORITY_CHAT, gate, order, "holder"))
+    await _settle()
+    with pytest.raises(LLMOverloadedError) as timed_out:
+        await _hold(scheduler, PRIORITY_CHAT, gate, order, "waiter", timeout=0.01)
+    assert timed_out.value.status_code == 503
+    assert scheduler.stats()["timed_out"] == 1 and scheduler.stats()["queued"] == 0
+
+    gate.set()
+    await holder
+    assert scheduler.stats()["running"] == 0
+
+
+async def test_displaced_exactly_at_the_deadline_counts_as_rejected(monkeypatch):
+    scheduler = LLMScheduler("test", max_concurrency=1, max_queue=1)
+    gate, order = asyncio.Event(), []
+    holder = asyncio.create_task(_hold(scheduler, PRIORITY_CHAT, gate, order, "holder"))
+    await _settle()
+
+    async def deadline_and_displacement_in_one_tick(aw, timeout):
+        # A chat request displaces this waiter in the same loop iteration the deadline fires
+        assert scheduler._make_room(PRIORITY_CHAT)
+        aw.cancel()
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(asyncio, "wait_for", deadline_and_displacement_in_one_tick)
+    with pytest.raises(LLMOverloadedError) as displaced:
+        await _hold(scheduler, PRIORITY_BACKGROUND, gate, order, "bg", timeout=1.0)
+    monkeypatch.undo()
+
+    assert displaced.value.status_code == 429
+    assert scheduler.stats()["rejected"] == 1 and scheduler.stats()["timed_out"] == 0
+    gate.set()
+    await holder
+
+
+async def test_retry_after_tracks_backlog_and_reaches_the_http_error(monkeypatch):
+    scheduler = LLMScheduler("test", max_concurrency=2, max_queue=0)
+    gate, order = asyncio.Event(), []
+    holders = [asyncio.create_task(_hold(scheduler, PRIORITY_CHAT, gate, order, f"h{i}")) for i in range(2)]
+    await _settle()
+    # Seeded 2 s per call, 2 running over 2 slots
+    assert scheduler.retry_after() == 2
+
+    monkeypatch.setattr(personality, "get_llm_scheduler", lambda provider=None: scheduler)
+    with pytest.raises(HTTPException) as overloaded:
+        async with personality._llm_slot(PRIORITY_CHAT, timeout=1.0, chain="chat"):
+            pass
+    assert overloaded.value.status_code == 429
+    assert overloaded.value.headers == {"Retry-After": "2"}
+
+    gate.set()
+    await asyncio.gather(*holders)
+    # Fast calls pull the estimate down, never below one second
+    assert scheduler.retry_after() == 1
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import List, Union
+
+import pytest
+
+from src.lucy_ai.utils.microbatch import MicroBatcher
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingHandler:
+    """Doubles each item, records every batch, and can fail the whole batch or single items."""
+    def __init__(self):
+        self.batches: List[List[int]] = []
+        self.fail_batch = False
+
+    async def __call__(self, items: List[int]) -> List[Union[int, Exception]]:
+        self.batches.append(list(items))
+        await asyncio.sleep(0)
+        if self.fail_batch:
+            raise RuntimeError("provider down")
+        return [ValueError(f"bad item {i}") if i < 0 else i * 2 for i in items]
+
+
+async def test_full_batch_flushes_without_waiting_for_the_window():
+    handler = RecordingHandler()
+    batcher = MicroBatcher("test", handler, window=10.0, max_batch_size=4)
+    started = time.perf_counter()
+    results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(4))), timeout=1.0)
+    assert time.perf_counter() - started < 1.0
+    assert results == [0, 2, 4, 6]
+    assert handler.batches == [[0, 1, 2, 3]]
+
+
+async def test_partial_batch_flushes_when_the_window_closes():
+    handler = RecordingHandler()
+    batcher = MicroBatcher("test", handler, window=0.05, max_batch_size=8)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+    assert time.perf_counter() - started >= 0.04
+    assert results == [0, 2, 4]
+    assert handler.batches == [[0, 1, 2]]
+
+
+async def test_overflow_starts_a_new_batch():
+    handler = RecordingHandler()
+    batcher = MicroBatcher("test", handler, window=0.02, max_batch_size=3)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+    assert results == [i * 2 for i in range(7)]
+    assert handler.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert batcher.stats() == {"batches": 3, "items": 7, "average_batch_size": 7 / 3}
+
+
+async def test_each_caller_gets_its_own_result_or_error():
+    batcher = MicroBatcher("test", RecordingHandler(), window=0.01, max_batch_size=8)
+    results = await asyncio.gather(*(batcher.submit(i) for i in (5, -1, 7)), return_exceptions=True)
+    assert results[0] == 10 and results[2] == 14
+    assert isinstance(results[1], ValueError) and str(results[1]) == "bad item -1"
+
+
+async def test_failed_batch_reaches_every_waiter_and_the_next_batch_still_runs():
+    handler = RecordingHandler()
+    handler.fail_batch = True
+    batcher = MicroBatcher("test", handler, window=0.01, max_batch_size=8)
+    results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True), timeout=1.0)
+    assert all(isinstance(r, RuntimeError) and str(r) == "provider down" for r in results)
+    assert len({id(r) for r in results}) == 1
+
+    handler.fail_batch = False
+    assert await asyncio.wait_for(asyncio.gather(batcher.submit(4), batcher.submit(5)), timeout=1.0) == [8, 10]
+    assert handler.batches == [[0, 1, 2], [4, 5]]
+
+
+async def test_wrong_result_count_fails_the_batch():
+    async def short_handler(items: List[int]) -> List[int]:
+        return items[:-1]
+
+    batcher = MicroBatcher("test", short_handler, window=0.01, max_batch_size=8)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(2)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+async def test_cancelled_caller_does_not_cancel_the_batch():
+    handler = RecordingHandler()
+    batcher = MicroBatcher("test", handler, window=0.02, max_batch_size=8)
+    leaving = asyncio.create_task(batcher.submit(1))
+    staying = asyncio.create_task(batcher.submit(2))
+    await asyncio.sleep(0)
+    leaving.cancel()
+    assert await staying == 4
+    assert handler.batches == [[1, 2]]
+
+
+async def test_aclose_sends_pending_items():
+    handler = RecordingHandler()
+    batcher = MicroBatcher("test", handler, window=10.0, max_batch_size=8)
+    pending = asyncio.create_task(batcher.submit(3))
+    await asyncio.sleep(0)
+    await batcher.aclose()
+    assert await pending == 6
@@ -0,0 +1,107 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import pytest
+
+from src.lucy_ai.services import solana_rpc
+from src.lucy_ai.services.solana_rpc import PriceCache, PriceSource
+
+pytestmark = pytest.mark.anyio
+
+TTL, MAX_STALE = 10.0, 60.0
+
+
+class FakePriceSource(PriceSource):
+    """Serves `prices`, records every fetch, and fails on demand."""
+    def __init__(self, prices: Dict[str, float]):
+        self.prices = dict(prices)
+        self.fetches: List[List[str]] = []
+        self.fail: Optional[str] = None # None, "empty" (logged failure) or "raise"
+
+    async def fetch_prices(self, token_symbols: List[str]) -> Dict[str, float]:
+        self.fetches.append(list(token_symbols))
+        if self.fail == "raise":
+            raise RuntimeError("upstream down")
+        if self.fail == "empty":
+            return {}
+        return {s: self.prices[s] for s in token_symbols if s in self.prices}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    # Only the module's view of time moves; the event loop keeps the real clock
+    monkeypatch.setattr(solana_rpc, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+async def cache(clock):
+    source = FakePriceSource({"SOL": 150.0, "USDC": 1.0})
+    cache = PriceCache(source, ttl=TTL, max_stale=MAX_STALE)
+    yield cache
+    await cache.aclose()
+
+
+async def _settle(cache: PriceCache) -> None:
+    if cache._revalidate_task is not None:
+        await cache._revalidate_task
+
+
+def test_price_source_is_abstract():
+    with pytest.raises(TypeError):
+        PriceSource()
+
+
+async def test_fresh_prices_are_served_without_refetching(cache, clock):
+    assert await cache.get(["SOL", "USDC"]) == {"SOL": 150.0, "USDC": 1.0}
+    clock.value += TTL - 1
+    cache.source.prices["SOL"] = 999.0
+    assert await cache.get(["SOL", "USDC"]) == {"SOL": 150.0, "USDC": 1.0}
+    assert cache.source.fetches == [["SOL", "USDC"]]
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 2}
+
+
+async def test_stale_price_is_served_while_revalidating(cache, clock):
+    await cache.get(["SOL"])
+    cache.source.prices["SOL"] = 160.0
+    clock.value += TTL + 1
+    # Served from cache immediately, refreshed behind the reader
+    assert await cache.get(["SOL"]) == {"SOL": 150.0}
+    await _settle(cache)
+    assert cache.source.fetches == [["SOL"], ["SOL"]]
+    assert await cache.get(["SOL"]) == {"SOL": 160.0}
+
+
+@pytest.mark.parametrize("failure", ["empty", "raise"])
+async def test_failed_refresh_keeps_last_good_price(cache, clock, failure):
+    await cache.get(["SOL"])
+    cache.source.fail = failure
+    clock.value += TTL + 1
+    assert await cache.get(["SOL"]) == {"SOL": 150.0}
+    await _settle(cache)
+    assert await cache.get(["SOL"]) == {"SOL": 150.0}
+    # Past max_stale the old price is no longer trusted
+    clock.value += MAX_STALE
+    if failure == "raise":
+        with pytest.raises(RuntimeError):
+            await cache.get(["SOL"])
+    else:
+        assert await cache.get(["SOL"]) == {"SOL": None}
+
+
+async def test_missing_ids_map_to_none_and_are_not_refetched_every_read(cache, clock):
+    assert await cache.get(["SOL", "BONK"]) == {"SOL": 150.0, "BONK": None}
+    assert await cache.get(["BONK"]) == {"BONK": None}
+    assert cache.source.fetches == [["SOL", "BONK"]]
+    # Retried once the negative entry is older than the ttl
+    clock.value += TTL + 1
+    assert await cache.get(["BONK"]) == {"BONK": None}
+    assert cache.source.fetches[-1] == ["BONK"]
+
+
+async def test_concurrent_misses_share_one_fetch(cache):
+    results = await asyncio.gather(*(cache.get(["SOL"]) for _ in range(10)))
+    assert all(r == {"SOL": 150.0} for r in results)
+    assert cache.source.fetches == [["SOL"]]
@@ -0,0 +1,88 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from benchmarks.fake_upstreams import FakeServer, LatencyProfile, create_solana_rpc_app
+from src.lucy_ai.services.solana_rpc import BatchingRpcTransport, RpcCallError
+
+pytestmark = pytest.mark.anyio
+
+WALLETS = [f"Wallet{i:038d}" for i in range(5)]
+
+
+@pytest.fixture(params=[False, True], ids=["in_order", "reversed"])
+async def fake_rpc(request):
+    profile, calls = LatencyProfile(latency_ms=5), Counter()
+    server = FakeServer("rpc", create_solana_rpc_app(profile, calls, reverse_batches=request.param))
+    await server.start()
+    yield server.url, profile, calls
+    await server.stop()
+
+
+def _transport(url: str, window: float = 0.05, max_batch_size: int = 100) -> BatchingRpcTransport:
+    return BatchingRpcTransport(url, timeout=5.0, max_connections=10, window=window, max_batch_size=max_batch_size)
+
+
+async def test_concurrent_calls_share_one_batch_and_map_back_by_id(fake_rpc):
+    url, _, calls = fake_rpc
+    transport = _transport(url)
+    try:
+        balances = await asyncio.gather(*[transport.call("getBalance", [wallet]) for wallet in WALLETS])
+        accounts = await transport.call("getTokenAccountsByOwner", [WALLETS[0]])
+    finally:
+        await transport.aclose()
+
+    assert calls["solana_rpc:http_requests"] == 2
+    assert calls["solana_rpc:getBalance"] == len(WALLETS)
+    # Each caller gets its own wallet's answer, however the node ordered the batch
+    reference = _transport(url, window=0)
+    try:
+        expected = [await reference.call("getBalance", [wallet]) for wallet in WALLETS]
+    finally:
+        await reference.aclose()
+    assert [b["value"] for b in balances] == [e["value"] for e in expected]
+    assert len(set(b["value"] for b in balances)) == len(WALLETS)
+    assert accounts["value"][0]["pubkey"].startswith(WALLETS[0][:8])
+
+
+async def test_full_batch_is_sent_without_waiting_for_the_window(fake_rpc):
+    url, _, calls = fake_rpc
+    transport = _transport(url, window=10.0, max_batch_size=len(WALLETS))
+    try:
+        await asyncio.wait_for(asyncio.gather(*[transport.call("getBalance", [w]) for w in WALLETS]), timeout=2.0)
+    finally:
+        await transport.aclose()
+    assert calls["solana_rpc:http_requests"] == 1
+
+
+async def test_item_error_reaches_only_its_caller(fake_rpc):
+    url, _, calls = fake_rpc
+    transport = _transport(url)
+    try:
+        results = await asyncio.gather(
+            transport.call("getBalance", [WALLETS[0]]),
+            transport.call("getNoSuchThing", []),
+            transport.call("getBalance", [WALLETS[1]]),
+            return_exceptions=True,
+        )
+    finally:
+        await transport.aclose()
+    assert calls["solana_rpc:http_requests"] == 1
+    assert isinstance(results[1], RpcCallError) and not results[1].retryable
+    assert results[0]["value"] > 0 and results[2]["value"] > 0
+
+
+async def test_http_failure_fails_every_waiter(fake_rpc):
+    url, profile, calls = fake_rpc
+    transport = _transport(url)
+    try:
+        profile.error_rate = 1.0
+        results = await asyncio.gather(*[transport.call("getBalance", [w]) for w in WALLETS], return_exceptions=True)
+        assert calls["solana_rpc:http_requests"] == 1
+        assert all(isinstance(r, RpcCallError) and r.retryable for r in results)
+
+        profile.error_rate = 0.0 # The next batch is unaffected
+        assert (await transport.call("getBalance", [WALLETS[0]]))["value"] > 0
+    finally:
+        await transport.aclose()
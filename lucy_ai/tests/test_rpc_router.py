@@ -0,0 +1,152 @@
+import asyncio
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import pytest
+
+from benchmarks.fake_upstreams import FakeServer, LatencyProfile, create_solana_rpc_app
+from src.lucy_ai.services import solana_rpc
+from src.lucy_ai.services.solana_rpc import RpcCallError, RpcEndpoint, RpcRouter, SolanaRpcTransport
+
+pytestmark = pytest.mark.anyio
+
+OWNER = "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"
+GET_BALANCE = ("getBalance", [OWNER, {"commitment": "confirmed"}])
+
+
+class FakeRpc:
+    """A local fake RPC server whose latency and failures the test controls."""
+    def __init__(self, name: str, latency_ms: float = 5.0):
+        self.profile = LatencyProfile(latency_ms)
+        self.calls: Counter = Counter()
+        self.server = FakeServer(name, create_solana_rpc_app(self.profile, self.calls))
+
+    @property
+    def requests(self) -> int:
+        return self.calls["solana_rpc:http_requests"]
+
+
+@pytest.fixture
+async def rpcs(monkeypatch):
+    monkeypatch.setattr(solana_rpc, "_RPC_EXPLORE_PROBABILITY", 0.0) # Deterministic ranking
+    fakes = [FakeRpc(f"rpc{i}") for i in range(3)]
+    for fake in fakes:
+        await fake.server.start()
+    yield fakes
+    for fake in fakes:
+        await fake.server.stop()
+
+
+def _router(fakes: List[FakeRpc], hedge: bool = False, hedge_min_delay: float = 0.05, **breaker) -> RpcRouter:
+    endpoints = [RpcEndpoint(f.server.url, SolanaRpcTransport(f.server.url, timeout=5.0, max_connections=10), **breaker) for f in fakes]
+    return RpcRouter(endpoints, hedge=hedge, hedge_min_delay=hedge_min_delay)
+
+
+async def _timed_call(router: RpcRouter, method: str = GET_BALANCE[0], params: list = GET_BALANCE[1]) -> Tuple[float, object]:
+    started = time.monotonic()
+    result = await router.call(method, params)
+    return time.monotonic() - started, result
+
+
+async def test_breaker_opens_after_consecutive_failures_and_recovers_half_open(rpcs):
+    fake = rpcs[0]
+    router = _router([fake], breaker_failures=3, breaker_cooldown=0.3)
+    endpoint = router.endpoints[0]
+    try:
+        fake.profile.error_rate = 1.0
+        for _ in range(3):
+            with pytest.raises(RpcCallError):
+                await router.call(*GET_BALANCE)
+        assert endpoint.state == RpcEndpoint.OPEN
+
+        with pytest.raises(RpcCallError, match="unavailable"):
+            await router.call(*GET_BALANCE)
+        assert fake.requests == 3 # An open circuit sends nothing
+
+        await asyncio.sleep(0.35)
+        with pytest.raises(RpcCallError): # The half-open trial fails: open again at once
+            await router.call(*GET_BALANCE)
+        assert endpoint.state == RpcEndpoint.OPEN and fake.requests == 4
+
+        fake.profile.error_rate = 0.0
+        await asyncio.sleep(0.35)
+        await router.call(*GET_BALANCE) # The trial succeeds: closed
+        assert endpoint.state == RpcEndpoint.CLOSED and fake.requests == 5
+    finally:
+        await router.aclose()
+
+
+async def test_retryable_failure_fails_over_exactly_once(rpcs):
+    router = _router(rpcs)
+    try:
+        rpcs[0].profile.error_rate = 1.0
+        _, result = await _timed_call(router)
+        assert result["value"] > 0
+        assert router.stats()["failovers"] == 1
+        assert [f.requests for f in rpcs] == [1, 1, 0]
+
+        for fake in rpcs:
+            fake.profile.error_rate = 1.0
+        with pytest.raises(RpcCallError):
+            await router.call(*GET_BALANCE)
+        assert router.stats()["failovers"] == 2
+        assert sum(f.requests for f in rpcs) == 4 # Primary and one backup; the third endpoint is never tried
+    finally:
+        await router.aclose()
+
+
+async def test_rpc_error_objects_are_not_retried(rpcs):
+    router = _router(rpcs)
+    try:
+        with pytest.raises(RpcCallError) as raised:
+            await router.call("getNoSuchThing", [])
+        assert not raised.value.retryable
+        assert router.stats()["failovers"] == 0
+        assert [f.requests for f in rpcs] == [1, 0, 0]
+    finally:
+        await router.aclose()
+
+
+async def test_hedge_fires_after_min_delay_without_latency_history(rpcs):
+    rpcs[0].profile.latency_ms = 500
+    router = _router(rpcs[:2], hedge=True, hedge_min_delay=0.05)
+    try:
+        elapsed, _ = await _timed_call(router)
+        assert 0.05 <= elapsed < 0.3 # Answered by the runner-up, not after the primary's 500ms
+        assert router.stats()["hedges"] == 1 and router.stats()["hedge_wins"] == 1
+    finally:
+        await router.aclose()
+
+
+async def test_hedge_waits_for_primary_p95(rpcs):
+    router = _router(rpcs[:2], hedge=True, hedge_min_delay=0.05)
+    primary, runner_up = router.endpoints
+    for _ in range(20):
+        primary.record_success(0.4) # The primary usually takes 400ms...
+        runner_up.record_success(0.5) # ... and still ranks first
+    try:
+        rpcs[0].profile.latency_ms = 200 # Slower than min delay, faster than its p95: no hedge
+        elapsed, _ = await _timed_call(router)
+        assert elapsed >= 0.2
+        assert router.stats()["hedges"] == 0 and rpcs[1].requests == 0
+
+        rpcs[0].profile.latency_ms = 2000 # Past its p95: hedged at ~400ms
+        elapsed, _ = await _timed_call(router)
+        assert 0.4 <= elapsed < 1.5
+        assert router.stats()["hedges"] == 1 and router.stats()["hedge_wins"] == 1
+    finally:
+        await router.aclose()
+
+
+@pytest.mark.parametrize("method", ["sendTransaction", "requestAirdrop"])
+async def test_send_and_request_methods_are_never_hedged(rpcs, method):
+    rpcs[0].profile.latency_ms = 300
+    router = _router(rpcs[:2], hedge=True, hedge_min_delay=0.01)
+    try:
+        with pytest.raises(RpcCallError): # The fake doesn't implement them; only the routing matters here
+            await router.call(method, ["AQID"])
+        assert router.stats()["hedges"] == 0
+        assert [f.requests for f in rpcs[:2]] == [1, 0]
+    finally:
+        await router.aclose()
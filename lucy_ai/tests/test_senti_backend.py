@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from benchmarks.fake_upstreams import fake_vaults
+from src.lucy_ai.services import senti_backend
+
+pytestmark = pytest.mark.anyio
+
+CALLERS = 20
+
+
+class CountingBackend:
+    """Fake Senti backend transport: counts requests and holds each one until released."""
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+        self.requests = 0
+        self.release = asyncio.Event()
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await self.release.wait()
+        user_id = request.url.path.rsplit("/", 1)[-1]
+        if self.status_code != 200:
+            return httpx.Response(self.status_code, text="backend exploded")
+        return httpx.Response(200, content=json.dumps(fake_vaults(user_id, 3)))
+
+
+@pytest.fixture(autouse=True)
+def fresh_flight():
+    senti_backend._vaults_flight.clear()
+    yield
+    senti_backend._vaults_flight.clear()
+
+
+async def _call_concurrently(backend: CountingBackend):
+    joined_before = senti_backend._vaults_flight.shared
+    async with httpx.AsyncClient(transport=httpx.MockTransport(backend.handler)) as client:
+        tasks = [asyncio.create_task(senti_backend.get_user_vaults("alice", "token", client=client)) for _ in range(CALLERS)]
+        # Let every caller reach the flight before the single upstream call answers
+        while senti_backend._vaults_flight.shared - joined_before < CALLERS - 1:
+            await asyncio.sleep(0)
+        backend.release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def test_concurrent_calls_share_one_upstream_request():
+    backend = CountingBackend()
+    results = await _call_concurrently(backend)
+    assert backend.requests == 1
+    assert all(len(vaults) == 3 for vaults in results)
+    # Every caller gets its own list, so one mutating it can't affect the others
+    assert len({id(vaults) for vaults in results}) == CALLERS
+    assert senti_backend._vaults_flight._in_flight == {}
+
+
+async def test_upstream_error_reaches_every_joined_caller_and_is_not_cached():
+    backend = CountingBackend(status_code=500)
+    results = await _call_concurrently(backend)
+    assert backend.requests == 1
+    assert all(isinstance(r, HTTPException) and r.status_code == 500 for r in results)
+    assert senti_backend._vaults_flight._in_flight == {}
+
+    # The failed key is gone, so the next call goes upstream again
+    retry = CountingBackend()
+    retry.release.set()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(retry.handler)) as client:
+        vaults = await senti_backend.get_user_vaults("alice", "token", client=client)
+    assert retry.requests == 1
+    assert len(vaults) == 3
@@ -0,0 +1,161 @@
+import asyncio
+import multiprocessing
+import sqlite3
+import time
+
+import pytest
+
+from src.lucy_ai.services import solana_rpc
+from src.lucy_ai.utils.shared_cache import CacheBackend, CacheBusy, MemoryCacheBackend, SharedCache, SQLiteCacheBackend
+
+
+def _race_for_lease(path: str, start_at: float, results) -> None:
+    backend = SQLiteCacheBackend(path, busy_timeout=1.0) # Generous: this test is about exclusivity, not latency
+    cache = SharedCache(backend, "prices", lease_duration=30.0)
+    backend.open()
+    time.sleep(max(0.0, start_at - time.time()))
+    results.put(cache.acquire_lease("SOL") is not None)
+
+
+def test_lease_is_exclusive_across_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCacheBackend(path).open() # Create the schema before the race
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    start_at = time.time() + 2.0
+    workers = [context.Process(target=_race_for_lease, args=(path, start_at, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+    assert sorted(results.get(timeout=5) for _ in workers) == [False, False, False, True]
+
+
+def test_lease_expires_and_is_released(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = SQLiteCacheBackend(path), SQLiteCacheBackend(path) # Two connections, as two workers have
+
+    assert first.acquire_lease("pools:live", "worker-1", duration=0.2)
+    assert not second.acquire_lease("pools:live", "worker-2", duration=0.2)
+    assert first.acquire_lease("pools:live", "worker-1", duration=0.2) # The holder may renew
+
+    time.sleep(0.25)
+    assert second.acquire_lease("pools:live", "worker-2", duration=10.0) # Expired: taken over
+    assert not first.acquire_lease("pools:live", "worker-1", duration=10.0)
+
+    first.release_lease("pools:live", "worker-1") # Not the holder: no effect
+    assert not first.acquire_lease("pools:live", "worker-1", duration=10.0)
+    second.release_lease("pools:live", "worker-2")
+    assert first.acquire_lease("pools:live", "worker-1", duration=10.0)
+
+
+def test_locked_database_fails_fast_and_reads_as_a_miss(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    backend = SQLiteCacheBackend(path, busy_timeout=0.005)
+    cache = SharedCache(backend, "balances")
+    cache.set("wallet", {"sol": 1}, ttl=60)
+
+    other_worker = sqlite3.connect(path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE") # Holds the write lock
+    try:
+        started = time.monotonic()
+        with pytest.raises(CacheBusy):
+            backend.set("balances:wallet", {"sol": 2}, ttl=60)
+        assert time.monotonic() - started < 0.5
+
+        assert cache.get("wallet").value == {"sol": 1} # WAL readers don't wait for the writer
+        assert cache.acquire_lease("wallet") is not None # A busy backend grants the lease: the caller fetches
+        cache.set("wallet", {"sol": 3}, ttl=60)
+        assert cache.stats()["busy"] == 2
+        assert cache.stats()["errors"] == 0
+    finally:
+        other_worker.execute("ROLLBACK")
+        other_worker.close()
+    assert cache.get("wallet").value == {"sol": 1}
+
+
+def test_backends_must_implement_the_whole_interface():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError, match="entry_count"):
+        GetOnly()
+    MemoryCacheBackend()
+    SQLiteCacheBackend(":memory:")
+
+
+def _fill(backend: SQLiteCacheBackend, count: int, ttl: float, prefix: str = "k") -> None:
+    conn = backend._connection()
+    now = time.time()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT OR REPLACE INTO entries (key, value, stored_at, expires_at) VALUES (?, '1', ?, ?)",
+        [(f"{prefix}{i}", now + i * 1e-6, now + ttl) for i in range(count)],
+    )
+    conn.execute("COMMIT")
+
+
+def test_writes_never_purge_inline(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    for i in range(1200):
+        backend.set(f"k{i}", i, ttl=60)
+    assert backend.entry_count() == 1200 # Left to the periodic purge
+
+    backend.purge()
+    assert backend.entry_count() == 10
+    assert backend.get("k1199") is not None and backend.get("k0") is None # The newest stay
+
+
+def test_purge_drops_expired_rows_and_leases_in_batches(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=100_000, purge_batch=100)
+    _fill(backend, 1050, ttl=-1, prefix="old")
+    _fill(backend, 5, ttl=60, prefix="new")
+    backend.acquire_lease("expired", "worker-1", duration=-1)
+    backend.acquire_lease("held", "worker-1", duration=60)
+
+    backend.purge()
+    assert backend.entry_count() == 5
+    assert backend._connection().execute("SELECT key FROM leases").fetchall() == [("held",)]
+    backend.close()
+
+
+@pytest.mark.anyio
+async def test_purge_in_a_thread_leaves_the_event_loop_running(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=100_000, purge_batch=500)
+    _fill(backend, 50_000, ttl=-1)
+    ticks = 0
+
+    async def heartbeat():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.to_thread(backend.purge)
+    beat.cancel()
+    assert backend.entry_count() == 0
+    assert ticks > 1 # The loop kept running while the thread deleted
+    backend.close()
+
+
+@pytest.mark.anyio
+async def test_lifespan_purges_a_shared_backend_periodically(tmp_path, monkeypatch):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(solana_rpc, "_cache_backend", backend)
+    monkeypatch.setattr(solana_rpc.settings, "SHARED_CACHE_PURGE_INTERVAL", 0.01)
+    await solana_rpc.init_cache_backend()
+    try:
+        _fill(backend, 100, ttl=-1)
+        for _ in range(200):
+            if backend.entry_count() == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert backend.entry_count() == 0
+    finally:
+        solana_rpc.close_cache_backend()
+    assert solana_rpc._cache_purge_task is None
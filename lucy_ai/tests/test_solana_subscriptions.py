@@ -0,0 +1,93 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from benchmarks.fake_upstreams import FakeServer, FakeSolanaWebsocket, create_solana_ws_app
+from src.lucy_ai.services.solana_subscriptions import BalanceSubscriptionCache
+
+pytestmark = pytest.mark.anyio
+
+WALLET = "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"
+TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+
+
+async def _until(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def fake_ws():
+    state = FakeSolanaWebsocket()
+    server = FakeServer("solana_ws", create_solana_ws_app(state))
+    await server.start()
+    yield state, server.ws_url
+    await server.stop()
+
+
+async def _cache_value(cache: BalanceSubscriptionCache, state: FakeSolanaWebsocket, value: str) -> None:
+    """Watches WALLET, waits for both subscriptions, then stores `value` as a fetch would."""
+    cache.begin_fetch(WALLET)
+    await _until(lambda: state.watched(WALLET) == 2 and cache._wallets[WALLET].confirmed_at is not None)
+    ticket = cache.begin_fetch(WALLET)
+    cache.complete_fetch(WALLET, value, ticket)
+    assert cache.get(WALLET) == value
+
+
+async def test_pushed_change_drops_cached_balance(fake_ws):
+    state, ws_url = fake_ws
+    invalidated: List[str] = []
+    cache = BalanceSubscriptionCache(ws_url, TOKEN_PROGRAM, on_invalidate=invalidated.append)
+    await cache.start()
+    try:
+        await _cache_value(cache, state, "balances-v1")
+
+        assert await state.notify(WALLET) == 1
+        await _until(lambda: cache.get(WALLET) is None)
+        assert invalidated == [WALLET]
+        assert cache.stats()["invalidations"] == 1
+    finally:
+        await cache.aclose()
+
+
+async def test_resubscribes_after_reconnect(fake_ws):
+    state, ws_url = fake_ws
+    invalidated: List[str] = []
+    cache = BalanceSubscriptionCache(ws_url, TOKEN_PROGRAM, on_invalidate=invalidated.append)
+    await cache.start()
+    try:
+        await _cache_value(cache, state, "balances-v1")
+
+        await state.drop_connections()
+        await _until(lambda: cache.get(WALLET) is None)
+        assert invalidated == [WALLET] # Once per disconnect, since this cache held the value
+
+        await _until(lambda: state.connections == 2 and state.watched(WALLET) == 2)
+        await _cache_value(cache, state, "balances-v2")
+        assert await state.notify(WALLET, "programSubscribe") == 1
+        await _until(lambda: cache.get(WALLET) is None)
+    finally:
+        await cache.aclose()
+
+
+async def test_failed_reconnects_leave_shared_results_alone():
+    invalidated: List[str] = []
+    attempts = 0
+
+    def unreachable(url, **kwargs):
+        nonlocal attempts
+        attempts += 1
+        raise OSError("connection refused")
+
+    cache = BalanceSubscriptionCache("ws://unreachable", TOKEN_PROGRAM, on_invalidate=invalidated.append, connect=unreachable)
+    await cache.start()
+    try:
+        cache.begin_fetch(WALLET)
+        await _until(lambda: attempts >= 2, timeout=5.0)
+        assert invalidated == []
+        assert cache.get(WALLET) is None
+    finally:
+        await cache.aclose()
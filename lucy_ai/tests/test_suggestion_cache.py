@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+from typing import List
+
+import pytest
+
+from src.lucy_ai.api.schemas import SuggestionFact
+from src.lucy_ai.core.suggestion_cache import SuggestionTextCache, canonical_suggestion_key
+
+pytestmark = pytest.mark.anyio
+
+
+def _fact(apy: float = 6.2, current_apy: float = 5.0) -> SuggestionFact:
+    return SuggestionFact(
+        suggestion_type="MOVE_TO_BETTER_YIELD", asset="USDC", current_apy=current_apy, apy=apy, apy_gain=apy - current_apy,
+        protocol_name="Solend (Solana)", recommended_pool_id="solend_usdc_sol", reasoning="Found a stable option.",
+    )
+
+
+class Generator:
+    """Fake LLM call: numbered phrasings, optionally held until `release` is set."""
+    def __init__(self, prefix: str, hold: bool = False):
+        self.prefix = prefix
+        self.calls = 0
+        self.release = asyncio.Event()
+        if not hold:
+            self.release.set()
+
+    async def __call__(self, fact: SuggestionFact) -> str:
+        self.calls += 1
+        n = self.calls
+        await self.release.wait()
+        return f"{self.prefix}-{n}"
+
+
+async def _drain(cache: SuggestionTextCache) -> None:
+    while cache._filling:
+        await asyncio.gather(*cache._filling.values(), return_exceptions=True)
+
+
+def test_apys_below_display_resolution_share_a_key():
+    assert canonical_suggestion_key(_fact(apy=6.21)) == canonical_suggestion_key(_fact(apy=6.24))
+    assert canonical_suggestion_key(_fact(apy=6.21)) != canonical_suggestion_key(_fact(apy=6.26))
+    assert canonical_suggestion_key(_fact(current_apy=-0.01, apy=6.2)) == canonical_suggestion_key(_fact(current_apy=0.0, apy=6.19))
+
+
+async def test_quantized_key_hits_reuse_cached_text():
+    cache = SuggestionTextCache(max_variants=1)
+    generate = Generator("text")
+    assert await cache.get_or_generate(_fact(apy=6.21), generate) == "text-1"
+    assert await cache.get_or_generate(_fact(apy=6.24), generate) == "text-1"
+    assert generate.calls == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+async def test_variants_are_filled_in_background_then_rotated():
+    cache = SuggestionTextCache(max_variants=3)
+    generate, background = Generator("fg"), Generator("bg")
+    assert await cache.get_or_generate(_fact(), generate, background) == "fg-1"
+
+    # Each hit below max_variants tops up one more phrasing without blocking the reader
+    for _ in range(5):
+        await cache.get_or_generate(_fact(), generate, background)
+        await _drain(cache)
+    assert (generate.calls, background.calls) == (1, 2)
+
+    served = {await cache.get_or_generate(_fact(), generate, background) for _ in range(200)}
+    assert served == {"fg-1", "bg-1", "bg-2"}
+    assert background.calls == 2 # max_variants reached: no more generations
+
+
+async def test_foreground_miss_does_not_join_a_background_fill():
+    cache = SuggestionTextCache(max_variants=3)
+    generate, background = Generator("fg"), Generator("bg", hold=True)
+    await cache.get_or_generate(_fact(), generate, background)
+    await cache.get_or_generate(_fact(), generate, background) # Hit: starts a held background fill
+    await asyncio.sleep(0)
+    assert background.calls == 1 and canonical_suggestion_key(_fact()) in cache._filling
+
+    # The entry is dropped (expiry/eviction) while the background call is still pending
+    cache.clear()
+    text = await asyncio.wait_for(cache.get_or_generate(_fact(), generate, background), timeout=1.0)
+    assert text == "fg-2"
+    assert generate.calls == 2
+
+    background.release.set()
+    await _drain(cache)
+    await cache.aclose()
+
+
+async def test_failed_background_fill_is_not_cached_and_aclose_cancels_pending_fills():
+    cache = SuggestionTextCache(max_variants=3)
+    counter = itertools.count()
+
+    async def failing(fact: SuggestionFact) -> str:
+        next(counter)
+        raise RuntimeError("llm down")
+
+    await cache.get_or_generate(_fact(), Generator("fg"), failing) # Miss: foreground only
+    for _ in range(2):
+        await cache.get_or_generate(_fact(), Generator("fg"), failing)
+        await _drain(cache)
+    assert next(counter) == 2 # Retried on the next hit
+    assert cache._entries[canonical_suggestion_key(_fact())].variants == ["fg-1"]
+
+    held = Generator("bg", hold=True)
+    await cache.get_or_generate(_fact(), Generator("fg"), held)
+    await asyncio.sleep(0)
+    await cache.aclose()
+    assert cache._filling == {}
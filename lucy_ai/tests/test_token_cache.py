@@ -0,0 +1,75 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from jose import jwt
+
+from src.lucy_ai.api import endpoints, token_cache as token_cache_module
+from src.lucy_ai.api.token_cache import VerifiedTokenCache
+
+pytestmark = pytest.mark.anyio
+
+MAX_TTL = 300.0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=time.time())
+    monkeypatch.setattr(token_cache_module, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def _token(**claims) -> str:
+    return jwt.encode({"userId": "alice", "solanaPubkey": "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin", **claims}, endpoints.SECRET_KEY, algorithm=endpoints.ALGORITHM)
+
+
+@pytest.mark.parametrize("exp_in,expected_ttl", [(None, MAX_TTL), (MAX_TTL * 10, MAX_TTL), (60, 60)])
+def test_entry_expires_at_min_of_max_ttl_and_exp(clock, exp_in, expected_ttl):
+    cache = VerifiedTokenCache(max_ttl=MAX_TTL)
+    payload = {"userId": "alice"} if exp_in is None else {"userId": "alice", "exp": int(clock.value) + exp_in}
+    entry = cache.put("token", payload, verify_seconds=0.001)
+    assert entry.expires_at == pytest.approx(clock.value + expected_ttl, abs=1)
+
+    clock.value = entry.expires_at - 0.5
+    assert cache.get("token") is entry
+    clock.value = entry.expires_at
+    assert cache.get("token") is None
+    assert cache.stats()["entries"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_distinct_tokens_do_not_collide(clock):
+    cache = VerifiedTokenCache(max_ttl=MAX_TTL)
+    alice = cache.put("token-a", {"userId": "alice"}, verify_seconds=0.001)
+    bob = cache.put("token-b", {"userId": "bob"}, verify_seconds=0.001)
+    assert cache.get("token-a") is alice and cache.get("token-b") is bob
+    assert cache.get("token-a ") is None # Not normalised: any byte difference is another token
+    assert b"token-a" not in b"".join(cache._entries) # Only hashes are kept
+
+
+def test_lru_bound(clock):
+    cache = VerifiedTokenCache(max_entries=2, max_ttl=MAX_TTL)
+    cache.put("a", {}, 0.001)
+    cache.put("b", {}, 0.001)
+    cache.get("a")
+    cache.put("c", {}, 0.001)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+async def test_token_is_reverified_after_cache_expiry(clock, monkeypatch):
+    monkeypatch.setattr(endpoints, "token_cache", VerifiedTokenCache(max_ttl=30.0))
+    decode_calls = []
+    decode = jwt.decode
+    monkeypatch.setattr(endpoints.jwt, "decode", lambda *args, **kwargs: decode_calls.append(1) or decode(*args, **kwargs))
+    token = _token(exp=int(time.time()) + 3600)
+
+    first = await endpoints.get_verified_token(token)
+    assert await endpoints.get_verified_token(token) is first
+    assert len(decode_calls) == 1
+
+    clock.value += 31
+    again = await endpoints.get_verified_token(token)
+    assert again is not first and again.user_id == "alice"
+    assert len(decode_calls) == 2
+    assert endpoints.token_cache.stats()["seconds_saved"] > 0